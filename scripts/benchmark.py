@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+"""Benchmarks wall time and peak memory on synthetic zipfiles.
+
+Each case runs in a fresh process, so its peak memory is not affected by the
+cases before it. The zipfiles are generated once and kept in the data
+directory. Save the results of a run with ``--output``, and compare a later
+run against them with ``--baseline``:
+
+    scripts/benchmark.py --sizes 1000 10000 100000 --output baseline.json
+    scripts/benchmark.py --sizes 1000 10000 100000 --baseline baseline.json
+
+The run fails if any case crashes, is killed, takes longer than
+``--timeout``, or is slower or uses more memory than the baseline by more than
+``--tolerance``.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+root = Path(__file__).parents[1]
+sys.path.insert(0, str(root))
+
+from tests.synthetic import create_zipfile  # noqa: E402
+
+POLL_INTERVAL = 1.0
+
+
+def metadata(path: Path, directory: Path) -> None:
+    from stactools.fws_nwi.metadata import Metadata
+
+    Metadata.from_zipfile(path)
+
+
+def calculate_geometry(path: Path, directory: Path) -> None:
+    from stactools.fws_nwi.metadata import calculate_geometry
+
+    calculate_geometry(path)
+
+
+def geoparquet(path: Path, directory: Path) -> None:
+    from stactools.fws_nwi import geoparquet
+
+    geoparquet.from_zipfile(path, directory)
+
+
+def geoparquet_in_batches(path: Path, directory: Path) -> None:
+    from stactools.fws_nwi import geoparquet
+
+    geoparquet.from_zipfile(path, directory, batch_size=65536)
+
+
+def cli(path: Path, directory: Path) -> None:
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "stactools.cli",
+            "fws-nwi",
+            "create-item",
+            "--create-geoparquet",
+            str(path),
+            str(directory / "item.json"),
+        ],
+        check=True,
+    )
+
+
+CASES: Dict[str, Callable[[Path, Path], None]] = {
+    "metadata": metadata,
+    "calculate_geometry": calculate_geometry,
+    "geoparquet": geoparquet,
+    "geoparquet_in_batches": geoparquet_in_batches,
+    "cli": cli,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="the numbers of wetland features to benchmark",
+    )
+    parser.add_argument(
+        "--vertices", type=int, default=32, help="the vertices per feature"
+    )
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="keep the best of this many runs"
+    )
+    parser.add_argument(
+        "--data-directory",
+        type=Path,
+        default=root / ".benchmarks",
+        help="where the synthetic zipfiles are kept",
+    )
+    parser.add_argument("--output", type=Path, help="save the results here")
+    parser.add_argument("--baseline", type=Path, help="compare against these results")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="the allowed slowdown or memory growth over the baseline",
+    )
+    parser.add_argument(
+        "--timeout", type=float, help="fail a run that takes longer than this, in s"
+    )
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    for size in args.sizes:
+        path = zipfile(args.data_directory, size, args.vertices)
+        for case in args.cases:
+            try:
+                runs = [run(case, path, args.timeout) for _ in range(args.repeat)]
+            except Exception as error:
+                failures.append(str(error))
+                print(f"{case:>24} {size:>9} features: FAILED {error}", flush=True)
+                continue
+            result = {
+                "case": case,
+                "features": size,
+                "vertices": args.vertices,
+                "seconds": min(r["seconds"] for r in runs),
+                "peak_rss": min(r["peak_rss"] for r in runs),
+            }
+            results.append(result)
+            print(
+                f"{case:>24} {size:>9} features: {result['seconds']:9.2f} s "
+                f"{result['peak_rss'] / 1024**2:9.1f} MiB",
+                flush=True,
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+    if failures:
+        sys.exit(1)
+
+
+def zipfile(directory: Path, features: int, vertices: int) -> Path:
+    subdirectory = directory / f"{features}-{vertices}"
+    path = subdirectory / "DC_shapefile_wetlands.zip"
+    if not path.exists():
+        subdirectory.mkdir(parents=True, exist_ok=True)
+        create_zipfile(subdirectory, features=features, vertices=vertices)
+    return path
+
+
+def run(case: str, path: Path, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Runs one case in a fresh process.
+
+    Raises an exception if the case fails, if its process exits without a
+    result, for example when it is killed for running out of memory, or if it
+    takes longer than ``timeout`` seconds.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run, args=(case, path, results))
+    process.start()
+    start = time.monotonic()
+    try:
+        while True:
+            alive = process.is_alive()
+            try:
+                # A result put just before the process exited is still read
+                result: Dict[str, Any] = results.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                pass
+            if not alive:
+                raise Exception(
+                    f"{case} failed on {path}: "
+                    f"exited with code {process.exitcode} and no result"
+                )
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise Exception(f"{case} timed out after {timeout} s on {path}")
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+    if "error" in result:
+        raise Exception(f"{case} failed on {path}: {result['error']}")
+    return result
+
+
+def _run(
+    case: str, path: Path, results: "multiprocessing.Queue[Dict[str, Any]]"
+) -> None:
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            CASES[case](path, Path(directory))
+            seconds = time.perf_counter() - start
+    except Exception as error:
+        results.put({"error": str(error)})
+        return
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    results.put({"seconds": seconds, "peak_rss": peak_rss})
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """Prints the results relative to a baseline, and returns any regressions."""
+    previous = {(b["case"], b["features"], b["vertices"]): b for b in baseline}
+    regressions = []
+    for result in results:
+        key = (result["case"], result["features"], result["vertices"])
+        before: Optional[Dict[str, Any]] = previous.get(key)
+        if before is None:
+            continue
+        for measure in ["seconds", "peak_rss"]:
+            ratio = result[measure] / before[measure]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = " REGRESSION"
+                regressions.append(f"{key} {measure}")
+            print(
+                f"{result['case']:>24} {result['features']:>9} {measure:>9}: "
+                f"{ratio:6.2f}x baseline{flag}"
+            )
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    import stactools.fws_nwi
+
+    return {
+        "version": stactools.fws_nwi.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": multiprocessing.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    main()
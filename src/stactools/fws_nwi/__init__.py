@@ -1,12 +1,17 @@
-import stactools.core
-from stactools.cli.registry import Registry
+from typing import TYPE_CHECKING
 
-stactools.core.use_fsspec()
+if TYPE_CHECKING:
+    from stactools.cli.registry import Registry
 
 
-def register_plugin(registry: Registry) -> None:
+def register_plugin(registry: "Registry") -> None:
+    # Registering the plugin runs on every ``stac`` invocation, so the
+    # commands import what they need when they run.
+    import stactools.core
+
     from stactools.fws_nwi import commands
 
+    stactools.core.use_fsspec()
     registry.register_subcommand(commands.create_fwsnwi_command)
 
 
@@ -0,0 +1,123 @@
+"""Running the blocking work of item creation from asyncio.
+
+Reading shapefiles and writing geoparquet is CPU and GDAL work that would
+block an event loop, so a :class:`Runner` does it in a thread pool that it
+owns, for example::
+
+    runner = aio.Runner(max_workers=4, limit=2)
+    item = await stac.create_item_async(path, runner=runner, listener=print)
+
+The listener is called on the event loop with each
+:class:`stactools.fws_nwi.progress.Event`. Cancelling the awaiting task stops
+the work at the next progress event, that is, before the next layer or batch
+is read, and the cancellation is only re-raised once the worker thread has
+stopped and removed any files that it wrote, see
+:func:`stactools.fws_nwi.scanner.scan_zipfile`.
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from weakref import WeakKeyDictionary
+
+from stactools.fws_nwi import progress
+
+T = TypeVar("T")
+
+_default: Optional["Runner"] = None
+
+
+class Runner:
+    """A thread pool for blocking work, with an optional concurrency limit.
+
+    At most ``limit`` calls to :meth:`run` do their work at once, per event
+    loop, and the rest wait their turn without taking a thread.
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, limit: Optional[int] = None
+    ) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="fws-nwi"
+        )
+        self.limit = limit
+        # Semaphores are bound to the loop they are first used on.
+        self._semaphores: "WeakKeyDictionary[Any, asyncio.Semaphore]" = (
+            WeakKeyDictionary()
+        )
+
+    async def run(
+        self,
+        function: Callable[..., T],
+        *args: Any,
+        listener: Optional[Callable[[progress.Event], None]] = None,
+        **kwargs: Any,
+    ) -> T:
+        """Calls ``function`` in the thread pool and returns its result."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(loop)
+        if semaphore is None:
+            return await self._run(loop, function, args, kwargs, listener)
+        async with semaphore:
+            return await self._run(loop, function, args, kwargs, listener)
+
+    async def _run(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        function: Callable[..., T],
+        args: Any,
+        kwargs: Any,
+        listener: Optional[Callable[[progress.Event], None]],
+    ) -> T:
+        cancelled = threading.Event()
+
+        def report(event: progress.Event) -> None:
+            if cancelled.is_set():
+                raise Exception(f"cancelled while scanning {event.layer}")
+            if listener is not None:
+                loop.call_soon_threadsafe(listener, event)
+
+        def call() -> T:
+            with progress.listen(report):
+                return function(*args, **kwargs)
+
+        # The copied context carries any active profiler into the thread.
+        future = loop.run_in_executor(
+            self.executor, contextvars.copy_context().run, call
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancelled.set()
+            await asyncio.wait([future])
+            raise
+
+    def _semaphore(
+        self, loop: asyncio.AbstractEventLoop
+    ) -> Optional[asyncio.Semaphore]:
+        if self.limit is None:
+            return None
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+    def shutdown(self) -> None:
+        """Waits for any running work to finish and stops the threads."""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self) -> "Runner":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+
+
+def default_runner() -> Runner:
+    """Returns the runner used when none is given, creating it if needed."""
+    global _default
+    if _default is None:
+        _default = Runner()
+    return _default
@@ -0,0 +1,256 @@
+"""Creating items for many state zipfiles at once, in a process pool."""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pystac import CatalogType, Collection, Item
+
+from stactools.fws_nwi import export, geoparquet, stac, staging
+from stactools.fws_nwi.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+ZIPFILE_SUFFIX = "_shapefile_wetlands.zip"
+
+
+@dataclass
+class Failure:
+    """A zipfile that could not be turned into an item, even after retries."""
+
+    path: Path
+    error: str
+
+
+def zipfile_paths(directory: Path) -> List[Path]:
+    """Returns the state zipfiles in a directory, largest first.
+
+    Big states take the longest, so starting them first keeps them from
+    becoming stragglers at the end of a batch.
+    """
+    paths = [
+        path
+        for path in Path(directory).iterdir()
+        if path.is_file() and path.name.endswith(ZIPFILE_SUFFIX)
+    ]
+    return sorted(paths, key=lambda path: path.stat().st_size, reverse=True)
+
+
+def create_items(
+    paths: List[Path],
+    geoparquet_directory: Optional[Path] = None,
+    workers: Optional[int] = None,
+    retries: int = 1,
+    batch_size: Optional[int] = None,
+    cache: Optional[Cache] = None,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    exporter: Optional[export.Exporter] = None,
+    checksums: bool = False,
+    staging_options: Optional[staging.Options] = None,
+) -> Tuple[List[Item], List[Failure]]:
+    """Creates an item for each zipfile in a process pool.
+
+    Zipfiles are submitted in the order given. If ``geoparquet_directory`` is
+    provided, each item's geoparquet assets are written to a subdirectory of
+    it named after the item. A zipfile that fails is retried up to
+    ``retries`` times; if it still fails it is returned as a
+    :class:`Failure` and the other zipfiles are not affected. If a worker
+    process dies, such as when it runs out of memory, the pool is replaced
+    and the zipfiles that were running count as failed, while those that
+    were waiting are resubmitted.
+    Zipfiles that are unchanged since they were last cached are not scanned
+    again. If an ``exporter`` is provided, each item is added to it as soon
+    as it is created.
+
+    Returns the created items, sorted by id, and the failures.
+    """
+    items = []
+    failures = []
+    attempts: Dict[Path, int] = {}
+    futures: Dict["Future[Dict[str, Any]]", Path] = {}
+    executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    # Workers mark the zipfiles that they are working on here, so that when
+    # the pool breaks we know which zipfiles were running.
+    running = Path(tempfile.mkdtemp(prefix=".fws-nwi-running."))
+
+    def submit(path: Path) -> None:
+        nonlocal executor
+        attempts[path] = attempts.get(path, 0) + 1
+        call = partial(
+            _create_item,
+            path,
+            geoparquet_directory,
+            batch_size,
+            cache,
+            geoparquet_options,
+            checksums,
+            staging_options,
+            running,
+        )
+        try:
+            future = executor.submit(call)
+        except BrokenProcessPool:
+            # A worker died, such as when it ran out of memory, which breaks
+            # the whole pool, so start a new one for the remaining zipfiles.
+            executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+            future = executor.submit(call)
+        futures[future] = path
+
+    try:
+        for path in paths:
+            submit(path)
+        while futures:
+            future = next(as_completed(futures))
+            path = futures.pop(future)
+            try:
+                item = Item.from_dict(future.result())
+            except Exception as error:
+                if isinstance(error, BrokenProcessPool) and not was_running(
+                    running, path
+                ):
+                    # Another zipfile's worker died while this one waited.
+                    attempts[path] -= 1
+                if attempts[path] <= retries:
+                    logger.warning(f"retrying {path} after error: {error}")
+                    submit(path)
+                else:
+                    logger.error(f"could not create an item for {path}: {error}")
+                    failures.append(Failure(path=path, error=str(error)))
+                continue
+            items.append(item)
+            if exporter:
+                exporter.add(item)
+    finally:
+        executor.shutdown()
+        shutil.rmtree(running, ignore_errors=True)
+    return sorted(items, key=lambda item: item.id), failures
+
+
+def create_collection_from_directory(
+    directory: Path,
+    destination: str,
+    create_geoparquet: bool = False,
+    workers: Optional[int] = None,
+    retries: int = 1,
+    batch_size: Optional[int] = None,
+    make_asset_hrefs_relative: bool = False,
+    cache: Optional[Cache] = None,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    ndjson: Optional[Path] = None,
+    stac_geoparquet: Optional[Path] = None,
+    checksums: bool = False,
+    staging_options: Optional[staging.Options] = None,
+) -> Tuple[Collection, List[Failure]]:
+    """Creates and saves a collection with an item for every state zipfile.
+
+    The collection is saved to ``destination`` and each item is saved in a
+    subdirectory next to it, along with its geoparquet assets if
+    ``create_geoparquet`` is True. The items are also exported to ``ndjson``
+    and ``stac_geoparquet``, if given, with absolute asset hrefs, see
+    :class:`stactools.fws_nwi.export.Exporter`.
+    """
+    root = Path(destination).absolute().parent
+    collection = stac.create_collection()
+    with export.Exporter(ndjson, stac_geoparquet, collection.id) as exporter:
+        items, failures = create_items(
+            zipfile_paths(directory),
+            geoparquet_directory=root if create_geoparquet else None,
+            workers=workers,
+            retries=retries,
+            batch_size=batch_size,
+            cache=cache,
+            geoparquet_options=geoparquet_options,
+            exporter=exporter,
+            checksums=checksums,
+            staging_options=staging_options,
+        )
+    collection.set_self_href(str(Path(destination).absolute()))
+    collection.add_items(items)
+    collection.normalize_hrefs(str(root))
+    if make_asset_hrefs_relative:
+        collection.make_all_asset_hrefs_relative()
+    collection.save(catalog_type=CatalogType.SELF_CONTAINED)
+    return collection, failures
+
+
+def _create_item(
+    path: Path,
+    geoparquet_directory: Optional[Path],
+    batch_size: Optional[int],
+    cache: Optional[Cache],
+    geoparquet_options: Optional[geoparquet.Options],
+    checksums: bool,
+    staging_options: Optional[staging.Options],
+    running: Path,
+) -> Dict[str, Any]:
+    with marked_running(running, path):
+        return _create_item_dict(
+            path,
+            geoparquet_directory,
+            batch_size,
+            cache,
+            geoparquet_options,
+            checksums,
+            staging_options,
+        )
+
+
+def _create_item_dict(
+    path: Path,
+    geoparquet_directory: Optional[Path],
+    batch_size: Optional[int],
+    cache: Optional[Cache],
+    geoparquet_options: Optional[geoparquet.Options],
+    checksums: bool,
+    staging_options: Optional[staging.Options],
+) -> Dict[str, Any]:
+    item_geoparquet_directory = None
+    if geoparquet_directory:
+        item_geoparquet_directory = geoparquet_directory / path.name.split("_")[0]
+        item_geoparquet_directory.mkdir(parents=True, exist_ok=True)
+    item = stac.create_item(
+        path.absolute(),
+        geoparquet_directory=item_geoparquet_directory,
+        batch_size=batch_size,
+        cache=cache,
+        geoparquet_options=geoparquet_options,
+        checksums=checksums,
+        staging_options=staging_options,
+    )
+    return item.to_dict(include_self_link=False, transform_hrefs=False)
+
+
+def _marker(running: Path, path: Path) -> Path:
+    return running / hashlib.sha256(str(path.absolute()).encode()).hexdigest()
+
+
+@contextmanager
+def marked_running(running: Path, path: Path) -> Iterator[None]:
+    """Marks a path as running in the ``running`` directory while a worker
+    process works on it, see :func:`was_running`."""
+    marker = _marker(running, path)
+    marker.touch()
+    try:
+        yield
+    finally:
+        marker.unlink()
+
+
+def was_running(running: Path, path: Path) -> bool:
+    """Returns whether a worker had started on a path when its pool broke,
+    and clears its marker."""
+    marker = _marker(running, path)
+    if marker.exists():
+        marker.unlink()
+        return True
+    return False
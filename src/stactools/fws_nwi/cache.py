@@ -0,0 +1,240 @@
+"""A persistent, content-addressed cache of scanned zipfiles.
+
+Entries are keyed by a hash of the zipfile's contents, so a rebuild only
+rescans the states that actually changed. Each entry holds the pickled
+:class:`~stactools.fws_nwi.metadata.Metadata` and the metadata of any
+geoparquet and FlatGeobuf files, along with copies of the files themselves.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import uuid
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import stactools.fws_nwi
+from stactools.fws_nwi import checksum, geoparquet, remote, scanner
+from stactools.fws_nwi.metadata import Metadata
+from stactools.fws_nwi.remote import Href
+
+DEFAULT_MAX_SIZE = 20 * 1024**3  # 20 GiB
+HASH_CHUNK_SIZE = 1024**2
+RESULT_FILE_NAME = "result.pickle"
+# Versions are kept in this subdirectory of the cache directory, and each
+# holds a marker file so that only the cache's own directories are removed.
+ROOT_NAME = "fws-nwi-cache"
+MARKER_FILE_NAME = ".fws-nwi-cache"
+
+
+def default_directory() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "stactools-fws-nwi"
+
+
+class Cache:
+    """A cache of scanned zipfiles in a directory.
+
+    Entries live in ``<directory>/fws-nwi-cache/<version>``, named after the
+    package version, and the entries of any other version are removed when
+    the cache is opened. Only version directories that the cache created,
+    which hold a :data:`MARKER_FILE_NAME` file, are ever removed, so the
+    cache directory can be shared with other files. Once the entries take up
+    more than ``max_size`` bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        max_size: Optional[int] = DEFAULT_MAX_SIZE,
+    ):
+        root = (Path(directory) if directory else default_directory()) / ROOT_NAME
+        self.directory = root / stactools.fws_nwi.__version__
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / MARKER_FILE_NAME).touch()
+        for path in root.iterdir():
+            if path != self.directory and (path / MARKER_FILE_NAME).is_file():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def scan_zipfile(
+        self, path: Href, geoparquet_directory: Optional[Path] = None, **kwargs: Any
+    ) -> Tuple[Metadata, List[scanner.Output]]:
+        """Like :func:`stactools.fws_nwi.scanner.scan_zipfile`, but cached.
+
+        On a hit, the cached geoparquet and FlatGeobuf files are copied into
+        ``geoparquet_directory`` and ``flatgeobuf_directory`` instead of
+        being created again. Remote zipfiles are never cached, since hashing
+        them would mean downloading them whole.
+        """
+        if remote.is_remote(path):
+            return scanner.scan_zipfile(path, geoparquet_directory, **kwargs)
+        path = Path(path)
+        flatgeobuf_directory = kwargs.get("flatgeobuf_directory")
+        entry = self.directory / self.key(
+            path,
+            geoparquet_directory is not None,
+            kwargs.get("geoparquet_options"),
+            flatgeobuf_directory is not None,
+            kwargs.get("fast_footprint", False),
+        )
+        result = entry / RESULT_FILE_NAME
+        if result.exists():
+            result.touch()
+            with open(result, "rb") as f:
+                metadata, outputs = pickle.load(f)
+            copies: List[scanner.Output] = []
+            for output in outputs:
+                if isinstance(output, geoparquet.Metadata):
+                    directory = geoparquet_directory
+                else:
+                    directory = flatgeobuf_directory
+                assert directory, "cache keys cover the kinds of files created"
+                copies.append(replace(output, path=_copy(output.path, directory)))
+            return metadata, copies
+
+        metadata, outputs = scanner.scan_zipfile(path, geoparquet_directory, **kwargs)
+        self._store(entry, metadata, outputs)
+        self.evict()
+        return metadata, outputs
+
+    def key(
+        self,
+        path: Path,
+        create_geoparquet: bool,
+        geoparquet_options: Optional[geoparquet.Options] = None,
+        create_flatgeobuf: bool = False,
+        fast_footprint: bool = False,
+    ) -> str:
+        """Returns the cache key for a zipfile.
+
+        The key covers the file name, since the state is read from it, the
+        file's contents, whether and how geoparquet and FlatGeobuf assets
+        were created, and how the footprint was built.
+        """
+        kind = "metadata"
+        if create_geoparquet:
+            kind = f"geoparquet:{geoparquet_options or geoparquet.Options()}"
+        if create_flatgeobuf:
+            kind += ":flatgeobuf"
+        if fast_footprint:
+            kind += ":fast-footprint"
+        return hashlib.sha256(
+            f"{Path(path).name}:{self.hash(path)}:{kind}".encode()
+        ).hexdigest()
+
+    def hash(self, path: Path) -> str:
+        """Returns the SHA-256 of a file's contents.
+
+        Hashes are remembered by absolute path, and reused as long as the
+        file's size and modification time are unchanged.
+        """
+        path = Path(path).absolute()
+        stat = path.stat()
+        hashes = self.directory / "hashes"
+        hashes.mkdir(exist_ok=True)
+        record_path = hashes / (
+            hashlib.sha256(str(path).encode()).hexdigest() + ".json"
+        )
+        if record_path.exists():
+            with open(record_path) as f:
+                record = json.load(f)
+            if record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+                return str(record["sha256"])
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        record = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": digest.hexdigest(),
+        }
+        _write_atomically(record_path, json.dumps(record).encode())
+        return str(record["sha256"])
+
+    def digest(self, path: Path) -> checksum.Digest:
+        """Returns a file's size and checksum, from the hash that
+        :meth:`hash` remembers."""
+        return checksum.Digest(
+            Path(path).stat().st_size,
+            checksum.multihash(bytes.fromhex(self.hash(path))),
+        )
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits."""
+        if self.max_size is None:
+            return
+        entries = []
+        for entry in self.directory.iterdir():
+            result = entry / RESULT_FILE_NAME
+            if result.exists():
+                size = sum(p.stat().st_size for p in entry.rglob("*") if p.is_file())
+                entries.append((result.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Removes every entry from the cache."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / MARKER_FILE_NAME).touch()
+
+    def _store(
+        self,
+        entry: Path,
+        metadata: Metadata,
+        outputs: List[scanner.Output],
+    ) -> None:
+        # Build the entry next to its final location and rename it into place,
+        # so concurrent builds never see a partial entry.
+        staging = entry.with_name(f"{entry.name}.{uuid.uuid4().hex}.tmp")
+        staging.mkdir()
+        for output in outputs:
+            if output.path.is_dir():
+                shutil.copytree(output.path, staging / output.path.name)
+            else:
+                shutil.copyfile(output.path, staging / output.path.name)
+        with open(staging / RESULT_FILE_NAME, "wb") as f:
+            pickle.dump(
+                (
+                    metadata,
+                    [replace(o, path=entry / o.path.name) for o in outputs],
+                ),
+                f,
+            )
+        try:
+            staging.rename(entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _copy(path: Path, directory: Path) -> Path:
+    # Entries are copied rather than hard-linked: writers reopen their output
+    # paths in place, which would truncate a linked entry along with them.
+    destination = directory / path.name
+    if destination.is_dir():
+        shutil.rmtree(destination)
+    elif destination.exists():
+        destination.unlink()
+    if path.is_dir():
+        # Partitioned datasets are directories of files.
+        shutil.copytree(path, destination, copy_function=shutil.copyfile)
+    else:
+        shutil.copyfile(path, destination)
+    return destination
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    temporary_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+    os.replace(temporary_path, path)
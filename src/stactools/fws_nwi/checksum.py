@@ -0,0 +1,91 @@
+"""File sizes and multihash checksums for the file extension.
+
+Checksums are computed from the bytes as they stream past, rather than by
+reading files back once they are written. Writers wrap their output in a
+:class:`HashingFile`::
+
+    with checksum.HashingFile(open(path, "wb")) as f:
+        f.write(data)
+    asset.extra_fields.update(f.digest().fields())
+
+Source zipfiles are the exception: scans read only some of their members,
+and not in order, so :func:`file` reads them through once more.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Dict
+
+# The multihash prefix of a SHA2-256 digest: its code, 0x12, followed by its
+# length, 0x20, each as a single byte varint.
+SHA2_256_PREFIX = bytes([0x12, 0x20])
+CHUNK_SIZE = 1024**2
+
+
+@dataclass(frozen=True)
+class Digest:
+    """The size and hex-encoded multihash checksum of a file."""
+
+    size: int
+    checksum: str
+
+    def fields(self) -> Dict[str, Any]:
+        """Returns the file extension's fields for an asset."""
+        return {"file:size": self.size, "file:checksum": self.checksum}
+
+
+class HashingFile:
+    """A binary file that hashes everything written to it.
+
+    Only writes are hashed, so the file must be written from start to
+    finish without seeking, as parquet writers do.
+    """
+
+    def __init__(self, file: IO[bytes]):
+        self.file = file
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+
+    def digest(self) -> Digest:
+        return Digest(self.size, multihash(self._hash.digest()))
+
+    def __enter__(self) -> "HashingFile":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def multihash(sha256: bytes) -> str:
+    """Returns the hex-encoded multihash of a SHA2-256 digest."""
+    return (SHA2_256_PREFIX + sha256).hex()
+
+
+def file(path: Path) -> Digest:
+    """Reads a file once to compute its digest."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return Digest(size, multihash(digest.digest()))
@@ -1,19 +1,29 @@
+import json
 import logging
-import os
 import pathlib
-from typing import List
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 import click
-import requests
 from click import Command, Group, Path
-from pystac import CatalogType
-from tqdm import tqdm
 
-from stactools.fws_nwi import stac
+from stactools.fws_nwi.constants import (
+    BATCH_SIZE,
+    DIFF_BUCKETS,
+    NATIONAL_BUCKETS,
+    STAGING_MEMORY_LIMIT,
+    TILE,
+    WETLAND_TYPE,
+)
 from stactools.fws_nwi.states import States
 
+if TYPE_CHECKING:
+    from stactools.fws_nwi import staging
+    from stactools.fws_nwi.geoparquet import Options
+
 logger = logging.getLogger(__name__)
 
+F = TypeVar("F", bound=Callable[..., Any])
+
 
 def create_fwsnwi_command(cli: Group) -> Command:
     """Creates the stactools-fws-nwi command line utility."""
@@ -38,6 +48,10 @@ def create_fwsnwi_command(cli: Group) -> Command:
         Args:
             destination (str): An HREF for the Collection JSON
         """
+        from pystac import CatalogType
+
+        from stactools.fws_nwi import stac
+
         collection = stac.create_collection()
         collection.set_self_href(destination)
         collection.save(catalog_type=CatalogType.SELF_CONTAINED)
@@ -51,6 +65,61 @@ def create_fwsnwi_command(cli: Group) -> Command:
         help="Create geoparquet assets alongside the item",
         show_default=True,
     )
+    @click.option(
+        "--create-flatgeobuf/--no-create-flatgeobuf",
+        default=False,
+        help=(
+            "Create FlatGeobuf assets with a spatial index alongside the item,"
+            " for bbox reads over HTTP range requests"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--batch-size",
+        type=int,
+        help=(
+            "Stream each layer to geoparquet in batches of this many records,"
+            " which bounds memory use for large states"
+        ),
+    )
+    @click.option(
+        "--workers",
+        type=int,
+        help="Convert this many layers of the zipfile concurrently",
+    )
+    @click.option(
+        "--processes/--threads",
+        default=False,
+        help=(
+            "Convert the layers of the zipfile in worker processes, instead of"
+            " threads, when --workers is more than one"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--fast-footprint/--no-fast-footprint",
+        default=False,
+        help=(
+            "If there is no state boundary, build the geometry from the index"
+            " layers or shapefile headers instead of every wetland polygon"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--checksums/--no-checksums",
+        default=False,
+        help=(
+            "Add file:size and file:checksum to the zipfile and geoparquet"
+            " assets. Geoparquet files are hashed as they are written, and local"
+            " zipfiles by a second read alongside the scan"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--cache-directory",
+        type=click.Path(file_okay=False),
+        help="Cache scanned zipfiles here, and reuse them if they have not changed",
+    )
     @click.option(
         "--make-asset-hrefs-relative/--no-make-asset-hrefs-relative",
         default=False,
@@ -63,57 +132,699 @@ def create_fwsnwi_command(cli: Group) -> Command:
         help="Include a self link",
         show_default=True,
     )
+    @click.option(
+        "--validate/--no-validate",
+        default=False,
+        help="Validate the item before saving it, see the validate command",
+        show_default=True,
+    )
+    @click.option(
+        "--schema-directory",
+        type=click.Path(file_okay=False),
+        help="Read JSON schemas from here, and save any that are downloaded",
+    )
+    @click.option(
+        "--profile",
+        type=click.Path(dir_okay=False, writable=True),
+        help=(
+            "Write a JSON report of the time, records and peak memory of each"
+            " stage of item creation to this file"
+        ),
+    )
+    @geoparquet_options
+    @staging_options
     def create_item_command(
         source: Path,
         destination: Path,
         create_geoparquet: bool,
+        create_flatgeobuf: bool,
+        batch_size: Optional[int],
+        workers: Optional[int],
+        processes: bool,
+        fast_footprint: bool,
+        checksums: bool,
+        cache_directory: Optional[str],
         make_asset_hrefs_relative: bool,
         include_self_link: bool,
+        validate: bool,
+        schema_directory: Optional[str],
+        profile: Optional[str],
+        **kwargs: Any,
     ) -> None:
         """Creates a STAC Item
 
         Args:
-            source (str): HREF of the Asset associated with the Item
+            source (str): HREF of the Asset associated with the Item, which may
+                be a local path or an http(s) or other fsspec href
             destination (str): An HREF for the STAC Item
         """
+        from stactools.fws_nwi import profiling, remote, stac
+        from stactools.fws_nwi.cache import Cache
+
         destination_path = pathlib.Path(str(destination))
         if create_geoparquet:
             geoparquet_directory = destination_path.parent
         else:
             geoparquet_directory = None
-        item = stac.create_item(
-            pathlib.Path(str(source)), geoparquet_directory=geoparquet_directory
-        )
+        with profiling.profile() as profiler:
+            item = stac.create_item(
+                remote.to_href(str(source)),
+                geoparquet_directory=geoparquet_directory,
+                batch_size=batch_size,
+                workers=workers,
+                processes=processes,
+                cache=Cache(pathlib.Path(cache_directory)) if cache_directory else None,
+                geoparquet_options=options_from_kwargs(kwargs),
+                flatgeobuf_directory=(
+                    destination_path.parent if create_flatgeobuf else None
+                ),
+                fast_footprint=fast_footprint,
+                checksums=checksums,
+                staging_options=staging_options_from_kwargs(kwargs),
+            )
+        if profile:
+            with open(profile, "w") as f:
+                json.dump(profiler.report(), f, indent=2)
         item.set_self_href(str(destination_path.absolute()))
         item.make_asset_hrefs_absolute()
         if make_asset_hrefs_relative:
             item.make_asset_hrefs_relative()
+        if validate:
+            from stactools.fws_nwi import validation
+
+            validator = validation.Validator(_optional_path(schema_directory))
+            errors = validator.errors(item.to_dict(include_self_link=False))
+            if errors:
+                raise click.ClickException("invalid item: " + "; ".join(errors))
         item.save_object(include_self_link=include_self_link)
         return None
 
+    @fwsnwi.command(
+        "create-collection-from-directory",
+        short_help="Creates a STAC collection with items for a directory of zipfiles",
+    )
+    @click.argument("source")
+    @click.argument("destination")
+    @click.option(
+        "--create-geoparquet/--no-create-geoparquet",
+        default=False,
+        help="Create geoparquet assets alongside the items",
+        show_default=True,
+    )
+    @click.option(
+        "--batch-size",
+        type=int,
+        help=(
+            "Stream each layer to geoparquet in batches of this many records,"
+            " which bounds memory use for large states"
+        ),
+    )
+    @click.option(
+        "--workers",
+        type=int,
+        help="The number of worker processes (defaults to the number of CPUs)",
+    )
+    @click.option(
+        "--retries",
+        type=int,
+        default=1,
+        help="The number of times to retry a state that fails",
+        show_default=True,
+    )
+    @click.option(
+        "--checksums/--no-checksums",
+        default=False,
+        help=(
+            "Add file:size and file:checksum to the zipfile and geoparquet"
+            " assets. Geoparquet files are hashed as they are written, and local"
+            " zipfiles by a second read alongside the scan"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--cache-directory",
+        type=click.Path(file_okay=False),
+        help="Cache scanned zipfiles here, and reuse them if they have not changed",
+    )
+    @click.option(
+        "--make-asset-hrefs-relative/--no-make-asset-hrefs-relative",
+        default=False,
+        help="Make asset hrefs relative",
+        show_default=True,
+    )
+    @click.option(
+        "--ndjson",
+        type=click.Path(dir_okay=False, writable=True),
+        help=(
+            "Also write every item to this newline-delimited JSON file as it is"
+            " created, for bulk loading"
+        ),
+    )
+    @click.option(
+        "--stac-geoparquet",
+        type=click.Path(dir_okay=False, writable=True),
+        help="Also write every item to this stac-geoparquet file, for bulk loading",
+    )
+    @click.option(
+        "--validate/--no-validate",
+        default=False,
+        help="Validate the collection and its items, see the validate command",
+        show_default=True,
+    )
+    @click.option(
+        "--schema-directory",
+        type=click.Path(file_okay=False),
+        help="Read JSON schemas from here, and save any that are downloaded",
+    )
+    @geoparquet_options
+    @staging_options
+    def create_collection_from_directory_command(
+        source: Path,
+        destination: str,
+        create_geoparquet: bool,
+        batch_size: Optional[int],
+        workers: Optional[int],
+        retries: int,
+        checksums: bool,
+        cache_directory: Optional[str],
+        make_asset_hrefs_relative: bool,
+        ndjson: Optional[str],
+        stac_geoparquet: Optional[str],
+        validate: bool,
+        schema_directory: Optional[str],
+        **kwargs: Any,
+    ) -> None:
+        """Creates a STAC Collection with an Item for each zipfile in a directory
+
+        The zipfiles are processed in parallel, largest first.
+
+        Args:
+            source (str): A directory of ``*_shapefile_wetlands.zip`` files
+            destination (str): An HREF for the Collection JSON
+        """
+        from stactools.fws_nwi import batch
+        from stactools.fws_nwi.cache import Cache
+
+        _, failures = batch.create_collection_from_directory(
+            pathlib.Path(str(source)),
+            destination,
+            create_geoparquet=create_geoparquet,
+            workers=workers,
+            retries=retries,
+            batch_size=batch_size,
+            make_asset_hrefs_relative=make_asset_hrefs_relative,
+            cache=Cache(pathlib.Path(cache_directory)) if cache_directory else None,
+            geoparquet_options=options_from_kwargs(kwargs),
+            ndjson=pathlib.Path(ndjson) if ndjson else None,
+            stac_geoparquet=pathlib.Path(stac_geoparquet) if stac_geoparquet else None,
+            checksums=checksums,
+            staging_options=staging_options_from_kwargs(kwargs),
+        )
+        if failures:
+            raise click.ClickException(
+                "could not create items for: "
+                + ", ".join(str(failure.path) for failure in failures)
+            )
+        if validate:
+            from stactools.fws_nwi import validation
+
+            _check(
+                validation.validate_files(
+                    validation.collection_files(pathlib.Path(destination)),
+                    _optional_path(schema_directory),
+                    workers=workers,
+                )
+            )
+
+    @fwsnwi.command(
+        "create-national-geoparquet",
+        short_help="Merges the wetlands of every state into one geoparquet",
+    )
+    @click.argument("source")
+    @click.argument("destination")
+    @click.option(
+        "--collection",
+        type=click.Path(dir_okay=False, exists=True),
+        help="Add the geoparquet to this collection as an asset",
+    )
+    @click.option(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="Read each layer in batches of this many records",
+        show_default=True,
+    )
+    @click.option(
+        "--buckets",
+        type=int,
+        default=NATIONAL_BUCKETS,
+        help=(
+            "Split records into this many buckets to find duplicates;"
+            " more buckets use less memory"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--make-asset-hrefs-relative/--no-make-asset-hrefs-relative",
+        default=False,
+        help="Make the collection asset's href relative",
+        show_default=True,
+    )
+    @geoparquet_options
+    def create_national_geoparquet_command(
+        source: Path,
+        destination: Path,
+        collection: Optional[str],
+        batch_size: int,
+        buckets: int,
+        make_asset_hrefs_relative: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Merges the wetlands layers of a directory of zipfiles into one geoparquet
+
+        Each state includes the wetlands of every quad that touches it, so
+        records that are in more than one state are only written once.
+
+        Args:
+            source (str): A directory of ``*_shapefile_wetlands.zip`` files
+            destination (str): The directory to write the geoparquet to
+        """
+        from pystac import Collection
+
+        from stactools.fws_nwi import batch, national
+
+        merge = national.merge(
+            sorted(batch.zipfile_paths(pathlib.Path(str(source)))),
+            pathlib.Path(str(destination)),
+            buckets=buckets,
+            batch_size=batch_size,
+            options=options_from_kwargs(kwargs),
+        )
+        logger.info(
+            f"wrote {merge.metadata.row_count} records to {merge.metadata.path},"
+            f" dropping {merge.duplicates} duplicates"
+        )
+        if collection:
+            stac_collection = Collection.from_file(collection)
+            national.add_to_collection(
+                stac_collection,
+                merge.metadata,
+                make_asset_hrefs_relative=make_asset_hrefs_relative,
+            )
+            stac_collection.save_object()
+
+    @fwsnwi.command(
+        "diff",
+        short_help="Writes the records changed between two releases of a state",
+    )
+    @click.argument("old")
+    @click.argument("new")
+    @click.argument("destination")
+    @click.option(
+        "--item",
+        type=click.Path(dir_okay=False, exists=True),
+        help="Add the change counts and delta files to this item",
+    )
+    @click.option(
+        "--role",
+        type=click.Choice(["wetlands", "riparian", "historic_wetlands"]),
+        default="wetlands",
+        help="Compare the layers with this role",
+        show_default=True,
+    )
+    @click.option(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="Read each layer in batches of this many records",
+        show_default=True,
+    )
+    @click.option(
+        "--buckets",
+        type=int,
+        default=DIFF_BUCKETS,
+        help=(
+            "Split records into this many buckets to compare them;"
+            " more buckets use less memory"
+        ),
+        show_default=True,
+    )
+    @click.option(
+        "--make-asset-hrefs-relative/--no-make-asset-hrefs-relative",
+        default=False,
+        help="Make the item's delta asset hrefs relative",
+        show_default=True,
+    )
+    @geoparquet_options
+    def diff_command(
+        old: str,
+        new: str,
+        destination: str,
+        item: Optional[str],
+        role: str,
+        batch_size: int,
+        buckets: int,
+        make_asset_hrefs_relative: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Writes the records added, removed and modified between two releases
+
+        Records are matched by a hash of their geometry, and compared by a
+        hash of their attributes. The changes are written to
+        ``<LAYER>_added``, ``<LAYER>_removed`` and ``<LAYER>_modified``
+        geoparquet files.
+
+        Args:
+            old (str): The old zipfile, or the geoparquet written from it
+            new (str): The new zipfile
+            destination (str): The directory to write the delta files to
+        """
+        from pystac import Item
+
+        from stactools.fws_nwi import diff, remote
+
+        changes = diff.compare(
+            remote.to_href(old),
+            remote.to_href(new),
+            pathlib.Path(destination),
+            role=role,
+            buckets=buckets,
+            batch_size=batch_size,
+            options=options_from_kwargs(kwargs),
+        )
+        logger.info(", ".join(f"{count} {k}" for k, count in changes.counts.items()))
+        if item:
+            stac_item = Item.from_file(item)
+            diff.add_to_item(
+                stac_item, changes, make_asset_hrefs_relative=make_asset_hrefs_relative
+            )
+            stac_item.save_object()
+
+    @fwsnwi.command(
+        "worker",
+        short_help="Creates items for zipfiles as they arrive in a spool directory",
+    )
+    @click.argument("spool")
+    @click.argument("destination")
+    @click.option(
+        "--workers",
+        type=int,
+        help="The number of worker processes (defaults to the number of CPUs)",
+    )
+    @click.option(
+        "--create-geoparquet/--no-create-geoparquet",
+        default=False,
+        help="Create geoparquet assets alongside the items",
+        show_default=True,
+    )
+    @click.option(
+        "--batch-size",
+        type=int,
+        help=(
+            "Stream each layer to geoparquet in batches of this many records,"
+            " which bounds memory use for large states"
+        ),
+    )
+    @click.option(
+        "--cache-directory",
+        type=click.Path(file_okay=False),
+        help="Cache scanned zipfiles here, and reuse them if they have not changed",
+    )
+    @click.option(
+        "--poll-seconds",
+        type=float,
+        default=1.0,
+        help="How often to check the spool directory for new jobs",
+        show_default=True,
+    )
+    @click.option(
+        "--once/--no-once",
+        default=False,
+        help="Exit once the jobs already in the spool directory are done",
+        show_default=True,
+    )
+    @geoparquet_options
+    @staging_options
+    def worker_command(
+        spool: str,
+        destination: str,
+        workers: Optional[int],
+        create_geoparquet: bool,
+        batch_size: Optional[int],
+        cache_directory: Optional[str],
+        poll_seconds: float,
+        once: bool,
+        **kwargs: Any,
+    ) -> None:
+        """Creates an item for each zipfile or job file dropped in a spool directory
+
+        Jobs are ``*_shapefile_wetlands.zip`` files, or ``*.job`` files
+        containing ``{"href": "..."}`` for a zipfile elsewhere. Each item is
+        written to ``DESTINATION/<ID>/<ID>.json``, along with its geoparquet
+        assets, and a status record for each job is appended to
+        ``DESTINATION/status.ndjson``.
+
+        Args:
+            spool (str): The directory to watch for jobs
+            destination (str): The directory to write items to
+        """
+        from stactools.fws_nwi.cache import Cache
+        from stactools.fws_nwi.worker import Worker
+
+        Worker(
+            pathlib.Path(spool),
+            pathlib.Path(destination),
+            workers=workers,
+            create_geoparquet=create_geoparquet,
+            batch_size=batch_size,
+            cache=Cache(pathlib.Path(cache_directory)) if cache_directory else None,
+            geoparquet_options=options_from_kwargs(kwargs),
+            staging_options=staging_options_from_kwargs(kwargs),
+            poll_seconds=poll_seconds,
+        ).run(once=once)
+
+    @fwsnwi.command(
+        "validate", short_help="Validates items and collections against their schemas"
+    )
+    @click.argument("paths", nargs=-1, required=True)
+    @click.option(
+        "--schema-directory",
+        type=click.Path(file_okay=False),
+        help="Read JSON schemas from here, and save any that are downloaded",
+    )
+    @click.option(
+        "--workers",
+        type=int,
+        help="The number of worker processes (defaults to the number of CPUs)",
+    )
+    def validate_command(
+        paths: Tuple[str, ...], schema_directory: Optional[str], workers: Optional[int]
+    ) -> None:
+        """Validates STAC JSON files, and the items of any collections among them
+
+        The core STAC schemas are bundled with pystac. Other schemas are read
+        from the schema directory if they are there, and otherwise downloaded
+        and saved to it, so a schema directory filled on a machine with
+        network access lets others validate without it.
+
+        Args:
+            paths (str): Item or collection JSON files
+        """
+        from stactools.fws_nwi import validation
+
+        files: List[pathlib.Path] = []
+        for path in map(pathlib.Path, paths):
+            with open(path) as f:
+                is_collection = json.load(f).get("type") == "Collection"
+            if is_collection:
+                files.extend(validation.collection_files(path))
+            else:
+                files.append(path)
+        _check(
+            validation.validate_files(
+                files, _optional_path(schema_directory), workers=workers
+            )
+        )
+        logger.info(f"{len(files)} files are valid")
+
     @fwsnwi.command("download", short_help="Download zipped shapefiles")
     @click.argument("codes", nargs=-1)
     @click.argument("destination", nargs=1)
-    def download(codes: List[str], destination: Path) -> None:
+    @click.option(
+        "--workers",
+        type=int,
+        default=4,
+        help="The number of files to download at once",
+        show_default=True,
+    )
+    @click.option(
+        "--retries",
+        type=int,
+        default=3,
+        help="The number of times to resume a download after a network error",
+        show_default=True,
+    )
+    def download_command(
+        codes: List[str], destination: Path, workers: int, retries: int
+    ) -> None:
         """Downloads some FWI zip files to the destination directory.
 
-        If no codes are provided, downloads them all. This will take a while.
+        If no codes are provided, downloads them all. Files that have not
+        changed since they were last downloaded are skipped, and interrupted
+        downloads are resumed.
         """
+        from stactools.fws_nwi import download
+
         if not codes:
             codes = States.codes()
-        os.makedirs(str(destination), exist_ok=True)
-        for code in codes:
-            url = f"https://www.fws.gov/wetlands/Data/State-Downloads/{code}_shapefile_wetlands.zip"
-            path = pathlib.Path(str(destination)) / os.path.basename(url)
-            response = requests.get(url, stream=True)
-            with tqdm.wrapattr(
-                open(path, "wb"),
-                "write",
-                miniters=1,
-                desc=url.split("/")[-1],
-                total=int(response.headers.get("content-length", 0)),
-            ) as fout:
-                for chunk in response.iter_content(chunk_size=4096):
-                    fout.write(chunk)
+        downloads = download.download_all(
+            list(codes),
+            pathlib.Path(str(destination)),
+            workers=workers,
+            retries=retries,
+            progress=True,
+        )
+        for d in downloads:
+            logger.info(f"{d.path}: {d.status}")
 
     return fwsnwi
+
+
+def _optional_path(path: Optional[str]) -> Optional[pathlib.Path]:
+    return pathlib.Path(path) if path else None
+
+
+def _check(errors: Dict[pathlib.Path, List[str]]) -> None:
+    """Raises a click exception listing the errors of any invalid files."""
+    invalid = {path: e for path, e in errors.items() if e}
+    for path, messages in invalid.items():
+        for message in messages:
+            logger.error(f"{path}: {message}")
+    if invalid:
+        raise click.ClickException(
+            "invalid: " + ", ".join(str(path) for path in invalid)
+        )
+
+
+def geoparquet_options(function: F) -> F:
+    """Adds the options that control how geoparquet files are written, which
+    :func:`options_from_kwargs` turns into :class:`geoparquet.Options`."""
+    options = [
+        click.option(
+            "--spatial-sort/--no-spatial-sort",
+            default=False,
+            help=(
+                "Sort geoparquet records along a Hilbert curve and add a bbox"
+                " covering column, so bbox queries can skip most row groups"
+            ),
+            show_default=True,
+        ),
+        click.option(
+            "--row-group-size",
+            type=int,
+            help="The maximum number of records per geoparquet row group",
+        ),
+        click.option(
+            "--nwi-schema/--no-nwi-schema",
+            default=True,
+            help=(
+                "Store the repetitive NWI text columns as categoricals, instead"
+                " of the types read from the shapefiles"
+            ),
+            show_default=True,
+        ),
+        click.option(
+            "--compression",
+            default="zstd",
+            help=(
+                "The geoparquet compression codec, optionally with a level,"
+                " like zstd:9"
+            ),
+            show_default=True,
+        ),
+        click.option(
+            "--column-compression",
+            multiple=True,
+            help=(
+                "The compression codec of one geoparquet column, like"
+                " geometry=zstd:9; may be given more than once"
+            ),
+        ),
+        click.option(
+            "--partition-by",
+            type=click.Choice([TILE, WETLAND_TYPE]),
+            multiple=True,
+            help=(
+                "Write the wetland layers as Hive-partitioned geoparquet"
+                " directories, split by this key; may be given more than once"
+            ),
+        ),
+    ]
+    for option in reversed(options):
+        function = option(function)
+    return function
+
+
+def options_from_kwargs(kwargs: Dict[str, Any]) -> "Options":
+    """Returns the geoparquet options added by :func:`geoparquet_options`."""
+    from stactools.fws_nwi import geoparquet
+
+    try:
+        compression = geoparquet.parse_compression(kwargs["compression"])
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="'--compression'")
+    try:
+        column_compression = tuple(
+            map(geoparquet.parse_column_compression, kwargs["column_compression"])
+        )
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="'--column-compression'")
+    return geoparquet.Options(
+        spatial_sort=kwargs["spatial_sort"],
+        row_group_size=kwargs["row_group_size"],
+        partition_by=kwargs["partition_by"],
+        nwi_schema=kwargs["nwi_schema"],
+        compression=compression,
+        column_compression=column_compression,
+    )
+
+
+def staging_options(function: F) -> F:
+    """Adds the options that control where zipfiles are extracted, which
+    :func:`staging_options_from_kwargs` turns into
+    :class:`staging.Options`."""
+    options = [
+        click.option(
+            "--staging-directory",
+            type=click.Path(file_okay=False),
+            help=(
+                "Extract the zipfiles' shapefiles here, instead of to shared"
+                " memory or the temporary directory"
+            ),
+        ),
+        click.option(
+            "--staging-memory-limit",
+            type=click.IntRange(min=0),
+            default=STAGING_MEMORY_LIMIT // 1024**2,
+            help=(
+                "Extract zipfiles whose shapefiles inflate to at most this many"
+                " MiB to shared memory, if there is room, and larger ones to"
+                " disk; 0 always uses disk"
+            ),
+            show_default=True,
+        ),
+    ]
+    for option in reversed(options):
+        function = option(function)
+    return function
+
+
+def staging_options_from_kwargs(kwargs: Dict[str, Any]) -> "staging.Options":
+    """Returns the staging options added by :func:`staging_options`."""
+    from stactools.fws_nwi import staging
+
+    directory = kwargs["staging_directory"]
+    return staging.Options(
+        directory=pathlib.Path(directory) if directory else None,
+        memory_limit=kwargs["staging_memory_limit"] * 1024**2,
+    )
@@ -90,3 +90,19 @@ PROJECTION_EXTENSION = "https://stac-extensions.github.io/projection/v1.0.0/sche
 
 DATETIME = datetime.datetime(2022, 10, 1, tzinfo=tzutc())
 ZIPFILE_ASSET_KEY = "zip"
+
+# Processing defaults, kept here so the command line can show them without
+# importing the geospatial libraries.
+# The number of records per batch when a layer is read in batches by default.
+BATCH_SIZE = 65536
+# Geoparquet partition keys, see stactools.fws_nwi.geoparquet.
+TILE = "tile"
+WETLAND_TYPE = "WETLAND_TY"
+# The number of buckets records are split into to find duplicates when
+# merging states.
+NATIONAL_BUCKETS = 256
+# The number of buckets records are split into to compare two releases.
+DIFF_BUCKETS = 64
+# Zipfiles whose shapefiles inflate to no more than this many bytes are
+# extracted to shared memory, see stactools.fws_nwi.staging.
+STAGING_MEMORY_LIMIT = 512 * 1024**2  # 512 MiB
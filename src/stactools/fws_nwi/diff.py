@@ -0,0 +1,342 @@
+"""Feature-level changes to a layer between two releases of a state.
+
+Each record is identified by a hash of its geometry's WKB, and its contents
+by a hash of its attributes. Records of the new release whose identity and
+contents are both in the old release are unchanged. Of the rest, a record is
+modified if the old release has a record with the same geometry but other
+attributes, and otherwise added; old records are removed if the new release
+has no record with their geometry. A record whose geometry changes is
+therefore removed and added.
+
+The changes are written as three small geoparquet files, so a downstream
+copy of the old release can be refreshed by deleting the removed and
+modified geometries and inserting the added and modified records.
+
+As when merging states, memory use is bounded by first spilling the records
+of both releases to scratch files by the leading bits of their geometry
+hash, then comparing one bucket at a time.
+"""
+
+import json
+import logging
+import shutil
+import tempfile
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy
+import pandas
+import pyarrow
+import pyarrow.dataset
+import pyarrow.ipc
+import pyarrow.parquet
+from pyproj import CRS
+from pystac import Item
+from pystac.utils import make_relative_href
+
+from stactools.fws_nwi import constants, geoparquet
+from stactools.fws_nwi import metadata as zipfile_metadata
+from stactools.fws_nwi import profiling, remote, scanner, stac, staging
+from stactools.fws_nwi.remote import Href
+
+logger = logging.getLogger(__name__)
+
+ROLE = "wetlands"
+BUCKETS = constants.DIFF_BUCKETS
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+# Geometries are identified by two independent 64 bit hashes, like records
+# are when merging states, and attributes by one. Hash keys are 16 bytes.
+HASH_KEYS = ("stactools-fwsnwi", "fws-nwi-geometry")
+VALUE_HASH_KEY = "fws-nwi-contents"
+# Columns derived from the records when they were written as geoparquet,
+# which are not part of a record's contents.
+DERIVED_COLUMNS = [geoparquet.BBOX_COLUMN, geoparquet.TILE]
+_HASH_COLUMNS = ["__key0__", "__key1__", "__value__"]
+_OLD = 0
+_NEW = 1
+
+
+@dataclass
+class Diff:
+    """The changes between two releases of a layer, and the delta files."""
+
+    added: geoparquet.Metadata
+    removed: geoparquet.Metadata
+    modified: geoparquet.Metadata
+    unchanged: int
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {
+            ADDED: self.added.row_count,
+            REMOVED: self.removed.row_count,
+            MODIFIED: self.modified.row_count,
+            "unchanged": self.unchanged,
+        }
+
+
+def compare(
+    old: Href,
+    new: Href,
+    directory: Path,
+    role: str = ROLE,
+    buckets: int = BUCKETS,
+    batch_size: int = scanner.BATCH_SIZE,
+    options: Optional[geoparquet.Options] = None,
+) -> Diff:
+    """Compares the layers with ``role`` of two releases of a state.
+
+    ``new`` is a zipfile, and ``old`` is either a zipfile or the geoparquet
+    file or partitioned directory written for that layer by ``create-item``.
+    The added, removed and modified records are written to ``directory``,
+    with scratch files next to them, and at most one bucket, roughly
+    ``1 / buckets`` of both releases, is held in memory at once.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(prefix=".diff.", dir=directory))
+    try:
+        sources = [
+            _spill(old, _OLD, scratch, role, buckets, batch_size),
+            _spill(new, _NEW, scratch, role, buckets, batch_size),
+        ]
+        (old_name, old_crs, old_schemas), (name, crs, new_schemas) = sources
+        if not new_schemas:
+            raise Exception(f"no {role} layers in {new}")
+        if not old_schemas:
+            raise Exception(f"no {role} layers in {old}")
+        if not CRS(old_crs).equals(CRS(crs)):
+            raise Exception(f"{old_name} and {name} are in different CRSs")
+        old_schema = pyarrow.unify_schemas(old_schemas)
+        new_schema = pyarrow.unify_schemas(new_schemas)
+        stem = Path(name).stem
+        writers = {
+            change: geoparquet.Writer(
+                f"{stem}_{change}.shp", directory, crs, options=options
+            )
+            for change in [ADDED, REMOVED, MODIFIED]
+        }
+        unchanged = 0
+        with profiling.stage("compare") as stage:
+            for bucket in range(buckets):
+                old_table = _read_bucket(scratch, bucket, _OLD, old_schema)
+                new_table = _read_bucket(scratch, bucket, _NEW, new_schema)
+                stage.rows += old_table.num_rows + new_table.num_rows
+                changes, count = _compare(old_table, new_table)
+                unchanged += count
+                for change, table in changes.items():
+                    if table.num_rows:
+                        writers[change].write(table.drop(_HASH_COLUMNS))
+        empty = {
+            ADDED: new_schema,
+            REMOVED: old_schema,
+            MODIFIED: new_schema,
+        }
+        for change, writer in writers.items():
+            if not writer.row_count:
+                writer.write(empty[change].empty_table().drop(_HASH_COLUMNS))
+        metadatas = {change: writer.close() for change, writer in writers.items()}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    diff = Diff(unchanged=unchanged, **metadatas)
+    logger.info(f"{name}: {diff.counts}")
+    return diff
+
+
+def add_to_item(
+    item: Item, diff: Diff, make_asset_hrefs_relative: bool = False
+) -> None:
+    """Adds the change counts and delta files of a diff to an item.
+
+    The counts are added as ``delta:*`` properties, and each delta file as a
+    geoparquet asset with a ``delta`` role.
+    """
+    for change, count in diff.counts.items():
+        item.properties[f"delta:{change}"] = count
+    metadatas = [diff.added, diff.removed, diff.modified]
+    for key, asset in stac.create_geoparquet_assets(metadatas).items():
+        asset.roles = (asset.roles or []) + ["delta"]
+        self_href = item.get_self_href()
+        if make_asset_hrefs_relative and self_href:
+            asset.href = make_relative_href(asset.href, self_href)
+        item.add_asset(key, asset)
+
+
+def is_zipfile(href: Href) -> bool:
+    return remote.name(href).lower().endswith(".zip")
+
+
+def hashes(table: pyarrow.Table) -> Tuple[numpy.ndarray, ...]:
+    """Returns the two geometry hashes and the attribute hash of each record.
+
+    Attributes are hashed in column name order after being cast to the NWI
+    schema, so a release read from a zipfile matches the same release read
+    from geoparquet, whatever the types it was written with.
+    """
+    geometry = pandas.Series(
+        table.column(geoparquet.GEOMETRY_COLUMN).to_numpy(zero_copy_only=False)
+    )
+    keys = [
+        pandas.util.hash_pandas_object(geometry, index=False, hash_key=key).to_numpy()
+        for key in HASH_KEYS
+    ]
+    attributes = geoparquet.conform(table.drop([geoparquet.GEOMETRY_COLUMN]))
+    for index, field in enumerate(attributes.schema):
+        if pyarrow.types.is_dictionary(field.type):
+            attributes = attributes.set_column(
+                index,
+                field.name,
+                attributes.column(index).cast(field.type.value_type),
+            )
+    frame = attributes.to_pandas()
+    value = pandas.util.hash_pandas_object(
+        frame[sorted(frame.columns)], index=False, hash_key=VALUE_HASH_KEY
+    ).to_numpy()
+    return keys[0], keys[1], value
+
+
+def _spill(
+    href: Href, side: int, scratch: Path, role: str, buckets: int, batch_size: int
+) -> Tuple[str, str, List[pyarrow.Schema]]:
+    """Spills the records of one release to scratch files, one per bucket.
+
+    Returns the name and CRS of the release's layer and its schemas.
+    """
+    name = remote.name(href)
+    crs = ""
+    schemas: List[pyarrow.Schema] = []
+    writers: Dict[int, pyarrow.ipc.RecordBatchStreamWriter] = {}
+    tables = _zipfile_tables if is_zipfile(href) else _geoparquet_tables
+    for name, crs, table in tables(href, role, batch_size):
+        with profiling.stage("spill", name) as stage:
+            stage.rows += table.num_rows
+            table = table.drop(
+                [column for column in DERIVED_COLUMNS if column in table.column_names]
+            )
+            for column, values in zip(_HASH_COLUMNS, hashes(table)):
+                table = table.append_column(column, pyarrow.array(values))
+            if not schemas or schemas[-1] != table.schema:
+                # Each layer, or change of schema, gets its own files.
+                for writer in writers.values():
+                    writer.close()
+                writers.clear()
+                schemas.append(table.schema)
+            bucket_of = table.column(_HASH_COLUMNS[0]).to_numpy() % buckets
+            for bucket in map(int, numpy.unique(bucket_of)):
+                if bucket not in writers:
+                    file = scratch / str(bucket) / f"{side}-{len(schemas)}.arrow"
+                    file.parent.mkdir(exist_ok=True)
+                    writers[bucket] = pyarrow.ipc.new_stream(str(file), table.schema)
+                writers[bucket].write_table(
+                    table.filter(pyarrow.array(bucket_of == bucket))
+                )
+    for writer in writers.values():
+        writer.close()
+    return name, crs, schemas
+
+
+def _zipfile_tables(
+    href: Href, role: str, batch_size: int
+) -> Iterator[Tuple[str, str, pyarrow.Table]]:
+    headers = [
+        header
+        for header in scanner.read_headers(href)
+        if zipfile_metadata.role(header.name) == role
+    ]
+    if not headers:
+        return
+    with staging.extract(href, layers=[header.name for header in headers]) as path:
+        for header in headers:
+            header = replace(header, href=str(path / header.name))
+            read_stage = profiling.stage("read", header.name)
+            batches = scanner.read_batches(header.href, batch_size)
+            for table in profiling.timed(batches, read_stage):
+                yield header.name, header.crs, table
+
+
+def _geoparquet_tables(
+    href: Href, role: str, batch_size: int
+) -> Iterator[Tuple[str, str, pyarrow.Table]]:
+    path = Path(href)
+    dataset = pyarrow.dataset.dataset(
+        path,
+        format="parquet",
+        partitioning=pyarrow.dataset.HivePartitioning.discover(
+            null_fallback=geoparquet.HIVE_DEFAULT_PARTITION
+        ),
+    )
+    files = dataset.files
+    if not files:
+        return
+    geo = pyarrow.parquet.read_schema(files[0]).metadata.get(b"geo")
+    if geo is None:
+        raise Exception(f"{path} is not geoparquet")
+    crs = _geo_crs(geo)
+    read_stage = profiling.stage("read", path.name)
+    batches = dataset.to_batches(batch_size=batch_size)
+    for batch in profiling.timed(batches, read_stage):
+        yield path.name, crs, pyarrow.Table.from_batches([batch])
+
+
+def _geo_crs(geo: bytes) -> str:
+    metadata = json.loads(geo)
+    column = metadata["columns"][metadata["primary_column"]]
+    # A missing CRS means longitude and latitude, per the GeoParquet spec.
+    return CRS.from_user_input(column.get("crs") or "OGC:CRS84").to_wkt()
+
+
+def _read_bucket(
+    scratch: Path, bucket: int, side: int, schema: pyarrow.Schema
+) -> pyarrow.Table:
+    files = sorted(
+        (scratch / str(bucket)).glob(f"{side}-*.arrow"),
+        key=lambda file: int(file.stem.split("-")[1]),
+    )
+    tables = []
+    for file in files:
+        with pyarrow.ipc.open_stream(str(file)) as reader:
+            tables.append(_conform(reader.read_all(), schema))
+    if not tables:
+        return schema.empty_table()
+    return pyarrow.concat_tables(tables)
+
+
+def _conform(table: pyarrow.Table, schema: pyarrow.Schema) -> pyarrow.Table:
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table.column(field.name).cast(field.type))
+        else:
+            columns.append(pyarrow.nulls(table.num_rows, field.type))
+    return pyarrow.Table.from_arrays(columns, schema=schema)
+
+
+def _compare(
+    old: pyarrow.Table, new: pyarrow.Table
+) -> Tuple[Dict[str, pyarrow.Table], int]:
+    """Returns the changes between the records of one bucket of each release,
+    and the number of unchanged records."""
+    old_records = _index(old, _HASH_COLUMNS)
+    new_records = _index(new, _HASH_COLUMNS)
+    new_changed = ~new_records.isin(old_records)
+    old_changed = ~old_records.isin(new_records)
+    old_keys = _index(old, _HASH_COLUMNS[:2])[old_changed]
+    new_keys = _index(new, _HASH_COLUMNS[:2])[new_changed]
+    modified = numpy.zeros(new.num_rows, dtype=bool)
+    modified[new_changed] = new_keys.isin(old_keys)
+    removed = numpy.zeros(old.num_rows, dtype=bool)
+    removed[old_changed] = ~old_keys.isin(new_keys)
+    changes = {
+        ADDED: new.filter(pyarrow.array(new_changed & ~modified)),
+        REMOVED: old.filter(pyarrow.array(removed)),
+        MODIFIED: new.filter(pyarrow.array(modified)),
+    }
+    return changes, int((~new_changed).sum())
+
+
+def _index(table: pyarrow.Table, columns: List[str]) -> pandas.MultiIndex:
+    return pandas.MultiIndex.from_arrays(
+        [table.column(column).to_numpy() for column in columns]
+    )
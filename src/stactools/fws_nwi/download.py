@@ -0,0 +1,186 @@
+"""Concurrent, resumable, conditional downloads of the state zipfiles."""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://www.fws.gov/wetlands/Data/State-Downloads"
+CHUNK_SIZE = 1024**2  # 1 MiB
+TIMEOUT = 60
+
+DOWNLOADED = "downloaded"
+RESUMED = "resumed"
+UNCHANGED = "unchanged"
+
+
+@dataclass
+class Download:
+    url: str
+    path: Path
+    status: str
+
+
+def zipfile_url(code: str, base_url: str = BASE_URL) -> str:
+    return f"{base_url}/{code}_shapefile_wetlands.zip"
+
+
+def download_all(
+    codes: List[str],
+    destination: Path,
+    base_url: str = BASE_URL,
+    workers: int = 4,
+    retries: int = 3,
+    chunk_size: int = CHUNK_SIZE,
+    progress: bool = False,
+) -> List[Download]:
+    """Downloads the zipfiles for some state codes, several at a time.
+
+    See :func:`download` for how each file is fetched. The downloads are
+    returned in the order of ``codes``.
+    """
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    with requests.Session() as session, tqdm(
+        total=len(codes), unit="file", disable=not progress
+    ) as bar:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def fetch(code: str) -> Download:
+            result = download(
+                zipfile_url(code, base_url),
+                destination,
+                retries=retries,
+                chunk_size=chunk_size,
+                session=session,
+            )
+            bar.update()
+            return result
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fetch, codes))
+
+
+def download(
+    url: str,
+    directory: Path,
+    retries: int = 3,
+    chunk_size: int = CHUNK_SIZE,
+    session: Optional[requests.Session] = None,
+) -> Download:
+    """Downloads a url into a directory.
+
+    The ETag and Last-Modified headers of a completed download are kept in a
+    ``.json`` file next to it, and sent back as a conditional request the
+    next time so an unchanged file is not transferred again. Bytes are
+    streamed to a ``.part`` file, and if the connection drops the download
+    resumes from the end of that file with a Range request, up to
+    ``retries`` times. A ``.part`` file that is already complete, because
+    the download stopped before it was renamed, is kept, and one that
+    doesn't match the remote file is discarded, as is any ``.part`` file left
+    beside a file that turns out to be unchanged.
+    """
+    if session is None:
+        with requests.Session() as session:
+            return download(url, directory, retries, chunk_size, session)
+    path = Path(directory) / url.split("/")[-1]
+    partial_path = path.with_name(path.name + ".part")
+    validators_path = path.with_name(path.name + ".json")
+    partial_validators_path = partial_path.with_name(partial_path.name + ".json")
+
+    headers = {}
+    if path.exists():
+        validators = _read_json(validators_path)
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    resumed = False
+    attempt = 0
+    while True:
+        request_headers = dict(headers)
+        offset = partial_path.stat().st_size if partial_path.exists() else 0
+        partial_validators = _read_json(partial_validators_path)
+        if offset and partial_validators:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = partial_validators.get(
+                "etag", partial_validators.get("last_modified", "")
+            )
+        try:
+            with session.get(
+                url, headers=request_headers, stream=True, timeout=TIMEOUT
+            ) as response:
+                if response.status_code == 304:
+                    logger.info(f"{url} is unchanged")
+                    partial_path.unlink(missing_ok=True)
+                    partial_validators_path.unlink(missing_ok=True)
+                    return Download(url=url, path=path, status=UNCHANGED)
+                if response.status_code == 416 and offset:
+                    if _content_length(response) == offset:
+                        logger.info(f"{partial_path} is already complete")
+                        resumed = True
+                        break
+                    logger.warning(f"restarting {url}, {partial_path} doesn't match")
+                    partial_path.unlink()
+                    partial_validators_path.unlink(missing_ok=True)
+                    continue
+                response.raise_for_status()
+                if response.status_code == 206:
+                    mode = "ab"
+                    resumed = True
+                else:
+                    mode = "wb"
+                    _write_json(partial_validators_path, _validators(response))
+                with open(partial_path, mode, buffering=chunk_size) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                break
+        except requests.RequestException as error:
+            attempt += 1
+            if attempt > retries:
+                raise
+            logger.warning(f"retrying {url} after error: {error}")
+            time.sleep(min(2**attempt, 30))
+
+    partial_path.replace(path)
+    partial_validators_path.replace(validators_path)
+    return Download(url=url, path=path, status=RESUMED if resumed else DOWNLOADED)
+
+
+def _validators(response: requests.Response) -> Dict[str, str]:
+    validators = {}
+    if "ETag" in response.headers:
+        validators["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        validators["last_modified"] = response.headers["Last-Modified"]
+    return validators
+
+
+def _content_length(response: requests.Response) -> Optional[int]:
+    # A 416 response gives the length of the whole file as "bytes */<length>".
+    length = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(length) if length.isdigit() else None
+
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    if path.exists():
+        with open(path) as f:
+            return dict(json.load(f))
+    else:
+        return {}
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f)
@@ -0,0 +1,222 @@
+"""Exporting items to single files for bulk loading into a STAC API.
+
+Items are written to newline-delimited JSON as soon as they are created, so
+loaders such as pgstac can ingest a whole batch run with one sequential read.
+They can also be written as `stac-geoparquet`_, one row per item with the
+item's properties as columns.
+
+.. _stac-geoparquet: https://github.com/stac-utils/stac-geoparquet
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, Dict, Iterator, List, Optional, Type
+
+import numpy
+import pyarrow
+import pyarrow.parquet
+import shapely
+import shapely.geometry
+from dateutil.parser import isoparse
+from pystac import Item
+
+from stactools.fws_nwi import geoparquet
+
+# The CRS of STAC item geometries.
+CRS_STRING = "OGC:CRS84"
+_COLUMNS = ["type", "stac_version", "stac_extensions", "id", "geometry", "bbox"]
+_TIMESTAMPS = ["datetime", "start_datetime", "end_datetime", "created", "updated"]
+# Items are written to stac-geoparquet this many at a time.
+BATCH_SIZE = 1000
+
+
+class Exporter:
+    """Writes items to NDJSON and/or stac-geoparquet as they are added.
+
+    Each item is appended to ``ndjson``, if given, and flushed as soon as it
+    is added, so an interrupted run leaves every finished item behind. The
+    ``stac_geoparquet`` file, if given, is written when the exporter is
+    closed, since every row of a parquet file needs the same schema and the
+    items' assets differ from state to state. Until then its items are kept
+    in ``ndjson``, or a scratch file next to it, rather than in memory.
+
+    If ``collection`` is given, it is set as each item's collection id.
+    """
+
+    def __init__(
+        self,
+        ndjson: Optional[Path] = None,
+        stac_geoparquet: Optional[Path] = None,
+        collection: Optional[str] = None,
+    ):
+        self.ndjson = Path(ndjson) if ndjson else None
+        self.stac_geoparquet = Path(stac_geoparquet) if stac_geoparquet else None
+        self.collection = collection
+        self.count = 0
+        self._scratch: Optional[Path] = None
+        self._file: Optional[IO[str]] = None
+        if self.ndjson:
+            self._file = open(self.ndjson, "w")
+        elif self.stac_geoparquet:
+            descriptor, name = tempfile.mkstemp(
+                prefix=f".{self.stac_geoparquet.name}.",
+                suffix=".ndjson",
+                dir=self.stac_geoparquet.parent,
+            )
+            self._scratch = Path(name)
+            self._file = os.fdopen(descriptor, "w")
+
+    def add(self, item: Item) -> None:
+        if self._file is None:
+            return
+        if self.collection:
+            item.collection_id = self.collection
+        data = item.to_dict(include_self_link=False, transform_hrefs=False)
+        self._file.write(json.dumps(data, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            if self.stac_geoparquet:
+                path = self.ndjson or self._scratch
+                assert path
+                write_stac_geoparquet(path, self.stac_geoparquet)
+        finally:
+            if self._scratch:
+                self._scratch.unlink()
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def read_ndjson(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_stac_geoparquet(
+    ndjson: Path, path: Path, batch_size: int = BATCH_SIZE
+) -> int:
+    """Writes the items in an NDJSON file as stac-geoparquet, returning the
+    count.
+
+    Item properties become top-level columns, the geometry is WKB with a
+    ``bbox`` covering column, and timestamps are stored as UTC timestamps.
+    Links and assets are nested columns. Every column and nested field of
+    any item is kept: the file is read twice, once to build a schema that
+    covers every item, and again to write ``batch_size`` items at a time.
+    """
+    fields: Dict[str, pyarrow.DataType] = {}
+    corners: List[List[float]] = []
+    for rows in _batches(read_ndjson(ndjson), batch_size):
+        for key in _keys(rows):
+            inferred = pyarrow.array([row.get(key) for row in rows]).type
+            if key in fields:
+                inferred = _merge_types(key, fields[key], inferred)
+            fields[key] = inferred
+        for row in rows:
+            box = row[geoparquet.BBOX_COLUMN]
+            corners.append([box["xmin"], box["ymin"], box["xmax"], box["ymax"]])
+    names = [c for c in _COLUMNS if c in fields] + [
+        c for c in fields if c not in _COLUMNS
+    ]
+    bbox = None
+    if corners:
+        bounds = numpy.array(corners)
+        bbox = [*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0)]
+    geo = geoparquet.geo_metadata(CRS_STRING, bbox, covering=True)
+    schema = pyarrow.schema(
+        [pyarrow.field(name, fields[name]) for name in names],
+        metadata={b"geo": json.dumps(geo).encode()},
+    )
+    count = 0
+    with pyarrow.parquet.ParquetWriter(str(path), schema) as writer:
+        for rows in _batches(read_ndjson(ndjson), batch_size):
+            writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+            count += len(rows)
+    return count
+
+
+def _batches(
+    items: Iterator[Dict[str, Any]], batch_size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    rows = []
+    for item in items:
+        rows.append(to_row(item))
+        if len(rows) == batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def _keys(rows: List[Dict[str, Any]]) -> List[str]:
+    return list(dict.fromkeys(key for row in rows for key in row))
+
+
+def _merge_types(
+    name: str, first: pyarrow.DataType, second: pyarrow.DataType
+) -> pyarrow.DataType:
+    # Items don't all have the same properties, assets or asset fields, so
+    # columns and struct fields missing from some items are merged in.
+    if first == second or pyarrow.types.is_null(second):
+        return first
+    elif pyarrow.types.is_null(first):
+        return second
+    elif pyarrow.types.is_struct(first) and pyarrow.types.is_struct(second):
+        fields = {field.name: field.type for field in first}
+        for field in second:
+            if field.name in fields:
+                fields[field.name] = _merge_types(
+                    f"{name}.{field.name}", fields[field.name], field.type
+                )
+            else:
+                fields[field.name] = field.type
+        return pyarrow.struct(list(fields.items()))
+    elif pyarrow.types.is_list(first) and pyarrow.types.is_list(second):
+        return pyarrow.list_(_merge_types(name, first.value_type, second.value_type))
+    elif all(
+        pyarrow.types.is_integer(t) or pyarrow.types.is_floating(t)
+        for t in [first, second]
+    ):
+        return pyarrow.float64()
+    else:
+        raise Exception(f"{name} is {first} in some items and {second} in others")
+
+
+def to_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flattens an item dictionary into a stac-geoparquet row."""
+    row = {k: v for k, v in item.items() if k not in ["properties", "bbox"]}
+    row.update(item.get("properties", {}))
+    row[geoparquet.GEOMETRY_COLUMN] = shapely.to_wkb(
+        shapely.geometry.shape(item["geometry"])
+    )
+    xmin, ymin, xmax, ymax = item["bbox"][:4]
+    row[geoparquet.BBOX_COLUMN] = {
+        "xmin": xmin,
+        "ymin": ymin,
+        "xmax": xmax,
+        "ymax": ymax,
+    }
+    for key in _TIMESTAMPS:
+        if row.get(key):
+            row[key] = isoparse(row[key])
+    return row
@@ -0,0 +1,216 @@
+"""FlatGeobuf copies of the shapefile layers.
+
+FlatGeobuf files start with a packed Hilbert R-tree of their features'
+bounding boxes, so web maps and desktop GIS can read just the features in a
+viewport with a few HTTP range requests instead of downloading the file.
+"""
+
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import fiona
+import geopandas
+import pyarrow
+import shapely
+import shapely.geometry
+
+from stactools.fws_nwi import metadata as zipfile_metadata
+from stactools.fws_nwi.geoparquet import GEOMETRY_COLUMN
+
+DRIVER = "FlatGeobuf"
+MEDIA_TYPE = "application/vnd.flatgeobuf"
+SUFFIX = ".fgb"
+
+# Batches handed to the background writer are queued at most this deep, so
+# reading never runs far ahead of writing.
+QUEUE_SIZE = 2
+_POLL_SECONDS = 0.1
+
+# Fiona field types for Arrow types, used when pyogrio is not available to
+# write Arrow batches directly.
+FIONA_TYPES = {
+    "string": "str",
+    "large_string": "str",
+    "int32": "int32",
+    "int64": "int",
+    "double": "float",
+    "float": "float",
+}
+
+
+@dataclass
+class Metadata:
+    key: str
+    path: Path
+    title: str
+    description: str
+    role: Optional[str]
+    row_count: int
+
+
+def write(dataframe: geopandas.GeoDataFrame, name: str, directory: Path) -> Metadata:
+    """Writes one shapefile layer, already read into memory, as FlatGeobuf."""
+    path = flatgeobuf_path_for(name, directory)
+    path.unlink(missing_ok=True)
+    dataframe.to_file(path, driver=DRIVER, layer=path.stem, SPATIAL_INDEX="YES")
+    return create_metadata(name, path, len(dataframe))
+
+
+class Writer:
+    """Writes one shapefile layer as FlatGeobuf, a batch of records at a time.
+
+    Each batch is an Arrow table with a WKB ``geometry`` column. With pyogrio,
+    batches are passed to GDAL's Arrow writer in a background thread, which
+    buffers their features on disk and writes the spatial index and the
+    sorted features when the writer is closed. Otherwise features are written
+    one at a time with fiona. If writing fails part way, call :meth:`abort`
+    instead of :meth:`close`.
+    """
+
+    def __init__(self, name: str, directory: Path, crs: str):
+        self.name = name
+        self.path = flatgeobuf_path_for(name, directory)
+        self.crs = crs
+        self.row_count = 0
+        self._queue: "queue.Queue[Optional[pyarrow.RecordBatch]]" = queue.Queue(
+            QUEUE_SIZE
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        self._collection: Optional[Any] = None
+
+    def write(self, table: pyarrow.Table) -> None:
+        if self._thread is None and self._collection is None:
+            self._open(table.schema)
+        self.row_count += table.num_rows
+        if self._collection is not None:
+            self._collection.writerecords(_records(table))
+            return
+        for batch in table.to_batches():
+            self._put(batch)
+
+    def close(self) -> Metadata:
+        if self._thread is None and self._collection is None:
+            raise Exception(f"no records were written to {self.path}")
+        if self._collection is not None:
+            self._collection.close()
+        else:
+            self._put(None)
+            assert self._thread
+            self._thread.join()
+            if self._error:
+                raise self._error
+        return create_metadata(self.name, self.path, self.row_count)
+
+    def abort(self) -> None:
+        """Stops writing after an error, and removes the partly written file."""
+        if self._collection is not None:
+            self._collection.close()
+            self._collection = None
+        if self._thread is not None:
+            try:
+                self._put(None)
+            except Exception:
+                pass
+            self._thread.join()
+            self._thread = None
+        self.path.unlink(missing_ok=True)
+
+    def _open(self, schema: pyarrow.Schema) -> None:
+        self.path.unlink(missing_ok=True)
+        try:
+            from pyogrio.raw import write_arrow
+        except ImportError:
+            self._collection = fiona.open(
+                self.path,
+                "w",
+                driver=DRIVER,
+                layer=self.path.stem,
+                crs=self.crs,
+                schema=_fiona_schema(schema),
+                SPATIAL_INDEX="YES",
+            )
+            return
+
+        def run() -> None:
+            try:
+                write_arrow(
+                    pyarrow.RecordBatchReader.from_batches(
+                        schema, iter(self._queue.get, None)
+                    ),
+                    str(self.path),
+                    layer=self.path.stem,
+                    driver=DRIVER,
+                    geometry_name=GEOMETRY_COLUMN,
+                    geometry_type="Unknown",
+                    crs=self.crs,
+                    layer_options={"SPATIAL_INDEX": "YES"},
+                )
+            except BaseException as error:
+                self._error = error
+
+        # A daemon, so that a writer that is never closed can't keep the
+        # interpreter from exiting.
+        self._thread = threading.Thread(
+            target=run, name=f"flatgeobuf-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, batch: Optional[pyarrow.RecordBatch]) -> None:
+        assert self._thread
+        while True:
+            try:
+                self._queue.put(batch, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                # If the writer failed it has stopped taking batches.
+                if not self._thread.is_alive():
+                    break
+        if self._error:
+            raise self._error
+        raise Exception(f"the writer of {self.path} stopped unexpectedly")
+
+
+def flatgeobuf_path_for(name: str, directory: Path) -> Path:
+    return directory / (Path(name).stem + SUFFIX)
+
+
+def create_metadata(name: str, path: Path, row_count: int) -> Metadata:
+    stem = Path(name).stem
+    title = stem.replace("_", " ")
+    return Metadata(
+        key=f"{stem}_flatgeobuf",
+        path=path,
+        title=title,
+        description=f"{title} FlatGeobuf",
+        role=zipfile_metadata.role(name),
+        row_count=row_count,
+    )
+
+
+def _fiona_schema(schema: pyarrow.Schema) -> Dict[str, Any]:
+    return {
+        "geometry": "Unknown",
+        "properties": {
+            field.name: FIONA_TYPES.get(str(field.type), "str")
+            for field in schema
+            if field.name != GEOMETRY_COLUMN
+        },
+    }
+
+
+def _records(table: pyarrow.Table) -> Any:
+    geometries = shapely.from_wkb(
+        table.column(GEOMETRY_COLUMN).to_numpy(zero_copy_only=False)
+    )
+    properties = table.drop([GEOMETRY_COLUMN]).to_pylist()
+    for geometry, record in zip(geometries, properties):
+        yield {
+            "geometry": (
+                shapely.geometry.mapping(geometry) if geometry is not None else None
+            ),
+            "properties": record,
+        }
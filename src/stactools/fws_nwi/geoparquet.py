@@ -1,13 +1,116 @@
+import json
+import shutil
+import tempfile
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from zipfile import ZipFile
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
 
 import geopandas
-import stac_table
+import numpy
+import pyarrow
+import pyarrow.compute
+import pyarrow.ipc
+import pyarrow.parquet
+import shapely
+from pyproj import CRS
 
+from stactools.fws_nwi import checksum, constants
 from stactools.fws_nwi import metadata as zipfile_metadata
 
+GEOMETRY_COLUMN = "geometry"
+BBOX_COLUMN = "bbox"
+HILBERT = "hilbert"
+
+# Spatially sorted files are written in row groups of this many records, so
+# the bbox statistics of each row group cover a small area.
+ROW_GROUP_SIZE = 16384
+
+# The order of the Hilbert curve used for sorting, and the number of leading
+# bits of its keys used to split a layer into buckets that fit in memory.
+HILBERT_ORDER = 16
+BUCKET_BITS = 6
+_KEY_COLUMN = "__hilbert__"
+
+# Partition keys. TILE is a grid cell of TILE_DEGREES on a side in
+# longitude and latitude, named like ``-77_38`` after its south west corner,
+# and WETLAND_TYPE is the shapefile's (truncated) wetland type column.
+TILE = constants.TILE
+TILE_DEGREES = 1
+WETLAND_TYPE = constants.WETLAND_TYPE
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Partitioned datasets keep at most this many files open, and buffer at most
+# this many records across all partitions, before writing to disk.
+MAX_OPEN_FILES = 64
+MAX_BUFFERED_ROWS = 262144
+
+# The default compression codec. Zstandard makes much smaller files than
+# parquet's default of Snappy, and decompresses about as quickly.
+CODEC = "zstd"
+
+# Arrow types for the NWI attribute columns, see :func:`conform`. Their
+# repetitive text is dictionary-encoded, so it is read back as categoricals.
+# Free text, like COMMENTS, and numbers keep the types read from the
+# shapefiles, since narrower numbers would lose precision.
+CATEGORY = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+NWI_TYPES: Dict[str, pyarrow.DataType] = {
+    "ATTRIBUTE": CATEGORY,
+    "WETLAND_TY": CATEGORY,
+    "STATUS": CATEGORY,
+    "SUPPMAPINF": CATEGORY,
+    "FGDC_METAD": CATEGORY,
+    "DATA_SOURC": CATEGORY,
+    "IMAGE_DATE": CATEGORY,
+    "ALL_SCALES": CATEGORY,
+    "EMULSION": CATEGORY,
+    "SOURCE_TYP": CATEGORY,
+}
+
+
+@dataclass(frozen=True)
+class Compression:
+    """A parquet compression codec, and its level if not the codec's default."""
+
+    codec: str = CODEC
+    level: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Options:
+    """How geoparquet files are laid out.
+
+    If ``spatial_sort`` is True, records are sorted along a Hilbert curve and
+    a GeoParquet 1.1 ``bbox`` covering column is added, so readers can use
+    the row group statistics to skip the parts of a file outside of their
+    area of interest. ``row_group_size`` is the maximum number of records
+    per row group, which defaults to :data:`ROW_GROUP_SIZE` for sorted and
+    partitioned files.
+
+    If ``partition_by`` names any of :data:`TILE` or a column, such as
+    :data:`WETLAND_TYPE`, the wetland, riparian, and historic wetland layers
+    are written as Hive-partitioned directories of parquet files instead, so
+    that queries filtering on those keys only read the matching partitions.
+    Layers without a partition column are not partitioned by it.
+
+    If ``nwi_schema`` is True, the known NWI columns are cast to
+    :data:`NWI_TYPES`. Every column is compressed with ``compression``, except
+    for those named in ``column_compression``.
+
+    If ``checksum`` is True, the size and checksum of each file are computed
+    as it is written, see :mod:`stactools.fws_nwi.checksum`. Partitioned
+    layers are directories, which have neither.
+    """
+
+    spatial_sort: bool = False
+    row_group_size: Optional[int] = None
+    partition_by: Tuple[str, ...] = ()
+    nwi_schema: bool = True
+    compression: Compression = Compression()
+    column_compression: Tuple[Tuple[str, Compression], ...] = ()
+    checksum: bool = False
+
 
 @dataclass
 class Metadata:
@@ -19,32 +122,630 @@ class Metadata:
     columns: List[Dict[str, Any]]
     primary_geometry: str
     row_count: int
+    covering: Optional[Dict[str, Any]] = None
+    sorting: Optional[str] = None
+    partitioning: Optional[List[str]] = None
+    size: Optional[int] = None
+    checksum: Optional[str] = None
+
+
+def from_zipfile(
+    path: Path,
+    directory: Path,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    options: Optional[Options] = None,
+) -> List[Metadata]:
+    """Converts every layer of a zipfile to geoparquet in ``directory``.
+
+    If ``workers`` is more than one, that many layers are converted
+    concurrently, in threads or, if ``processes`` is True, in processes. The
+    returned metadata is always in the zipfile's layer order.
+    """
+    from stactools.fws_nwi import scanner
+
+    layers = scanner.scan_layers(
+        path,
+        directory,
+        metadata=False,
+        batch_size=batch_size,
+        workers=workers,
+        processes=processes,
+        geoparquet_options=options,
+    )
+    return [layer.geoparquet for layer in layers if layer.geoparquet]
+
 
+def write(
+    dataframe: geopandas.GeoDataFrame,
+    name: str,
+    directory: Path,
+    options: Optional[Options] = None,
+) -> Metadata:
+    """Writes one shapefile layer, already read into memory, as geoparquet."""
+    writer = Writer(
+        name, directory, dataframe.crs.to_wkt(), list(dataframe.total_bounds), options
+    )
+    try:
+        writer.write(
+            pyarrow.Table.from_pandas(dataframe.to_wkb(), preserve_index=False)
+        )
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
 
-def from_zipfile(path: Path, directory: Path) -> List[Metadata]:
-    metadatas = []
-    with ZipFile(path) as zipfile:
-        for name in (n for n in zipfile.namelist() if n.endswith(".shp")):
-            geoparquet_path = directory / (Path(name).stem + ".geoparquet")
-            dataframe = geopandas.read_file(f"zip://{path}!{name}")
-            row_count = len(dataframe)
-            primary_geometry = dataframe.geometry.name
-            dataframe.to_parquet(geoparquet_path)
-            dataset = stac_table.parquet_dataset_from_url(str(geoparquet_path), None)
-            columns = stac_table.get_columns(dataset)
-            key = geoparquet_path.stem
-            title = key.replace("_", " ")
-            role = zipfile_metadata.role(name)
-            metadatas.append(
-                Metadata(
-                    key=key,
-                    path=geoparquet_path,
-                    title=title,
-                    description=f"{title} geoparquet",
-                    role=role,
-                    row_count=row_count,
-                    primary_geometry=primary_geometry,
-                    columns=columns,
+
+class Writer:
+    """Writes one shapefile layer as geoparquet, a batch of records at a time.
+
+    Each batch is an Arrow table with a WKB ``geometry`` column and is written
+    as its own row group, or several if it is longer than the options'
+    ``row_group_size``, so only one batch is held in memory at once.
+
+    If the options ask for a spatial sort, batches are instead split into
+    buckets by the leading bits of their Hilbert keys and spilled to a
+    scratch directory next to the output. When the writer is closed each
+    bucket is read back, sorted and written in turn, so memory use is bounded
+    by the size of a bucket rather than the whole layer.
+
+    If the layer is partitioned, the output path is a directory of
+    ``key=value`` subdirectories instead of a file. If writing fails part
+    way, call :meth:`abort` instead of :meth:`close`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: Path,
+        crs: str,
+        bbox: Optional[Sequence[float]] = None,
+        options: Optional[Options] = None,
+    ):
+        self.name = name
+        self.path = geoparquet_path_for(name, directory)
+        self.crs = crs
+        self.bbox = bbox
+        self.options = options or Options()
+        self.row_count = 0
+        self._writer: Optional[pyarrow.parquet.ParquetWriter] = None
+        self._sink: Optional[checksum.HashingFile] = None
+        self._dataset: Optional[_Dataset] = None
+        self._partition_keys: Optional[List[str]] = None
+        self._metadata_collector: List[pyarrow.parquet.FileMetaData] = []
+        self._buckets: Dict[int, pyarrow.ipc.RecordBatchStreamWriter] = {}
+        self._scratch: Optional[Path] = None
+        self._empty: Optional[pyarrow.Table] = None
+
+    def write(self, table: pyarrow.Table) -> None:
+        if self._partition_keys is None:
+            self._partition_keys = partition_keys(
+                self.name, table.column_names, self.options
+            )
+        if not self.options.spatial_sort and TILE not in self._partition_keys:
+            self._write(table, self.options.row_group_size)
+            return
+        bounds = shapely.bounds(
+            shapely.from_wkb(
+                table.column(GEOMETRY_COLUMN).to_numpy(zero_copy_only=False)
+            )
+        )
+        if TILE in self._partition_keys:
+            table = table.append_column(TILE, tiles(bounds, self.crs))
+        if not self.options.spatial_sort:
+            self._write(table, self.options.row_group_size)
+            return
+        if self.bbox is None and len(bounds):
+            self.bbox = [
+                float(numpy.nanmin(bounds[:, 0])),
+                float(numpy.nanmin(bounds[:, 1])),
+                float(numpy.nanmax(bounds[:, 2])),
+                float(numpy.nanmax(bounds[:, 3])),
+            ]
+        keys = hilbert_keys(
+            bounds, self.bbox if self.bbox is not None else [0, 0, 1, 1]
+        )
+        table = table.append_column(BBOX_COLUMN, bbox_array(bounds))
+        if self._empty is None:
+            self._empty = table.slice(0, 0)
+        table = table.append_column(_KEY_COLUMN, pyarrow.array(keys))
+        if self._scratch is None:
+            self._scratch = Path(
+                tempfile.mkdtemp(prefix=f".{self.path.stem}.", dir=self.path.parent)
+            )
+        buckets = keys >> numpy.uint64(2 * HILBERT_ORDER - BUCKET_BITS)
+        for bucket in map(int, numpy.unique(buckets)):
+            if bucket not in self._buckets:
+                self._buckets[bucket] = pyarrow.ipc.new_stream(
+                    str(self._scratch / f"{bucket}.arrow"), table.schema
                 )
+            self._buckets[bucket].write_table(
+                table.filter(pyarrow.array(buckets == bucket))
+            )
+
+    def close(self) -> Metadata:
+        if self.options.spatial_sort:
+            try:
+                for table in self._sorted_tables():
+                    self._write(table, None)
+            finally:
+                if self._scratch:
+                    shutil.rmtree(self._scratch, ignore_errors=True)
+        sorting = HILBERT if self.options.spatial_sort else None
+        if self._dataset:
+            return create_metadata(
+                self.name,
+                self.path,
+                self._dataset.close(),
+                sorting=sorting,
+                row_count=self._dataset.row_count,
+                partitioning=self._dataset.keys,
+            )
+        if self._writer is None:
+            raise Exception(f"no batches were written for {self.name}")
+        self._writer.close()
+        digest = None
+        if self._sink:
+            self._sink.close()
+            digest = self._sink.digest()
+        return create_metadata(
+            self.name,
+            self.path,
+            self._metadata_collector[0],
+            sorting=sorting,
+            digest=digest,
+        )
+
+    def abort(self) -> None:
+        """Stops writing after an error, and removes the partly written output
+        and any scratch files."""
+        for bucket in self._buckets.values():
+            try:
+                bucket.close()
+            except Exception:
+                pass
+        self._buckets.clear()
+        if self._scratch:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+            self._scratch = None
+        if self._dataset:
+            self._dataset.abort()
+            self._dataset = None
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        if self._sink:
+            self._sink.close()
+        if self.path.is_dir():
+            shutil.rmtree(self.path, ignore_errors=True)
+        else:
+            self.path.unlink(missing_ok=True)
+
+    def _write(self, table: pyarrow.Table, row_group_size: Optional[int]) -> None:
+        if self.options.nwi_schema:
+            table = conform(table)
+        if self._partition_keys:
+            if self._dataset is None:
+                geo = geo_metadata(self.crs, covering=BBOX_COLUMN in table.column_names)
+                self._dataset = _Dataset(
+                    self.path,
+                    self._partition_keys,
+                    {"geo": json.dumps(geo)},
+                    self.options.row_group_size or ROW_GROUP_SIZE,
+                    self.options,
+                )
+            self._dataset.write(table)
+            self.row_count += table.num_rows
+            return
+        if self._writer is None:
+            geo = geo_metadata(
+                self.crs, self.bbox, covering=BBOX_COLUMN in table.column_names
+            )
+            schema = table.schema.with_metadata({"geo": json.dumps(geo)})
+            if self.options.checksum:
+                self._sink = checksum.HashingFile(open(self.path, "wb"))
+            self._writer = pyarrow.parquet.ParquetWriter(
+                self._sink or str(self.path),
+                schema,
+                metadata_collector=self._metadata_collector,
+                **parquet_arguments(schema, self.options),
+            )
+        self._writer.write_table(table, row_group_size=row_group_size)
+        self.row_count += table.num_rows
+
+    def _sorted_tables(self) -> Iterator[pyarrow.Table]:
+        # Buckets are written in key order, and their records are regrouped
+        # so that every row group but the last is full.
+        row_group_size = self.options.row_group_size or ROW_GROUP_SIZE
+        for writer in self._buckets.values():
+            writer.close()
+        pending = None
+        for bucket in sorted(self._buckets):
+            assert self._scratch
+            with pyarrow.ipc.open_stream(str(self._scratch / f"{bucket}.arrow")) as f:
+                table = f.read_all()
+            (self._scratch / f"{bucket}.arrow").unlink()
+            order = numpy.argsort(table.column(_KEY_COLUMN).to_numpy(), kind="stable")
+            table = table.take(pyarrow.array(order)).drop([_KEY_COLUMN])
+            if pending is not None:
+                table = pyarrow.concat_tables([pending, table])
+            full = table.num_rows - table.num_rows % row_group_size
+            for offset in range(0, full, row_group_size):
+                yield table.slice(offset, row_group_size)
+            pending = table.slice(full)
+        if pending is not None and pending.num_rows:
+            yield pending
+        elif pending is None and self._empty is not None:
+            yield self._empty
+
+
+class _Dataset:
+    """A Hive-partitioned directory of parquet files, written a table at a time.
+
+    Records are buffered per partition until there are enough for a full row
+    group. Only :data:`MAX_OPEN_FILES` files are kept open at once; when a
+    partition whose file was closed gets more records, they go to a new
+    ``part-N.parquet`` file in its directory.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        keys: List[str],
+        schema_metadata: Dict[str, str],
+        row_group_size: int,
+        options: Optional[Options] = None,
+    ):
+        self.path = path
+        self.keys = keys
+        self.schema_metadata = schema_metadata
+        self.row_group_size = row_group_size
+        self.options = options or Options()
+        self.row_count = 0
+        self._schema: Optional[pyarrow.Schema] = None
+        self._files: "OrderedDict[str, pyarrow.parquet.ParquetWriter]" = OrderedDict()
+        self._parts: Dict[str, int] = {}
+        self._buffers: Dict[str, List[pyarrow.Table]] = {}
+        self._buffered_rows: Dict[str, int] = {}
+        self._metadata_collector: List[pyarrow.parquet.FileMetaData] = []
+        if self.path.is_dir():
+            shutil.rmtree(self.path)
+        elif self.path.exists():
+            self.path.unlink()
+        self.path.mkdir(parents=True)
+
+    def write(self, table: pyarrow.Table) -> None:
+        paths = partition_paths(table, self.keys)
+        table = table.drop(self.keys)
+        if self._schema is None:
+            self._schema = table.schema.with_metadata(self.schema_metadata)
+        for partition in pyarrow.compute.unique(paths).to_pylist():
+            rows = table.filter(pyarrow.compute.equal(paths, partition))
+            self._buffers.setdefault(partition, []).append(rows)
+            self._buffered_rows[partition] = (
+                self._buffered_rows.get(partition, 0) + rows.num_rows
+            )
+            if self._buffered_rows[partition] >= self.row_group_size:
+                self._flush(partition)
+        while sum(self._buffered_rows.values()) > MAX_BUFFERED_ROWS:
+            self._flush(max(self._buffered_rows, key=self._buffered_rows.__getitem__))
+
+    def close(self) -> pyarrow.parquet.FileMetaData:
+        """Writes the remaining records and returns the first file's metadata."""
+        for partition in list(self._buffers):
+            self._flush(partition)
+        for writer in self._files.values():
+            writer.close()
+        self._files.clear()
+        if not self._metadata_collector and self._schema is not None:
+            # Keep the schema of an empty layer readable.
+            pyarrow.parquet.ParquetWriter(
+                str(self.path / "part-0.parquet"),
+                self._schema,
+                metadata_collector=self._metadata_collector,
+                **parquet_arguments(self._schema, self.options),
+            ).close()
+        if not self._metadata_collector:
+            raise Exception(f"no batches were written for {self.path}")
+        return self._metadata_collector[0]
+
+    def abort(self) -> None:
+        """Closes the open files and removes the whole directory."""
+        for writer in self._files.values():
+            try:
+                writer.close()
+            except Exception:
+                pass
+        self._files.clear()
+        self._buffers.clear()
+        self._buffered_rows.clear()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _flush(self, partition: str) -> None:
+        table = pyarrow.concat_tables(self._buffers.pop(partition))
+        del self._buffered_rows[partition]
+        writer = self._files.pop(partition, None)
+        if writer is None:
+            if len(self._files) >= MAX_OPEN_FILES:
+                _, oldest = self._files.popitem(last=False)
+                oldest.close()
+            part = self._parts.get(partition, 0)
+            self._parts[partition] = part + 1
+            directory = self.path / partition
+            directory.mkdir(parents=True, exist_ok=True)
+            assert self._schema
+            writer = pyarrow.parquet.ParquetWriter(
+                str(directory / f"part-{part}.parquet"),
+                self._schema,
+                metadata_collector=self._metadata_collector,
+                **parquet_arguments(self._schema, self.options),
             )
-    return metadatas
+        writer.write_table(table, row_group_size=self.row_group_size)
+        self._files[partition] = writer
+        self.row_count += table.num_rows
+
+
+def conform(table: pyarrow.Table) -> pyarrow.Table:
+    """Casts the known NWI columns of a table to :data:`NWI_TYPES`.
+
+    Columns are only cast from types that convert without loss, that is,
+    text to categoricals, and are otherwise left as they are, such as an
+    ``IMAGE_DATE`` that was read as a date.
+    """
+    for index, field in enumerate(table.schema):
+        type = NWI_TYPES.get(field.name)
+        if type is not None and field.type != type and _castable(field.type, type):
+            table = table.set_column(
+                index, field.with_type(type), table.column(index).cast(type)
+            )
+    return table
+
+
+def _castable(source: pyarrow.DataType, target: pyarrow.DataType) -> bool:
+    if pyarrow.types.is_dictionary(target):
+        return bool(
+            pyarrow.types.is_string(source) or pyarrow.types.is_large_string(source)
+        )
+    return False
+
+
+def parse_compression(value: str) -> Compression:
+    """Parses a ``CODEC[:LEVEL]`` string, like ``zstd:9``, or ``none``."""
+    codec, _, level = value.lower().partition(":")
+    try:
+        available = codec == "none" or pyarrow.Codec.is_available(codec)
+    except ValueError:
+        available = False
+    if not available:
+        raise ValueError(f"unsupported compression codec: {codec}")
+    return Compression(codec, int(level) if level else None)
+
+
+def parse_column_compression(value: str) -> Tuple[str, Compression]:
+    """Parses a ``COLUMN=CODEC[:LEVEL]`` string, like ``geometry=zstd:9``."""
+    column, separator, compression = value.partition("=")
+    if not separator or not column:
+        raise ValueError(f"column compression must be COLUMN=CODEC[:LEVEL]: {value}")
+    return column, parse_compression(compression)
+
+
+def parquet_arguments(schema: pyarrow.Schema, options: Options) -> Dict[str, Any]:
+    """Returns the compression and encoding arguments for a parquet writer.
+
+    Dictionary encoding is only used for the columns that may repeat values,
+    not for geometries, bboxes and measurements.
+    """
+    overrides = dict(options.column_compression)
+    compression = {}
+    compression_level = {}
+    use_dictionary = []
+    for field in schema:
+        if pyarrow.types.is_struct(field.type):
+            paths = [f"{field.name}.{child.name}" for child in field.type]
+        else:
+            paths = [field.name]
+        codec = overrides.get(field.name, options.compression)
+        for path in paths:
+            compression[path] = codec.codec
+            if codec.level is not None:
+                compression_level[path] = codec.level
+        if field.name != GEOMETRY_COLUMN and not (
+            pyarrow.types.is_struct(field.type) or pyarrow.types.is_floating(field.type)
+        ):
+            use_dictionary.append(field.name)
+    return {
+        "compression": compression,
+        "compression_level": compression_level or None,
+        "use_dictionary": use_dictionary,
+    }
+
+
+def partition_keys(name: str, column_names: List[str], options: Options) -> List[str]:
+    """Returns the keys that a layer is partitioned by, if any."""
+    if zipfile_metadata.role(name) is None:
+        return []
+    return [key for key in options.partition_by if key == TILE or key in column_names]
+
+
+def partition_paths(table: pyarrow.Table, keys: List[str]) -> pyarrow.Array:
+    """Returns the ``key=value/...`` partition directory of each record."""
+    segments = []
+    for key in keys:
+        values = (
+            pyarrow.compute.cast(table.column(key), pyarrow.string())
+            .fill_null(HIVE_DEFAULT_PARTITION)
+            .combine_chunks()
+            .dictionary_encode()
+        )
+        names = pyarrow.array(
+            [
+                f"{key}={quote(value, safe='')}"
+                for value in values.dictionary.to_pylist()
+            ]
+        )
+        segments.append(names.take(values.indices))
+    return pyarrow.compute.binary_join_element_wise(*segments, "/")
+
+
+def tiles(bounds: numpy.ndarray, crs: str) -> pyarrow.Array:
+    """Returns the :data:`TILE` of the centers of some bounding boxes."""
+    transformer = zipfile_metadata.transformer(crs, "EPSG:4326")
+    longitudes, latitudes = transformer.transform(
+        (bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2
+    )
+    corners = [
+        pyarrow.array(
+            numpy.floor(numpy.asarray(values) / TILE_DEGREES) * TILE_DEGREES,
+            from_pandas=True,
+        )
+        .cast(pyarrow.int64())
+        .cast(pyarrow.string())
+        for values in [longitudes, latitudes]
+    ]
+    return pyarrow.compute.binary_join_element_wise(*corners, "_")
+
+
+def hilbert_keys(bounds: numpy.ndarray, extent: Sequence[float]) -> numpy.ndarray:
+    """Returns the Hilbert curve keys of the centers of some bounding boxes.
+
+    The centers are scaled to a grid of 2 ** :data:`HILBERT_ORDER` cells on a
+    side covering ``extent``. Empty geometries get a key of zero.
+    """
+    side = 2**HILBERT_ORDER
+    xmin, ymin, xmax, ymax = extent
+    centers = numpy.column_stack(
+        [(bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2]
+    )
+    scale = numpy.array([max(xmax - xmin, 1e-9), max(ymax - ymin, 1e-9)])
+    cells = numpy.nan_to_num((centers - [xmin, ymin]) / scale * side)
+    x, y = numpy.clip(cells, 0, side - 1).astype(numpy.uint64).T
+    last = numpy.uint64(side - 1)
+    keys = numpy.zeros(len(x), dtype=numpy.uint64)
+    s = side // 2
+    while s > 0:
+        rx = (x & numpy.uint64(s)) > 0
+        ry = (y & numpy.uint64(s)) > 0
+        keys += numpy.uint64(s * s) * ((3 * rx) ^ ry).astype(numpy.uint64)
+        flip = ~ry & rx
+        x = numpy.where(flip, last - x, x)
+        y = numpy.where(flip, last - y, y)
+        x, y = numpy.where(ry, x, y), numpy.where(ry, y, x)
+        s //= 2
+    return keys
+
+
+def bbox_array(bounds: numpy.ndarray) -> pyarrow.StructArray:
+    """Returns a GeoParquet 1.1 bbox covering column for some bounds."""
+    return pyarrow.StructArray.from_arrays(
+        [pyarrow.array(bounds[:, i], from_pandas=True) for i in range(4)],
+        names=["xmin", "ymin", "xmax", "ymax"],
+    )
+
+
+def geo_metadata(
+    crs: str, bbox: Optional[Sequence[float]] = None, covering: bool = False
+) -> Dict[str, Any]:
+    """Returns the GeoParquet file metadata for a WKB geometry column.
+
+    If ``covering`` is True, the file has a :data:`BBOX_COLUMN` covering
+    column, which needs version 1.1.0 of the specification.
+    """
+    column: Dict[str, Any] = {
+        "encoding": "WKB",
+        "geometry_types": [],
+        "crs": CRS(crs).to_json_dict(),
+    }
+    if bbox is not None:
+        column["bbox"] = [float(value) for value in bbox]
+    if covering:
+        column["covering"] = {
+            "bbox": {
+                key: [BBOX_COLUMN, key] for key in ["xmin", "ymin", "xmax", "ymax"]
+            }
+        }
+    return {
+        "version": "1.1.0" if covering else "1.0.0",
+        "primary_column": GEOMETRY_COLUMN,
+        "columns": {GEOMETRY_COLUMN: column},
+    }
+
+
+def geoparquet_path_for(name: str, directory: Path) -> Path:
+    return directory / (Path(name).stem + ".geoparquet")
+
+
+def create_metadata(
+    name: str,
+    geoparquet_path: Path,
+    file_metadata: pyarrow.parquet.FileMetaData,
+    sorting: Optional[str] = None,
+    row_count: Optional[int] = None,
+    partitioning: Optional[List[str]] = None,
+    digest: Optional[checksum.Digest] = None,
+) -> Metadata:
+    """Creates the metadata for a geoparquet file from its writer's metadata.
+
+    This avoids reading the file back just after it was written. For a
+    partitioned dataset, ``file_metadata`` is that of any one of its files,
+    and the partition keys are added to its columns. ``digest`` is the
+    file's size and checksum, if they were computed while writing it.
+    """
+    geo = json.loads(file_metadata.metadata[b"geo"])
+    key = geoparquet_path.stem
+    title = key.replace("_", " ")
+    role = zipfile_metadata.role(name)
+    return Metadata(
+        key=key,
+        path=geoparquet_path,
+        title=title,
+        description=f"{title} geoparquet",
+        role=role,
+        row_count=file_metadata.num_rows if row_count is None else row_count,
+        primary_geometry=geo["primary_column"],
+        columns=columns(file_metadata.schema)
+        + [{"name": key, "type": "byte_array"} for key in partitioning or []],
+        covering=geo["columns"][geo["primary_column"]].get("covering"),
+        sorting=sorting,
+        partitioning=partitioning,
+        size=digest.size if digest else None,
+        checksum=digest.checksum if digest else None,
+    )
+
+
+def columns(schema: pyarrow.parquet.ParquetSchema) -> List[Dict[str, Any]]:
+    """Returns the ``table:columns`` for a parquet schema.
+
+    This matches ``stac_table.get_columns``, except that column metadata is
+    decoded to strings so it can be serialized as JSON, integers narrower
+    than their physical type are given their logical type, like ``int16``,
+    and dictionary-encoded columns are marked as ``categorical``.
+    """
+    columns = []
+    arrow_schema = schema.to_arrow_schema()
+    for index, field in enumerate(arrow_schema):
+        if field.name == "__null_dask_index__":
+            continue
+        column: Dict[str, Any] = {
+            "name": field.name,
+            "type": _column_type(schema.column(index)),
+        }
+        if pyarrow.types.is_dictionary(field.type):
+            column["categorical"] = True
+        if field.metadata is not None:
+            column["metadata"] = {
+                key.decode(): value.decode() for key, value in field.metadata.items()
+            }
+        columns.append(column)
+    return columns
+
+
+def _column_type(column: pyarrow.parquet.ColumnSchema) -> str:
+    logical_type = json.loads(column.logical_type.to_json())
+    if logical_type.get("Type") == "Int":
+        prefix = "int" if logical_type["isSigned"] else "uint"
+        return f"{prefix}{logical_type['bitWidth']}"
+    return str(column.physical_type.lower())
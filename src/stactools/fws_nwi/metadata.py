@@ -1,18 +1,29 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, List, Optional, Tuple
-from zipfile import ZipFile
+from typing import Any, Iterator, List, Optional, Set, Tuple
 
-import fiona
-import fiona.crs
+import numpy
+import pandas
+import shapely
 import shapely.geometry
-import shapely.ops
-import stactools.core.projection
-from pyproj import CRS
+from pyproj import CRS, Transformer
 
-from stactools.fws_nwi.states import States
+from stactools.fws_nwi import profiling
+from stactools.fws_nwi.remote import Href
 
 SIMPLIFY = 1000  # 1km
+# Footprint inputs are snapped to this grid, well below the simplification
+# tolerance, which drops needless vertices before the union.
+GRID_SIZE = SIMPLIFY / 10
+# Footprints are unioned in square tiles of this size before being combined.
+TILE_SIZE = SIMPLIFY * 100
+POLYGON_TYPE_IDS = [3, 6]  # Polygon, MultiPolygon
+# Layers that index a zipfile's coverage with one polygon per map or mapping
+# project, rather than one per wetland.
+INDEX_LAYER_SUFFIXES = ("_Historic_Map_Info", "_Project_Metadata")
 
 
 @dataclass
@@ -31,50 +42,11 @@ class Metadata:
     pdfs: List[Pdf]
 
     @classmethod
-    def from_zipfile(cls, path: Path) -> "Metadata":
-        state_code = path.stem.split("_")[0]
-        state = States[state_code]
-        content = set()
-        pdfs = []
-        geometry = None
-        crs = None
-        with ZipFile(path) as zipfile:
-            for name in (n for n in zipfile.namelist() if n.endswith(".shp")):
-                maybe_content = role(name)
-                if maybe_content:
-                    content.add(maybe_content)
-                with fiona.open(f"zip://{path}!{name}") as shapefile:
-                    if len(shapefile) == 1:
-                        for record in shapefile:
-                            geometry = shapely.geometry.shape(
-                                record["geometry"]
-                            ).simplify(SIMPLIFY)
-                            crs = fiona.crs.to_string(shapefile.crs)
-                            geometry = stactools.core.projection.reproject_geom(
-                                crs,
-                                "EPSG:4326",
-                                shapely.geometry.mapping(geometry),
-                                precision=6,
-                            )
-                    if "PDF_HYPERL" in shapefile.schema["properties"]:
-                        for record in shapefile:
-                            href = record["properties"].get("PDF_HYPERL", None)
-                            if href:
-                                title = record["properties"].get("PDF_NAME")
-                                if title and title.endswith(".pdf"):
-                                    title = title[0:-4]
-                                pdfs.append(Pdf(href=href, title=title))
-        if geometry is None:
-            geometry, crs = calculate_geometry(path)
-        else:
-            geometry = shapely.geometry.shape(geometry)
-        return cls(
-            geometry=geometry,
-            crs=CRS(crs),
-            state_code=state_code,
-            state=state,
-            content=list(content),
-            pdfs=pdfs,
+    def from_zipfile(cls, path: Href, fast_footprint: bool = False) -> "Metadata":
+        from stactools.fws_nwi import scanner
+
+        return scanner.create_metadata(
+            path, scanner.scan_layers(path, fast_footprint=fast_footprint)
         )
 
 
@@ -96,28 +68,179 @@ def role(name: str) -> Optional[str]:
         return None
 
 
-def calculate_geometry(path: Path) -> Tuple[Any, str]:
-    crses = set()
-    zipfile_geometries = list()
-    with ZipFile(path) as zipfile:
-        for name in (n for n in zipfile.namelist() if n.endswith(".shp")):
-            with fiona.open(f"zip://{path}!{name}") as shapefile:
-                crses.add(fiona.crs.to_string(shapefile.crs))
-                geometries = []
-                for record in shapefile:
-                    geometry = record["geometry"]
-                    if geometry["type"] in ("Polygon", "MultiPolygon"):
-                        geometries.append(shapely.geometry.shape(geometry))
-                geometry = shapely.ops.unary_union(geometries)
-                geometry = shapely.geometry.shape(geometry)
-                if geometry.is_valid:
-                    zipfile_geometries.append(geometry)
+# The columns of the map info layers that link to the historic map PDFs.
+PDF_COLUMNS = ("PDF_NAME", "PDF_HYPERL")
+
+
+def is_index_layer(name: str) -> bool:
+    return Path(name).stem.endswith(INDEX_LAYER_SUFFIXES)
+
+
+def pdfs(dataframe: pandas.DataFrame) -> List[Pdf]:
+    """Returns the PDF links of a map info layer, or an empty list."""
+    if "PDF_HYPERL" not in dataframe.columns:
+        return []
+    pdfs = []
+    titles = dataframe["PDF_NAME"] if "PDF_NAME" in dataframe.columns else None
+    for index, href in enumerate(dataframe["PDF_HYPERL"]):
+        if pandas.isna(href) or not href:
+            continue
+        title = None if titles is None else titles.iloc[index]
+        if pandas.isna(title) or not title:
+            title = None
+        elif title.endswith(".pdf"):
+            title = title[0:-4]
+        pdfs.append(Pdf(href=href, title=title))
+    return pdfs
+
+
+def boundary(geometry: Any, crs: str) -> Any:
+    """Simplifies a state boundary and reprojects it to WGS84."""
+    return reproject(shapely.geometry.shape(geometry).simplify(SIMPLIFY), crs)
+
+
+def layer_footprint(geometries: Any, executor: Optional[Executor] = None) -> Any:
+    """Unions the (multi)polygons of one layer into its footprint.
+
+    The geometries are repaired and snapped to a ``GRID_SIZE`` grid in bulk,
+    then unioned tile by tile (optionally in ``executor``) before the tiles
+    themselves are unioned. Polygons too small or narrow to survive the
+    snapping are widened by a grid cell first.
+    """
+    geometries = numpy.asarray(geometries, dtype=object)
+    geometries = geometries[
+        numpy.isin(shapely.get_type_id(geometries), POLYGON_TYPE_IDS)
+    ]
+    invalid = ~shapely.is_valid(geometries)
+    if invalid.any():
+        repaired = shapely.get_parts(shapely.make_valid(geometries[invalid]))
+        repaired = repaired[numpy.isin(shapely.get_type_id(repaired), POLYGON_TYPE_IDS)]
+        geometries = numpy.concatenate([geometries[~invalid], repaired])
+    # Snapping to the grid merges near-coincident edges, and clearing the
+    # precision model afterwards keeps the unions in fast floating mode.
+    # Polygons are snapped one part at a time, and a small or narrow part that
+    # collapses is widened by a grid cell first, so it isn't dropped.
+    parts = shapely.get_parts(geometries)
+    snapped = shapely.set_precision(parts, GRID_SIZE)
+    collapsed = shapely.is_empty(snapped)
+    snapped[collapsed] = shapely.set_precision(
+        shapely.buffer(parts[collapsed], GRID_SIZE, quad_segs=1), GRID_SIZE
+    )
+    geometries = shapely.set_precision(snapped, 0)
+    tiles = list(_tiles(geometries))
+    if executor and len(tiles) > 1:
+        unions = list(executor.map(shapely.union_all, tiles))
+    else:
+        unions = [shapely.union_all(tile) for tile in tiles]
+    return shapely.union_all(unions)
+
+
+def _tiles(geometries: numpy.ndarray) -> Iterator[numpy.ndarray]:
+    if len(geometries) == 0:
+        return
+    bounds = shapely.bounds(geometries)
+    x = numpy.floor((bounds[:, 0] + bounds[:, 2]) / 2 / TILE_SIZE)
+    y = numpy.floor((bounds[:, 1] + bounds[:, 3]) / 2 / TILE_SIZE)
+    _, tile = numpy.unique(numpy.stack([x, y], axis=1), axis=0, return_inverse=True)
+    tile = tile.reshape(-1)
+    for index in range(tile.max() + 1):
+        yield geometries[tile == index]
+
+
+def header_footprint(bbox: Tuple[float, float, float, float]) -> Optional[Any]:
+    """Returns the box of a layer's header bbox, or None if the layer is empty.
+
+    These stand in for the footprints of a zipfile without index layers when
+    a fast footprint is asked for.
+    """
+    if bbox[0] < bbox[2] and bbox[1] < bbox[3]:
+        return shapely.box(*bbox)
+    else:
+        return None
+
+
+def footprint(geometries: List[Any], crses: Set[str]) -> Tuple[Any, str]:
+    """Combines the per-layer footprints into a simplified WGS84 geometry."""
     if len(crses) == 1:
-        geometry = shapely.ops.unary_union(zipfile_geometries).simplify(SIMPLIFY)
-        crs = crses.pop()
-        geometry = stactools.core.projection.reproject_geom(
-            crs, "EPSG:4326", shapely.geometry.mapping(geometry), precision=6
-        )
-        return shapely.geometry.shape(geometry), crs
+        crs = next(iter(crses))
+        with profiling.stage("footprint"):
+            geometry = shapely.union_all(geometries).simplify(SIMPLIFY)
+        return reproject(geometry, crs), crs
     else:
         raise Exception(f"multiple crses in shapefile: {crses}")
+
+
+def reproject(geometry: Any, crs: str) -> Any:
+    """Reprojects a geometry to WGS84, rounding coordinates to six decimal
+    places, with the cached :func:`transformer`."""
+    to_wgs84 = transformer(crs, "EPSG:4326")
+
+    def transform(coordinates: numpy.ndarray) -> numpy.ndarray:
+        x, y = to_wgs84.transform(coordinates[:, 0], coordinates[:, 1])
+        return numpy.column_stack([x, y])
+
+    with profiling.stage("reproject"):
+        reprojected = shapely.transform(geometry, transform)
+        if not reprojected.is_valid:
+            # Parts that nearly touch can cross once they are reprojected.
+            reprojected = reprojected.buffer(0)
+        return shapely.set_precision(reprojected, 1e-6)
+
+
+@lru_cache()
+def transformer(source: str, destination: str) -> Transformer:
+    """Returns a transformer between two CRSs, with x and y in that order.
+
+    Creating a transformer looks up both CRSs and the operations between
+    them, which costs far more than most transforms, so they are reused.
+    """
+    return Transformer.from_crs(CRS(source), CRS(destination), always_xy=True)
+
+
+def calculate_geometry(
+    path: Href, workers: Optional[int] = None, fast: bool = False
+) -> Tuple[Any, str]:
+    """Calculates the footprint of every layer of a zipfile, in WGS84.
+
+    If ``fast`` is True, only the index layers are read, and the footprint is
+    the union of their polygons, or of the layers' header bboxes if there
+    are no index layers. This is much quicker, at the cost of including any
+    parts of mapped areas without wetlands.
+    """
+    from stactools.fws_nwi import scanner, staging
+
+    crses = set()
+    zipfile_geometries = list()
+    headers = scanner.read_headers(path)
+    if fast and any(is_index_layer(header.name) for header in headers):
+        headers = [h for h in headers if is_index_layer(h.name)]
+    elif fast:
+        boxes = [header_footprint(header.bbox) for header in headers]
+        return footprint(
+            [box for box in boxes if box is not None],
+            set(header.crs for header in headers),
+        )
+    with ExitStack() as stack:
+        executor = None
+        if workers and workers > 1:
+            # One pool for every batch, since starting one costs more than
+            # unioning most batches.
+            executor = stack.enter_context(ProcessPoolExecutor(workers))
+        directory = stack.enter_context(
+            staging.extract(path, layers=[h.name for h in headers])
+        )
+        for header in headers:
+            crses.add(header.crs)
+            read_stage = profiling.stage("read", header.name)
+            footprint_stage = profiling.stage("footprint", header.name)
+            batches = scanner.read_batches(
+                str(directory / header.name), scanner.BATCH_SIZE
+            )
+            for table in profiling.timed(batches, read_stage):
+                with footprint_stage:
+                    footprint_stage.rows += table.num_rows
+                    geometries = shapely.from_wkb(
+                        table.column("geometry").to_numpy(zero_copy_only=False)
+                    )
+                    zipfile_geometries.append(layer_footprint(geometries, executor))
+    return footprint(zipfile_geometries, crses)
@@ -0,0 +1,295 @@
+"""Merging a layer of every state into one national geoparquet dataset.
+
+Each state includes the wetlands of every quad that touches it, so adjacent
+states share features. Records are identified by a hash of their geometry's
+WKB and their attributes, and only the first record with each hash is kept.
+
+To keep memory use bounded the merge is a partitioned hash set: records are
+first spilled to scratch files by the leading bits of their hash, then each
+bucket, which holds every copy of its records, is de-duplicated and written
+in turn.
+"""
+
+import logging
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+import pandas
+import pyarrow
+import pyarrow.ipc
+import shapely
+from pyproj import CRS, Transformer
+from pystac import Collection
+from pystac.extensions.table import TableExtension
+from pystac.utils import make_relative_href
+
+from stactools.fws_nwi import constants, geoparquet
+from stactools.fws_nwi import metadata as zipfile_metadata
+from stactools.fws_nwi import profiling, scanner, stac, staging
+
+logger = logging.getLogger(__name__)
+
+NAME = "US_Wetlands"
+ROLE = "wetlands"
+CRS_STRING = "EPSG:4326"
+BUCKETS = constants.NATIONAL_BUCKETS
+# Two independent 64 bit hashes make a 128 bit key, so the odds of two
+# different records colliding are negligible even across the whole country.
+HASH_KEYS = ("stactools-fwsnwi", "fws-nwi-national")
+_HASH_COLUMNS = ["__hash0__", "__hash1__"]
+
+
+@dataclass
+class Merge:
+    metadata: geoparquet.Metadata
+    rows: int
+    duplicates: int
+
+
+def merge(
+    zipfile_paths: Sequence[Path],
+    directory: Path,
+    name: str = NAME,
+    role: str = ROLE,
+    crs: str = CRS_STRING,
+    buckets: int = BUCKETS,
+    batch_size: int = scanner.BATCH_SIZE,
+    options: Optional[geoparquet.Options] = None,
+) -> Merge:
+    """Merges the layers with ``role`` of some zipfiles into one geoparquet.
+
+    Geometries are reprojected to ``crs``. When the same record is in more
+    than one zipfile, the copy from the first zipfile is kept. Scratch files
+    are written next to the output in ``directory``, and at most one bucket,
+    roughly ``1 / buckets`` of the records, is held in memory at once.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(prefix=f".{name}.", dir=directory))
+    try:
+        rows, schemas, bbox = _spill(
+            zipfile_paths, scratch, role, crs, buckets, batch_size
+        )
+        if not schemas:
+            raise Exception(f"no {role} layers in {[str(p) for p in zipfile_paths]}")
+        schema = unify_schemas(schemas)
+        writer = geoparquet.Writer(
+            f"{name}.shp", directory, CRS(crs).to_wkt(), bbox=bbox, options=options
+        )
+        kept = 0
+        with profiling.stage("deduplicate") as stage:
+            for bucket in range(buckets):
+                files = sorted(
+                    (scratch / str(bucket)).glob("*.arrow"),
+                    key=lambda file: tuple(map(int, file.stem.split("-"))),
+                )
+                if not files:
+                    continue
+                table = _deduplicate(
+                    pyarrow.concat_tables(_conform(_read(f), schema) for f in files)
+                )
+                stage.rows += table.num_rows
+                kept += table.num_rows
+                writer.write(table)
+            if not kept:
+                writer.write(schema.empty_table().drop(_HASH_COLUMNS))
+        metadata = writer.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    logger.info(f"merged {rows} records, dropping {rows - kept} duplicates")
+    return Merge(metadata=metadata, rows=rows, duplicates=rows - kept)
+
+
+def add_to_collection(
+    collection: Collection,
+    metadata: geoparquet.Metadata,
+    make_asset_hrefs_relative: bool = False,
+) -> None:
+    """Adds a merged geoparquet dataset to a collection as an asset."""
+    for key, asset in stac.create_geoparquet_assets([metadata]).items():
+        self_href = collection.get_self_href()
+        if make_asset_hrefs_relative and self_href:
+            asset.href = make_relative_href(asset.href, self_href)
+        collection.add_asset(key, asset)
+    TableExtension.add_to(collection)
+
+
+def row_hashes(table: pyarrow.Table) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns two 64 bit hashes of each record's geometry and attributes.
+
+    Attributes are hashed in column name order, so records from layers whose
+    columns are in a different order still match. They are hashed as
+    strings, so a record still matches its copy in a state where a column
+    has another type, such as an integer ``IMAGE_YR`` in one and a string in
+    the other, just as the two are merged by :func:`unify_schemas`.
+    """
+    geometry = table.column(geoparquet.GEOMETRY_COLUMN).to_numpy(zero_copy_only=False)
+    attributes = table.drop([geoparquet.GEOMETRY_COLUMN])
+    frame = pandas.DataFrame(
+        {
+            name: attributes.column(name).cast(pyarrow.string()).to_pandas()
+            for name in sorted(attributes.column_names)
+        }
+    ).assign(**{geoparquet.GEOMETRY_COLUMN: geometry})
+    first, second = (
+        pandas.util.hash_pandas_object(frame, index=False, hash_key=key).to_numpy()
+        for key in HASH_KEYS
+    )
+    return first, second
+
+
+def unify_schemas(schemas: Sequence[Tuple[str, pyarrow.Schema]]) -> pyarrow.Schema:
+    """Returns a schema that the records of every layer can be cast to.
+
+    ``schemas`` pairs each layer's schema with where it came from. States
+    don't always agree on a column's type: numeric columns are widened to
+    hold every state's values, and any other conflict, such as an integer
+    ``IMAGE_YR`` in one state and a string in another, is resolved by
+    merging the column as strings.
+    """
+    fields: Dict[str, List[Tuple[str, pyarrow.DataType]]] = {}
+    for source, schema in schemas:
+        for field in schema:
+            fields.setdefault(field.name, []).append((source, field.type))
+    return pyarrow.schema(
+        [
+            pyarrow.field(name, _common_type(name, types))
+            for name, types in fields.items()
+        ]
+    )
+
+
+def _common_type(
+    name: str, types: Sequence[Tuple[str, pyarrow.DataType]]
+) -> pyarrow.DataType:
+    distinct = list(dict.fromkeys(t for _, t in types if not pyarrow.types.is_null(t)))
+    if not distinct:
+        return pyarrow.null()
+    elif len(distinct) == 1:
+        return distinct[0]
+    elif all(pyarrow.types.is_integer(t) for t in distinct):
+        return pyarrow.int64()
+    elif all(
+        pyarrow.types.is_integer(t) or pyarrow.types.is_floating(t) for t in distinct
+    ):
+        return pyarrow.float64()
+    conflicts = ", ".join(f"{t} in {source}" for source, t in types)
+    logger.warning(f"{name} has conflicting types ({conflicts}), merging as strings")
+    return pyarrow.string()
+
+
+def _spill(
+    zipfile_paths: Sequence[Path],
+    scratch: Path,
+    role: str,
+    crs: str,
+    buckets: int,
+    batch_size: int,
+) -> Tuple[int, List[Tuple[str, pyarrow.Schema]], Optional[List[float]]]:
+    """Spills the records of every layer to scratch files, one per bucket.
+
+    Returns the number of records, the layers' schemas paired with their
+    zipfile and layer names, and the layers' combined bounds in ``crs``.
+    """
+    rows = 0
+    schemas: List[Tuple[str, pyarrow.Schema]] = []
+    bounds: List[Tuple[float, float, float, float]] = []
+    for source, path in enumerate(zipfile_paths):
+        headers = [
+            header
+            for header in scanner.read_headers(path)
+            if zipfile_metadata.role(header.name) == role
+        ]
+        if not headers:
+            continue
+        with staging.extract(path, layers=[h.name for h in headers]) as directory:
+            for index, header in enumerate(headers):
+                href = str(directory / header.name)
+                transformer = None
+                if not CRS(header.crs).equals(CRS(crs)):
+                    transformer = zipfile_metadata.transformer(header.crs, crs)
+                    bounds.append(transformer.transform_bounds(*header.bbox))
+                else:
+                    bounds.append(header.bbox)
+                writers: Dict[int, pyarrow.ipc.RecordBatchStreamWriter] = {}
+                stage = profiling.stage("spill", header.name)
+                read_stage = profiling.stage("read", header.name)
+                batches = scanner.read_batches(href, batch_size)
+                for table in profiling.timed(batches, read_stage):
+                    with stage:
+                        stage.rows += table.num_rows
+                        rows += table.num_rows
+                        table = _with_hashes(table, transformer)
+                        if not schemas or schemas[-1][1] != table.schema:
+                            schemas.append((f"{path}!{header.name}", table.schema))
+                        bucket_of = table.column(_HASH_COLUMNS[0]).to_numpy() % buckets
+                        for bucket in map(int, numpy.unique(bucket_of)):
+                            if bucket not in writers:
+                                file = scratch / str(bucket) / f"{source}-{index}.arrow"
+                                file.parent.mkdir(exist_ok=True)
+                                writers[bucket] = pyarrow.ipc.new_stream(
+                                    str(file), table.schema
+                                )
+                            writers[bucket].write_table(
+                                table.filter(pyarrow.array(bucket_of == bucket))
+                            )
+                for writer in writers.values():
+                    writer.close()
+    if not bounds:
+        return rows, schemas, None
+    corners = numpy.array(bounds)
+    bbox = [*corners[:, :2].min(axis=0), *corners[:, 2:].max(axis=0)]
+    return rows, schemas, [float(value) for value in bbox]
+
+
+def _with_hashes(
+    table: pyarrow.Table, transformer: Optional[Transformer]
+) -> pyarrow.Table:
+    # Records are hashed before they are reprojected, so a record that is in
+    # two states' layers with the same projection always gets the same hash.
+    hashes = row_hashes(table)
+    if transformer:
+        table = _reproject(table, transformer)
+    for column, values in zip(_HASH_COLUMNS, hashes):
+        table = table.append_column(column, pyarrow.array(values))
+    return table
+
+
+def _reproject(table: pyarrow.Table, transformer: Transformer) -> pyarrow.Table:
+    def transform(coordinates: numpy.ndarray) -> numpy.ndarray:
+        x, y = transformer.transform(coordinates[:, 0], coordinates[:, 1])
+        return numpy.column_stack([x, y])
+
+    index = table.schema.get_field_index(geoparquet.GEOMETRY_COLUMN)
+    geometries = shapely.from_wkb(table.column(index).to_numpy(zero_copy_only=False))
+    wkb = shapely.to_wkb(shapely.transform(geometries, transform))
+    return table.set_column(
+        index, geoparquet.GEOMETRY_COLUMN, pyarrow.array(wkb, pyarrow.binary())
+    )
+
+
+def _read(path: Path) -> pyarrow.Table:
+    with pyarrow.ipc.open_stream(str(path)) as reader:
+        return reader.read_all()
+
+
+def _conform(table: pyarrow.Table, schema: pyarrow.Schema) -> pyarrow.Table:
+    # States don't always have the same columns, or the same types for them.
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table.column(field.name).cast(field.type))
+        else:
+            columns.append(pyarrow.nulls(table.num_rows, field.type))
+    return pyarrow.Table.from_arrays(columns, schema=schema)
+
+
+def _deduplicate(table: pyarrow.Table) -> pyarrow.Table:
+    hashes = pandas.DataFrame(
+        {column: table.column(column).to_numpy() for column in _HASH_COLUMNS}
+    )
+    keep = ~hashes.duplicated(keep="first").to_numpy()
+    return table.filter(pyarrow.array(keep)).drop(_HASH_COLUMNS)
@@ -0,0 +1,192 @@
+"""Per-stage timing and memory use.
+
+Stages are only recorded while a :class:`Profiler` is active, for example::
+
+    with profiling.profile() as profiler:
+        item = stac.create_item(path)
+    print(profiler.report())
+
+Otherwise timing a stage costs next to nothing.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import pyarrow
+
+T = TypeVar("T")
+
+_profiler: "ContextVar[Optional[Profiler]]" = ContextVar("profiler", default=None)
+
+
+@dataclass
+class Stage:
+    """The time spent in, and the records processed by, one stage of work.
+
+    A stage can be entered any number of times, for example once per batch,
+    and its time and records add up. ``peak_rss`` is the process's peak
+    resident set size, in bytes, the last time the stage was exited.
+    """
+
+    name: str
+    layer: Optional[str] = None
+    seconds: float = 0.0
+    rows: int = 0
+    peak_rss: int = 0
+    _start: float = field(default=0.0, repr=False, compare=False)
+    _profiler: Optional["Profiler"] = field(default=None, repr=False, compare=False)
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        if self.rows and self.seconds:
+            return self.rows / self.seconds
+        return None
+
+    def __enter__(self) -> "Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.seconds += time.perf_counter() - self._start
+        if self._profiler:
+            self.peak_rss = peak_rss()
+            self._profiler._exited(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "layer": self.layer,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "rows_per_second": self.rows_per_second,
+            "peak_rss": self.peak_rss,
+        }
+
+
+class Profiler:
+    """Collects stages, and calls ``callback`` every time one is exited.
+
+    Stages are collected in the order they are first exited, so stages that
+    never run are left out.
+    """
+
+    def __init__(self, callback: Optional[Callable[[Stage], None]] = None):
+        self.callback = callback
+        self.stages: List[Stage] = []
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, layer: Optional[str] = None) -> Stage:
+        return Stage(name=name, layer=layer, _profiler=self)
+
+    def add(self, stages: List[Stage]) -> None:
+        """Adds stages that were recorded elsewhere, e.g. in another process."""
+        for stage in stages:
+            stage._profiler = self
+            with self._lock:
+                self.stages.append(stage)
+            if self.callback:
+                self.callback(stage)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "seconds": self.seconds,
+            "peak_rss": max([peak_rss()] + [s.peak_rss for s in self.stages]),
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def _exited(self, stage: Stage) -> None:
+        with self._lock:
+            if not any(s is stage for s in self.stages):
+                self.stages.append(stage)
+        if self.callback:
+            self.callback(stage)
+
+
+@contextmanager
+def profile(callback: Optional[Callable[[Stage], None]] = None) -> Iterator[Profiler]:
+    """Records the stages of any work done in this context."""
+    profiler = Profiler(callback)
+    token = _profiler.set(profiler)
+    start = time.perf_counter()
+    try:
+        yield profiler
+    finally:
+        profiler.seconds = time.perf_counter() - start
+        _profiler.reset(token)
+
+
+def stage(name: str, layer: Optional[str] = None) -> Stage:
+    """Returns a new stage of the active profiler, or an unrecorded stage."""
+    profiler = _profiler.get()
+    if profiler is None:
+        return Stage(name=name, layer=layer)
+    return profiler.stage(name, layer)
+
+
+def active() -> bool:
+    return _profiler.get() is not None
+
+
+def add(stages: List[Stage]) -> None:
+    """Adds stages recorded elsewhere to the active profiler, if any."""
+    profiler = _profiler.get()
+    if profiler is not None:
+        profiler.add(stages)
+
+
+def timed(tables: Iterable[pyarrow.Table], stage: Stage) -> Iterator[pyarrow.Table]:
+    """Times how long it takes to produce each table, and counts their rows."""
+    iterator = iter(tables)
+    while True:
+        with stage:
+            table = next(iterator, None)
+            if table is not None:
+                stage.rows += table.num_rows
+        if table is None:
+            return
+        yield table
+
+
+def collect(
+    function: Callable[..., T], *args: Any, **kwargs: Any
+) -> Tuple[T, List[Stage]]:
+    """Calls a function with its own profiler, returning its result and stages.
+
+    Use this to profile work in another process, then add the stages to the
+    parent's profiler with :meth:`Profiler.add`.
+    """
+    with profile() as profiler:
+        result = function(*args, **kwargs)
+    for stage in profiler.stages:
+        stage._profiler = None
+    return result, profiler.stages
+
+
+def peak_rss() -> int:
+    """Returns the peak resident set size of this process, in bytes.
+
+    This is zero where it is not available, e.g. on Windows.
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+    return int(rss if sys.platform == "darwin" else rss * 1024)
@@ -0,0 +1,57 @@
+"""Progress events for the layers of a zipfile as they are scanned.
+
+Events are only reported while a listener is active, for example::
+
+    with progress.listen(print):
+        item = stac.create_item(path)
+
+The listener is called in whichever thread is scanning the layer, and may
+raise to stop the scan, which is how :mod:`stactools.fws_nwi.aio` cancels
+item creation. Layers scanned in a process pool report no events.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+STARTED = "started"
+READ = "read"
+FINISHED = "finished"
+
+_listener: "ContextVar[Optional[Callable[[Event], None]]]" = ContextVar(
+    "listener", default=None
+)
+
+
+@dataclass
+class Event:
+    """Progress through one layer of a zipfile.
+
+    ``kind`` is :data:`STARTED` before a layer is read, :data:`READ` after
+    each batch of its records, and :data:`FINISHED` once any files have been
+    written. ``rows`` is the number of records read so far, out of the
+    ``row_count`` in the layer's header.
+    """
+
+    zipfile: str
+    layer: str
+    kind: str
+    rows: int
+    row_count: int
+
+
+@contextmanager
+def listen(listener: Callable[[Event], None]) -> Iterator[None]:
+    """Reports the events of any scans in this context to ``listener``."""
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def report(zipfile: str, layer: str, kind: str, rows: int, row_count: int) -> None:
+    listener = _listener.get()
+    if listener is not None:
+        listener(Event(zipfile, layer, kind, rows, row_count))
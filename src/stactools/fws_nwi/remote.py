@@ -0,0 +1,64 @@
+"""Opening zipfiles from local paths or remote hrefs.
+
+Remote zipfiles, such as ``https://`` or any other fsspec href, are read with
+range requests through a block cache. Opening one reads just its central
+directory from the end of the file, and each member is fetched only when it is
+read, so headers and small layers can be read without downloading the whole
+archive.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Union
+from urllib.parse import urlparse
+from zipfile import ZipFile
+
+# A local path, or the href of a remote file.
+Href = Union[Path, str]
+
+# Remote files are fetched in blocks of this many bytes, and at most
+# MAX_BLOCKS blocks are kept in memory per open file.
+BLOCK_SIZE = 1024**2  # 1 MiB
+MAX_BLOCKS = 32
+
+
+def is_remote(href: Href) -> bool:
+    return isinstance(href, str) and "://" in href
+
+
+def to_href(value: str) -> Href:
+    """Returns a command-line argument as a remote href or a local path."""
+    return value if is_remote(value) else Path(value)
+
+
+def name(href: Href) -> str:
+    """Returns the file name of a local path or remote href."""
+    if is_remote(href):
+        return PurePosixPath(urlparse(str(href)).path).name
+    else:
+        return Path(href).name
+
+
+def stem(href: Href) -> str:
+    return PurePosixPath(name(href)).stem
+
+
+@contextmanager
+def open_zipfile(href: Href) -> Iterator[ZipFile]:
+    """Opens a local or remote zipfile for reading."""
+    if not is_remote(href):
+        with ZipFile(href) as zipfile:
+            yield zipfile
+        return
+
+    import fsspec
+
+    with fsspec.open(
+        str(href),
+        "rb",
+        block_size=BLOCK_SIZE,
+        cache_type="blockcache",
+        cache_options={"maxblocks": MAX_BLOCKS},
+    ) as f:
+        with ZipFile(f) as zipfile:
+            yield zipfile
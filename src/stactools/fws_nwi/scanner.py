@@ -0,0 +1,618 @@
+"""Single-pass reading of NWI zipfiles.
+
+Every shapefile in a zipfile is decoded at most once, and the content roles,
+PDF links, footprint, and geoparquet assets are all derived from that read.
+Layers whose records aren't needed are known only by their headers.
+"""
+
+import contextvars
+import shutil
+import struct
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, replace
+from functools import lru_cache, partial
+from itertools import islice
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import fiona
+import fiona.crs
+import geopandas
+import pandas
+import pyarrow
+import shapely
+import shapely.geometry
+from pyproj import CRS
+
+from stactools.fws_nwi import constants, flatgeobuf, geoparquet
+from stactools.fws_nwi import metadata as zipfile_metadata
+from stactools.fws_nwi import profiling, progress, remote, staging
+from stactools.fws_nwi.metadata import Metadata, Pdf
+from stactools.fws_nwi.remote import Href
+from stactools.fws_nwi.states import States
+
+T = TypeVar("T")
+
+# The number of records per batch when a layer is read in batches by default.
+BATCH_SIZE = constants.BATCH_SIZE
+
+# The metadata of a file written from a layer.
+Output = Union[geoparquet.Metadata, flatgeobuf.Metadata]
+
+# The bbox in the 100-byte header of ``.shp`` files, and the size of the
+# header and of each record of ``.shx`` files.
+SHP_HEADER_SIZE = 100
+SHP_BBOX = struct.Struct("<4d")
+SHP_BBOX_OFFSET = 36
+SHX_RECORD_SIZE = 8
+
+# Arrow types for the shapefile field types reported by fiona, used when
+# pyogrio is not available to read Arrow batches directly.
+FIONA_TYPES = {
+    "str": pyarrow.string(),
+    "int": pyarrow.int64(),
+    "int32": pyarrow.int32(),
+    "int64": pyarrow.int64(),
+    "float": pyarrow.float64(),
+    "date": pyarrow.string(),
+    "datetime": pyarrow.string(),
+}
+
+
+@dataclass
+class Header:
+    """Layer information that can be read without decoding any records."""
+
+    name: str
+    href: str
+    crs: str
+    row_count: int
+    bbox: Tuple[float, float, float, float]
+
+
+@dataclass
+class Layer:
+    """Everything we need from one shapefile layer of a zipfile."""
+
+    name: str
+    crs: str
+    row_count: int
+    role: Optional[str]
+    pdfs: List[Pdf]
+    boundary: Optional[Any]
+    footprint: Optional[Any]
+    geoparquet: Optional[geoparquet.Metadata]
+    flatgeobuf: Optional[flatgeobuf.Metadata]
+
+
+def scan_zipfile(
+    path: Href,
+    geoparquet_directory: Optional[Path] = None,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    flatgeobuf_directory: Optional[Path] = None,
+    fast_footprint: bool = False,
+    staging_options: Optional[staging.Options] = None,
+) -> Tuple[Metadata, List[Output]]:
+    """Reads a zipfile once, returning its metadata and any files written.
+
+    If ``geoparquet_directory`` is provided, each layer is also written to
+    that directory as geoparquet, and likewise for ``flatgeobuf_directory``
+    and FlatGeobuf. The metadata of the geoparquet files come first, then
+    that of the FlatGeobuf files. If ``batch_size`` is provided, layers are
+    streamed in batches of that many records instead of being read into
+    memory whole. ``geoparquet_options`` control how the geoparquet files are
+    laid out. If any layer fails, the files written for the other layers are
+    removed. See :func:`scan_layers` for ``workers``, ``processes``,
+    ``fast_footprint`` and ``staging_options``.
+    """
+    layers = scan_layers(
+        path,
+        geoparquet_directory,
+        batch_size=batch_size,
+        workers=workers,
+        processes=processes,
+        geoparquet_options=geoparquet_options,
+        flatgeobuf_directory=flatgeobuf_directory,
+        fast_footprint=fast_footprint,
+        staging_options=staging_options,
+    )
+    outputs: List[Output] = [layer.geoparquet for layer in layers if layer.geoparquet]
+    outputs.extend(layer.flatgeobuf for layer in layers if layer.flatgeobuf)
+    return create_metadata(path, layers), outputs
+
+
+def scan_layers(
+    path: Href,
+    geoparquet_directory: Optional[Path] = None,
+    metadata: bool = True,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    flatgeobuf_directory: Optional[Path] = None,
+    fast_footprint: bool = False,
+    staging_options: Optional[staging.Options] = None,
+) -> List[Layer]:
+    """Reads every shapefile layer in a zipfile exactly once.
+
+    If ``metadata`` is False, only the geoparquet assets are produced. If
+    ``workers`` is more than one, that many layers are scanned concurrently
+    in a thread pool, or a process pool if ``processes`` is True. The layers
+    are always returned in the zipfile's order.
+
+    If ``fast_footprint`` is True and the zipfile has no boundary layer, the
+    footprint is built from the index layers alone, or from the header bboxes
+    if there are none, and layers that are not written anywhere are never
+    decoded. See :func:`stactools.fws_nwi.metadata.calculate_geometry`.
+
+    The layers whose records are needed are extracted to scratch space
+    first, where ``staging_options`` say, see
+    :func:`stactools.fws_nwi.staging.extract`, and read from there. ``path``
+    may be a remote href, in which case only those layers are downloaded,
+    see :mod:`stactools.fws_nwi.remote`.
+    """
+    headers = read_headers(path)
+    # The headers tell us up front whether a single-record boundary layer
+    # will provide the geometry, or if we need to build a footprint.
+    needs_footprint = metadata and not any(header.row_count == 1 for header in headers)
+    fast_footprint = needs_footprint and fast_footprint
+    writes = geoparquet_directory is not None or flatgeobuf_directory is not None
+    names = [
+        header.name
+        for header in headers
+        if needs_records(header, writes, needs_footprint, fast_footprint)
+    ]
+    staging_options = staging_options or staging.Options()
+    with staging.extract(
+        path,
+        staging_options.directory,
+        staging_options.memory_limit,
+        layers=names,
+    ) as directory:
+        return _scan_layers(
+            path,
+            [replace(header, href=str(directory / header.name)) for header in headers],
+            geoparquet_directory=geoparquet_directory,
+            metadata=metadata,
+            needs_footprint=needs_footprint,
+            batch_size=batch_size,
+            workers=workers,
+            processes=processes,
+            geoparquet_options=geoparquet_options,
+            flatgeobuf_directory=flatgeobuf_directory,
+            fast_footprint=fast_footprint,
+        )
+
+
+def needs_records(
+    header: Header, writes: bool, footprint: bool, fast_footprint: bool
+) -> bool:
+    """Returns whether a layer's records must be decoded, not just its header.
+
+    They must be if the layer is written anywhere, if it may be the state
+    boundary or an index layer with PDF links, or if the footprint is built
+    from every layer.
+    """
+    if writes or header.row_count == 1 or zipfile_metadata.is_index_layer(header.name):
+        return True
+    return footprint and not fast_footprint
+
+
+def _scan_layers(
+    path: Href,
+    headers: List[Header],
+    geoparquet_directory: Optional[Path],
+    metadata: bool,
+    needs_footprint: bool,
+    batch_size: Optional[int],
+    workers: Optional[int],
+    processes: bool,
+    geoparquet_options: Optional[geoparquet.Options],
+    flatgeobuf_directory: Optional[Path] = None,
+    fast_footprint: bool = False,
+) -> List[Layer]:
+    scan = partial(
+        scan_layer,
+        path,
+        geoparquet_directory=geoparquet_directory,
+        metadata=metadata,
+        footprint=needs_footprint,
+        batch_size=batch_size,
+        geoparquet_options=geoparquet_options,
+        flatgeobuf_directory=flatgeobuf_directory,
+        fast_footprint=fast_footprint,
+    )
+    layers = _run(scan, headers, workers, processes)
+    if fast_footprint and not any(layer.footprint is not None for layer in layers):
+        for layer, header in zip(layers, headers):
+            layer.footprint = zipfile_metadata.header_footprint(header.bbox)
+    return layers
+
+
+def _run(
+    scan: Callable[[Header], Layer],
+    headers: List[Header],
+    workers: Optional[int],
+    processes: bool,
+) -> List[Layer]:
+    if not workers or workers <= 1:
+        layers: List[Layer] = []
+        try:
+            for header in headers:
+                layers.append(scan(header))
+        except BaseException:
+            for layer in layers:
+                remove_outputs(layer)
+            raise
+        return layers
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if not profiling.active():
+                return _run_largest_first(executor, scan, headers, remove_outputs)
+            # Stages recorded in the worker processes are sent back with
+            # their layers and added to this process's profiler.
+            collected = _run_largest_first(
+                executor,
+                partial(profiling.collect, scan),
+                headers,
+                lambda collected: remove_outputs(collected[0]),
+            )
+        for _, stages in collected:
+            profiling.add(stages)
+        return [layer for layer, _ in collected]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Each thread needs a copy of the context to see the active profiler.
+        context = contextvars.copy_context()
+        return _run_largest_first(
+            executor,
+            lambda header: context.copy().run(scan, header),
+            headers,
+            remove_outputs,
+        )
+
+
+def _run_largest_first(
+    executor: Any,
+    function: Callable[[Header], T],
+    headers: List[Header],
+    discard: Callable[[T], None],
+) -> List[T]:
+    # Start the largest layers first, so the wall-clock time is close to
+    # that of the largest layer and the small ones fill in around it.
+    futures: Dict[str, "Future[T]"] = {
+        header.name: executor.submit(function, header)
+        for header in sorted(headers, key=lambda header: header.row_count, reverse=True)
+    }
+    # If any layer fails, wait for the others so that their files can be
+    # discarded too.
+    wait(futures.values())
+    failed = [f for f in futures.values() if f.exception() is not None]
+    if failed:
+        for future in futures.values():
+            if future.exception() is None:
+                discard(future.result())
+        failed[0].result()
+    return [futures[header.name].result() for header in headers]
+
+
+def remove_outputs(layer: Layer) -> None:
+    """Removes the geoparquet and FlatGeobuf files written for a layer."""
+    for output in [layer.geoparquet, layer.flatgeobuf]:
+        if output is None:
+            continue
+        if output.path.is_dir():
+            shutil.rmtree(output.path, ignore_errors=True)
+        else:
+            output.path.unlink(missing_ok=True)
+
+
+def scan_layer(
+    path: Href,
+    header: Header,
+    geoparquet_directory: Optional[Path] = None,
+    metadata: bool = True,
+    footprint: bool = False,
+    batch_size: Optional[int] = None,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    flatgeobuf_directory: Optional[Path] = None,
+    fast_footprint: bool = False,
+) -> Layer:
+    href = header.href
+    layer = Layer(
+        name=header.name,
+        crs=header.crs,
+        row_count=0,
+        role=zipfile_metadata.role(header.name),
+        pdfs=[],
+        boundary=None,
+        footprint=None,
+        geoparquet=None,
+        flatgeobuf=None,
+    )
+    if fast_footprint and not zipfile_metadata.is_index_layer(header.name):
+        # The index layers provide the footprint.
+        footprint = False
+    writes = geoparquet_directory is not None or flatgeobuf_directory is not None
+    report = partial(
+        progress.report, remote.name(path), header.name, row_count=header.row_count
+    )
+    report(progress.STARTED, 0)
+    if not needs_records(header, writes, footprint, fast_footprint):
+        layer.row_count = header.row_count
+        report(progress.FINISHED, layer.row_count)
+        return layer
+    footprints = []
+    read_stage = profiling.stage("read", header.name)
+    metadata_stage = profiling.stage("metadata", header.name)
+    footprint_stage = profiling.stage("footprint", header.name)
+    write_stage = profiling.stage("write", header.name)
+    flatgeobuf_stage = profiling.stage("flatgeobuf", header.name)
+
+    def add(dataframe: geopandas.GeoDataFrame) -> None:
+        layer.row_count += len(dataframe)
+        if not metadata:
+            return
+        with metadata_stage:
+            metadata_stage.rows += len(dataframe)
+            layer.pdfs.extend(zipfile_metadata.pdfs(dataframe))
+            if header.row_count == 1 and len(dataframe) == 1:
+                layer.boundary = zipfile_metadata.boundary(
+                    dataframe.geometry.iloc[0], header.crs
+                )
+        if footprint:
+            with footprint_stage:
+                footprint_stage.rows += len(dataframe)
+                footprints.append(zipfile_metadata.layer_footprint(dataframe.geometry))
+
+    if batch_size is None:
+        with read_stage:
+            dataframe = geopandas.read_file(href)
+            read_stage.rows += len(dataframe)
+        add(dataframe)
+        report(progress.READ, layer.row_count)
+        if geoparquet_directory:
+            with write_stage:
+                write_stage.rows += len(dataframe)
+                layer.geoparquet = geoparquet.write(
+                    dataframe, header.name, geoparquet_directory, geoparquet_options
+                )
+        if flatgeobuf_directory:
+            with flatgeobuf_stage:
+                flatgeobuf_stage.rows += len(dataframe)
+                layer.flatgeobuf = flatgeobuf.write(
+                    dataframe, header.name, flatgeobuf_directory
+                )
+    else:
+        # Geometries are only decoded for a boundary or footprint. The other
+        # layers' metadata, their PDF links, are plain attributes.
+        decode = metadata and (footprint or header.row_count == 1)
+        writer = None
+        if geoparquet_directory:
+            writer = geoparquet.Writer(
+                header.name,
+                geoparquet_directory,
+                header.crs,
+                header.bbox,
+                geoparquet_options,
+            )
+        flatgeobuf_writer = None
+        if flatgeobuf_directory:
+            flatgeobuf_writer = flatgeobuf.Writer(
+                header.name, flatgeobuf_directory, header.crs
+            )
+        try:
+            for table in profiling.timed(read_batches(href, batch_size), read_stage):
+                if decode:
+                    with metadata_stage:
+                        dataframe = to_geodataframe(table, header.crs)
+                    add(dataframe)
+                else:
+                    layer.row_count += table.num_rows
+                    if metadata:
+                        with metadata_stage:
+                            metadata_stage.rows += table.num_rows
+                            layer.pdfs.extend(zipfile_metadata.pdfs(pdf_columns(table)))
+                report(progress.READ, layer.row_count)
+                if writer:
+                    with write_stage:
+                        write_stage.rows += table.num_rows
+                        writer.write(table)
+                if flatgeobuf_writer:
+                    with flatgeobuf_stage:
+                        flatgeobuf_stage.rows += table.num_rows
+                        flatgeobuf_writer.write(table)
+            if writer:
+                with write_stage:
+                    layer.geoparquet = writer.close()
+            if flatgeobuf_writer:
+                with flatgeobuf_stage:
+                    layer.flatgeobuf = flatgeobuf_writer.close()
+        except BaseException:
+            # Don't leave partly written files, or a writer thread waiting
+            # for batches that will never come.
+            if writer:
+                writer.abort()
+            if flatgeobuf_writer:
+                flatgeobuf_writer.abort()
+            raise
+
+    if footprint:
+        with footprint_stage:
+            layer.footprint = shapely.union_all(footprints)
+    report(progress.FINISHED, layer.row_count)
+    return layer
+
+
+def create_metadata(path: Href, layers: List[Layer]) -> Metadata:
+    """Combines the scanned layers of a zipfile into its metadata."""
+    state_code = remote.stem(path).split("_")[0]
+    content = set()
+    pdfs = []
+    geometry = None
+    crs = None
+    for layer in layers:
+        if layer.role:
+            content.add(layer.role)
+        pdfs.extend(layer.pdfs)
+        if layer.boundary is not None:
+            geometry = layer.boundary
+            crs = layer.crs
+    if geometry is None:
+        geometry, crs = zipfile_metadata.footprint(
+            [layer.footprint for layer in layers if layer.footprint is not None],
+            set(layer.crs for layer in layers),
+        )
+    return Metadata(
+        geometry=geometry,
+        crs=CRS(crs),
+        state_code=state_code,
+        state=States[state_code],
+        content=list(content),
+        pdfs=pdfs,
+    )
+
+
+def shapefile_names(path: Href) -> List[str]:
+    with remote.open_zipfile(path) as zipfile:
+        return [n for n in zipfile.namelist() if n.endswith(".shp")]
+
+
+def read_headers(path: Href, directory: Optional[Path] = None) -> List[Header]:
+    """Reads the header of every shapefile layer in a zipfile.
+
+    The bbox comes from the first bytes of each ``.shp`` member, the record
+    count from the size of its ``.shx`` member, and the CRS from its ``.prj``
+    member, so no records are read. If the zipfile has been extracted to
+    ``directory``, the headers' hrefs point there instead of into the
+    zipfile.
+    """
+    headers = []
+    with profiling.stage("headers") as stage, remote.open_zipfile(path) as zipfile:
+        infos = {info.filename: info for info in zipfile.infolist()}
+        for name in [n for n in infos if n.endswith(".shp")]:
+            stem = name[: -len(".shp")]
+            shx = infos.get(stem + ".shx")
+            if shx is None:
+                raise Exception(f"no .shx file for {name} in {path}")
+            with zipfile.open(name) as shp:
+                bbox = SHP_BBOX.unpack_from(shp.read(SHP_HEADER_SIZE), SHP_BBOX_OFFSET)
+            crs = ""
+            if stem + ".prj" in infos:
+                crs = crs_string(zipfile.read(stem + ".prj").decode())
+            headers.append(
+                Header(
+                    name=name,
+                    href=str(directory / name) if directory else f"zip://{path}!{name}",
+                    crs=crs,
+                    row_count=(shx.file_size - SHP_HEADER_SIZE) // SHX_RECORD_SIZE,
+                    bbox=bbox,
+                )
+            )
+        stage.rows = len(headers)
+    return headers
+
+
+@lru_cache()
+def crs_string(wkt: str) -> str:
+    """Returns the authority string of a shapefile's ``.prj`` WKT.
+
+    Looking up the authority takes a noticeable fraction of a second, and
+    every layer of a zipfile usually has the same ``.prj``, so it is cached.
+    """
+    return str(fiona.crs.CRS.from_wkt(wkt).to_string())
+
+
+def read_batches(href: str, batch_size: int) -> Iterator[pyarrow.Table]:
+    """Reads a layer as Arrow tables of at most ``batch_size`` records.
+
+    Each table has the layer's attribute columns followed by a WKB
+    ``geometry`` column. At least one (possibly empty) table is always
+    returned, so the layer's schema is never lost.
+    """
+    try:
+        from pyogrio.raw import open_arrow
+    except ImportError:
+        yield from _read_fiona_batches(href, batch_size)
+        return
+
+    with open_arrow(href, batch_size=batch_size, use_pyarrow=True) as (_, reader):
+        names = reader.schema.names[:-1] + [geoparquet.GEOMETRY_COLUMN]
+        schema = pyarrow.schema(
+            field.remove_metadata().with_name(name)
+            for field, name in zip(reader.schema, names)
+        )
+        empty = True
+        for batch in reader:
+            empty = False
+            yield pyarrow.Table.from_arrays(batch.columns, schema=schema)
+        if empty:
+            yield schema.empty_table()
+
+
+def _read_fiona_batches(href: str, batch_size: int) -> Iterator[pyarrow.Table]:
+    with fiona.open(href) as shapefile:
+        properties = shapefile.schema["properties"]
+        schema = pyarrow.schema(
+            [
+                (name, FIONA_TYPES.get(type.split(":")[0], pyarrow.string()))
+                for name, type in properties.items()
+            ]
+            + [(geoparquet.GEOMETRY_COLUMN, pyarrow.binary())]
+        )
+        records = iter(shapefile)
+        batch = list(islice(records, batch_size))
+        while True:
+            columns = {
+                name: [record["properties"][name] for record in batch]
+                for name in properties
+            }
+            columns[geoparquet.GEOMETRY_COLUMN] = [
+                (
+                    shapely.geometry.shape(record["geometry"]).wkb
+                    if record["geometry"]
+                    else None
+                )
+                for record in batch
+            ]
+            yield pyarrow.Table.from_pydict(columns, schema=schema)
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+
+
+def pdf_columns(table: pyarrow.Table) -> pandas.DataFrame:
+    """Returns just the PDF link columns of a batch, without decoding its
+    geometries."""
+    names = [
+        name for name in zipfile_metadata.PDF_COLUMNS if name in table.column_names
+    ]
+    return table.select(names).to_pandas()
+
+
+def to_geodataframe(table: pyarrow.Table, crs: str) -> geopandas.GeoDataFrame:
+    geometry = geopandas.GeoSeries.from_wkb(
+        table.column(geoparquet.GEOMETRY_COLUMN).to_numpy(zero_copy_only=False),
+        crs=crs,
+    )
+    dataframe = table.drop([geoparquet.GEOMETRY_COLUMN]).to_pandas()
+    return geopandas.GeoDataFrame(dataframe, geometry=geometry)
@@ -1,7 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 
 import shapely.geometry
+import stactools.core
 from pyproj.enums import WktVersion
 from pystac import (
     Asset,
@@ -14,11 +17,22 @@ from pystac import (
     Summaries,
     TemporalExtent,
 )
+from pystac.extensions.file import FileExtension
 from pystac.extensions.item_assets import AssetDefinition, ItemAssetsExtension
 from pystac.extensions.projection import ProjectionExtension
 from pystac.extensions.table import TableExtension
 
-from stactools.fws_nwi import geoparquet
+from stactools.fws_nwi import (
+    aio,
+    checksum,
+    flatgeobuf,
+    geoparquet,
+    progress,
+    remote,
+    scanner,
+    staging,
+)
+from stactools.fws_nwi.cache import Cache
 from stactools.fws_nwi.constants import (
     COLLECTION_BBOXES,
     DATETIME,
@@ -34,8 +48,12 @@ from stactools.fws_nwi.constants import (
     ZIPFILE_ASSET_KEY,
 )
 from stactools.fws_nwi.metadata import Metadata
+from stactools.fws_nwi.remote import Href
 from stactools.fws_nwi.states import States
 
+# Read and write STAC objects anywhere fsspec can, such as object storage.
+stactools.core.use_fsspec()
+
 
 def create_collection() -> Collection:
     collection = Collection(
@@ -77,25 +95,130 @@ def create_collection() -> Collection:
 
 
 def create_item(
-    zipfile_path: Path, geoparquet_directory: Optional[Path] = None
+    zipfile_path: Href,
+    geoparquet_directory: Optional[Path] = None,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    cache: Optional[Cache] = None,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    flatgeobuf_directory: Optional[Path] = None,
+    fast_footprint: bool = False,
+    checksums: bool = False,
+    staging_options: Optional[staging.Options] = None,
 ) -> Item:
+    """Creates an item from a state zipfile.
+
+    If ``geoparquet_directory`` or ``flatgeobuf_directory`` are provided,
+    each layer is written there as geoparquet or FlatGeobuf, respectively,
+    in the same pass over the zipfile, and added as an asset. If a ``cache``
+    is provided, an unchanged zipfile is not scanned again. If
+    ``fast_footprint`` is True, a zipfile without a state boundary gets its
+    geometry from the index layers instead of every wetland polygon.
+
+    ``zipfile_path`` may be an http(s) or other fsspec href, in which case
+    only the parts of the zipfile that are needed are downloaded.
+    ``staging_options`` say where the layers that are read are extracted to,
+    see :mod:`stactools.fws_nwi.staging`.
+
+    If ``checksums`` is True, the zipfile and geoparquet assets get
+    ``file:size`` and ``file:checksum`` fields. Geoparquet files are hashed
+    as they are written. A local zipfile is hashed by a second, sequential
+    read of the whole file in a thread alongside the scan, since the scan
+    only reads the members it needs and out of order, unless the cache
+    already has its hash. Remote zipfiles are not hashed,
+    since that would mean downloading them whole.
+    """
+    scan_zipfile = cache.scan_zipfile if cache else scanner.scan_zipfile
+    if checksums:
+        geoparquet_options = replace(
+            geoparquet_options or geoparquet.Options(), checksum=True
+        )
+    digest = None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        hashing = None
+        if checksums and cache is None and not remote.is_remote(zipfile_path):
+            # This is a second read of the zipfile, but running it alongside
+            # the scan means the two mostly share the page cache.
+            hashing = executor.submit(checksum.file, Path(zipfile_path))
+        metadata, outputs = scan_zipfile(
+            zipfile_path,
+            geoparquet_directory,
+            batch_size=batch_size,
+            workers=workers,
+            processes=processes,
+            geoparquet_options=geoparquet_options,
+            flatgeobuf_directory=flatgeobuf_directory,
+            fast_footprint=fast_footprint,
+            staging_options=staging_options,
+        )
+        if hashing:
+            digest = hashing.result()
+        elif checksums and cache and not remote.is_remote(zipfile_path):
+            digest = cache.digest(Path(zipfile_path))
     assets = {
-        ZIPFILE_ASSET_KEY: create_zipfile_asset(zipfile_path),
+        ZIPFILE_ASSET_KEY: create_zipfile_asset(zipfile_path, digest),
     }
-    if geoparquet_directory:
-        assets.update(
-            create_geoparquet_assets_from_zipfile(zipfile_path, geoparquet_directory)
+    assets.update(
+        create_geoparquet_assets(
+            [o for o in outputs if isinstance(o, geoparquet.Metadata)]
+        )
+    )
+    assets.update(
+        create_flatgeobuf_assets(
+            [o for o in outputs if isinstance(o, flatgeobuf.Metadata)]
         )
-    return create_item_from_assets(assets)
+    )
+    return create_item_from_metadata(metadata, assets)
+
+
+async def create_item_async(
+    zipfile_path: Href,
+    geoparquet_directory: Optional[Path] = None,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    cache: Optional[Cache] = None,
+    geoparquet_options: Optional[geoparquet.Options] = None,
+    flatgeobuf_directory: Optional[Path] = None,
+    fast_footprint: bool = False,
+    checksums: bool = False,
+    staging_options: Optional[staging.Options] = None,
+    runner: Optional[aio.Runner] = None,
+    listener: Optional[Callable[[progress.Event], None]] = None,
+) -> Item:
+    """Creates an item like :func:`create_item`, without blocking the loop.
+
+    The work is done by ``runner``, or a shared default runner, and
+    ``listener`` is called on the event loop with each progress event. See
+    :mod:`stactools.fws_nwi.aio`.
+    """
+    return await (runner or aio.default_runner()).run(
+        create_item,
+        zipfile_path,
+        geoparquet_directory,
+        batch_size=batch_size,
+        workers=workers,
+        processes=processes,
+        cache=cache,
+        geoparquet_options=geoparquet_options,
+        flatgeobuf_directory=flatgeobuf_directory,
+        fast_footprint=fast_footprint,
+        checksums=checksums,
+        staging_options=staging_options,
+        listener=listener,
+    )
 
 
 def create_item_from_assets(assets: Dict[str, Asset]) -> Item:
     zipfile_asset = assets.get(ZIPFILE_ASSET_KEY, None)
     if zipfile_asset is None:
         raise Exception("a zipfile asset is required to create an item")
-    metadata = Metadata.from_zipfile(
-        Path(zipfile_asset.href)
-    )  # TODO guard against URLs
+    metadata = Metadata.from_zipfile(remote.to_href(zipfile_asset.href))
+    return create_item_from_metadata(metadata, assets)
+
+
+def create_item_from_metadata(metadata: Metadata, assets: Dict[str, Asset]) -> Item:
     item = Item(
         id=metadata.state_code,
         geometry=shapely.geometry.mapping(metadata.geometry),
@@ -129,40 +252,119 @@ def create_item_from_assets(assets: Dict[str, Asset]) -> Item:
         for a in item.assets.values()
     ):
         TableExtension.add_to(item)
+    if any(
+        any(k.startswith("file:") for k in a.extra_fields.keys())
+        for a in item.assets.values()
+    ):
+        FileExtension.add_to(item)
 
     return item
 
 
-def create_zipfile_asset(path: Path) -> Asset:
+def create_zipfile_asset(path: Href, digest: Optional[checksum.Digest] = None) -> Asset:
+    stem = remote.stem(path)
     return Asset(
         href=str(path),
-        title=path.stem,
-        description=f"{path.stem} source zipfile",
+        title=stem,
+        description=f"{stem} source zipfile",
         media_type="application/zip",
         roles=["data", "archive", "source"],
+        extra_fields=digest.fields() if digest else None,
     )
 
 
 def create_geoparquet_assets_from_zipfile(
-    path: Path, directory: Path
+    path: Path,
+    directory: Path,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    options: Optional[geoparquet.Options] = None,
+) -> Dict[str, Asset]:
+    return create_geoparquet_assets(
+        geoparquet.from_zipfile(
+            path,
+            directory,
+            batch_size=batch_size,
+            workers=workers,
+            processes=processes,
+            options=options,
+        )
+    )
+
+
+async def create_geoparquet_assets_from_zipfile_async(
+    path: Path,
+    directory: Path,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    options: Optional[geoparquet.Options] = None,
+    runner: Optional[aio.Runner] = None,
+    listener: Optional[Callable[[progress.Event], None]] = None,
 ) -> Dict[str, Asset]:
-    metadatas = geoparquet.from_zipfile(path, directory)
+    """Like :func:`create_geoparquet_assets_from_zipfile`, see
+    :func:`create_item_async`."""
+    return await (runner or aio.default_runner()).run(
+        create_geoparquet_assets_from_zipfile,
+        path,
+        directory,
+        batch_size=batch_size,
+        workers=workers,
+        processes=processes,
+        options=options,
+        listener=listener,
+    )
+
+
+def create_geoparquet_assets(metadatas: List[geoparquet.Metadata]) -> Dict[str, Asset]:
     assets = {}
     for metadata in metadatas:
         roles = ["data", "cloud-optimized"]
         if metadata.role:
             roles.append(metadata.role)
+        extra_fields = {
+            "table:primary_geometry": metadata.primary_geometry,
+            "table:columns": metadata.columns,
+            "table:row_count": metadata.row_count,
+        }
+        if metadata.covering:
+            extra_fields["geoparquet:covering"] = metadata.covering
+        if metadata.sorting:
+            extra_fields["geoparquet:sorting"] = metadata.sorting
+        if metadata.partitioning:
+            extra_fields["geoparquet:partitioning"] = {
+                "scheme": "hive",
+                "keys": metadata.partitioning,
+            }
+        if metadata.checksum:
+            extra_fields["file:size"] = metadata.size
+            extra_fields["file:checksum"] = metadata.checksum
         asset = Asset(
             href=str(metadata.path),
             title=metadata.title,
             description=metadata.description,
             media_type="application/x-parquet",
             roles=roles,
-            extra_fields={
-                "table:primary_geometry": metadata.primary_geometry,
-                "table:columns": metadata.columns,
-                "table:row_count": metadata.row_count,
-            },
+            extra_fields=extra_fields,
         )
         assets[metadata.key] = asset
     return assets
+
+
+def create_flatgeobuf_assets(
+    metadatas: List[flatgeobuf.Metadata],
+) -> Dict[str, Asset]:
+    assets = {}
+    for metadata in metadatas:
+        roles = ["data", "cloud-optimized"]
+        if metadata.role:
+            roles.append(metadata.role)
+        assets[metadata.key] = Asset(
+            href=str(metadata.path),
+            title=metadata.title,
+            description=metadata.description,
+            media_type=flatgeobuf.MEDIA_TYPE,
+            roles=roles,
+        )
+    return assets
@@ -0,0 +1,112 @@
+"""Extracting the shapefiles of a zipfile to scratch space before reading them.
+
+Reading a layer straight out of a zipfile goes through GDAL's ``/vsizip/``
+filesystem, which re-inflates the deflated ``.shp`` and ``.dbf`` members and
+has to restart inflation whenever it seeks backwards. Extracting each member
+once and reading the local copies is much faster, especially when a layer is
+opened more than once.
+
+Only the layers that will be read need to be extracted, which for a remote
+zipfile means only their members are downloaded.
+"""
+
+import logging
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Collection, Iterator, List, Optional
+from zipfile import ZipFile, ZipInfo
+
+from stactools.fws_nwi import constants, profiling, remote
+from stactools.fws_nwi.remote import Href
+
+logger = logging.getLogger(__name__)
+
+# Zipfiles whose shapefiles inflate to no more than this many bytes are
+# extracted to shared memory, if there is room; larger ones go to disk.
+MEMORY_LIMIT = constants.STAGING_MEMORY_LIMIT
+MEMORY_DIRECTORY = Path("/dev/shm")
+COPY_BUFFER_SIZE = 1024**2
+
+
+@dataclass(frozen=True)
+class Options:
+    """Where zipfiles are extracted to, see :func:`extract`."""
+
+    directory: Optional[Path] = None
+    memory_limit: Optional[int] = MEMORY_LIMIT
+
+
+@contextmanager
+def extract(
+    path: Href,
+    directory: Optional[Path] = None,
+    memory_limit: Optional[int] = MEMORY_LIMIT,
+    layers: Optional[Collection[str]] = None,
+) -> Iterator[Path]:
+    """Extracts every member of a zipfile's shapefiles to a scratch directory.
+
+    Yields the scratch directory, in which members keep their paths inside
+    the zipfile, and removes it afterwards. The scratch directory is created
+    in ``directory`` if given, otherwise in shared memory if the members fit
+    within ``memory_limit`` and there is room, otherwise in the default
+    temporary directory. If ``layers`` is given, only the members of those
+    ``.shp`` names are extracted.
+    """
+    with remote.open_zipfile(path) as zipfile:
+        members = shapefile_members(zipfile, layers)
+        size = sum(member.file_size for member in members)
+        if directory is None and _fits_in_memory(size, memory_limit):
+            directory = MEMORY_DIRECTORY
+        with tempfile.TemporaryDirectory(
+            prefix=f"{remote.stem(path)}.", dir=directory
+        ) as scratch:
+            logger.debug(f"extracting {size} bytes from {path} to {scratch}")
+            with profiling.stage("extract"):
+                for member in members:
+                    destination = Path(scratch).joinpath(
+                        *PurePosixPath(member.filename).parts
+                    )
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    with zipfile.open(member) as source, open(
+                        destination, "wb"
+                    ) as target:
+                        shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+            yield Path(scratch)
+
+
+def shapefile_members(
+    zipfile: ZipFile, layers: Optional[Collection[str]] = None
+) -> List[ZipInfo]:
+    """Returns the members that make up the shapefiles of a zipfile.
+
+    These are the members that share a stem with a ``.shp`` member, such as
+    its ``.shx``, ``.dbf``, ``.prj`` and ``.cpg`` files. If ``layers`` is
+    given, only the members of those ``.shp`` names are returned.
+    """
+    infos = zipfile.infolist()
+    stems = set(
+        str(PurePosixPath(info.filename).with_suffix(""))
+        for info in infos
+        if info.filename.endswith(".shp")
+        and (layers is None or info.filename in layers)
+    )
+    members = []
+    for info in infos:
+        name = PurePosixPath(info.filename)
+        if info.is_dir() or ".." in name.parts or name.is_absolute():
+            continue
+        if str(name.with_suffix("")) in stems:
+            members.append(info)
+    return members
+
+
+def _fits_in_memory(size: int, memory_limit: Optional[int]) -> bool:
+    if not memory_limit or size > memory_limit or not MEMORY_DIRECTORY.is_dir():
+        return False
+    try:
+        return shutil.disk_usage(MEMORY_DIRECTORY).free > 2 * size
+    except OSError:
+        return False
@@ -0,0 +1,195 @@
+"""Validating items and collections without fetching schemas each time.
+
+pystac's validation resolves every schema over the network for each object.
+A :class:`Validator` instead takes the core STAC and GeoJSON schemas that
+pystac bundles, reads any others from a schema ``directory``, and compiles
+each schema once. A schema that is in neither is downloaded, and saved to
+the directory if there is one, so after one run with network access the
+directory can be copied to machines without it. For example::
+
+    validator = validation.Validator(Path("schemas"))
+    errors = validator.errors(item.to_dict())
+
+Many files are validated at once with :func:`validate_files`, in a process
+pool where each process compiles the schemas once.
+"""
+
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import jsonschema
+import requests
+from referencing import Registry, Resource
+from referencing.jsonschema import DRAFT7
+
+# Seconds to wait for a schema that is not cached.
+TIMEOUT = 30
+CORE_SCHEMA = (
+    "https://schemas.stacspec.org/v{version}/{type}-spec/json-schema/{type}.json"
+)
+CORE_TYPES = {"Feature": "item", "Collection": "collection", "Catalog": "catalog"}
+
+_validator: Optional["Validator"] = None
+
+
+class Validator:
+    """Validates STAC objects against their core and extension schemas."""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = directory
+        self._schemas = _bundled_schemas()
+        self._validators: Dict[str, Any] = {}
+        self._registry: Registry = Registry(  # type: ignore[call-arg]
+            retrieve=self._retrieve
+        )
+
+    def errors(self, stac: Dict[str, Any]) -> List[str]:
+        """Returns the validation errors of a STAC object's dictionary.
+
+        Each error names the schema that it is from and where in the object
+        it is, so an empty list means that the object is valid.
+        """
+        # Dictionaries from ``to_dict`` can hold tuples, which JSON schemas
+        # don't count as arrays.
+        stac = json.loads(json.dumps(stac))
+        errors = []
+        for uri in schema_uris(stac):
+            for error in self.validator(uri).iter_errors(stac):
+                # Errors from oneOf and anyOf repeat the whole object, so
+                # report the most relevant error that they contain instead.
+                error = jsonschema.exceptions.best_match([error]) or error
+                location = "/".join(str(part) for part in error.absolute_path)
+                message = f"{uri}: {error.message} at /{location}"
+                if message not in errors:
+                    errors.append(message)
+        return errors
+
+    def validate(self, stac: Dict[str, Any]) -> None:
+        """Raises an exception if a STAC object is not valid."""
+        errors = self.errors(stac)
+        if errors:
+            raise Exception(f"{stac.get('id')} is not valid: " + "; ".join(errors))
+
+    def validator(self, uri: str) -> Any:
+        """Returns the compiled validator for a schema."""
+        validator = self._validators.get(uri)
+        if validator is None:
+            schema = self.schema(uri)
+            cls = jsonschema.validators.validator_for(
+                schema, jsonschema.Draft7Validator
+            )
+            validator = self._validators[uri] = cls(schema, registry=self._registry)
+        return validator
+
+    def schema(self, uri: str) -> Dict[str, Any]:
+        """Returns a schema, from the bundled schemas, the schema directory or
+        the network, in that order."""
+        schema: Optional[Dict[str, Any]] = self._schemas.get(uri)
+        if schema is not None:
+            return schema
+        path = schema_path(self.directory, uri) if self.directory else None
+        if path and path.exists():
+            with open(path) as f:
+                schema = json.load(f)
+        else:
+            try:
+                response = requests.get(uri, timeout=TIMEOUT)
+                response.raise_for_status()
+            except requests.RequestException as error:
+                where = f" or in {self.directory}" if self.directory else ""
+                raise Exception(
+                    f"could not fetch the schema {uri}, and it is not bundled{where}"
+                ) from error
+            schema = response.json()
+            if path:
+                _write(path, schema)
+        self._schemas[uri] = schema
+        return schema
+
+    def _retrieve(self, uri: str) -> Resource:
+        return Resource.from_contents(self.schema(uri), default_specification=DRAFT7)
+
+
+def schema_uris(stac: Dict[str, Any]) -> List[str]:
+    """Returns the core schema of a STAC object, followed by its extensions."""
+    type = CORE_TYPES.get(stac.get("type", ""))
+    if type is None:
+        raise Exception(f"not a STAC item, collection or catalog: {stac.get('id')}")
+    core = CORE_SCHEMA.format(version=stac["stac_version"], type=type)
+    return [core] + list(stac.get("stac_extensions", []))
+
+
+def schema_path(directory: Path, uri: str) -> Path:
+    """Returns where a schema is cached in a directory, by host and path."""
+    url = urlparse(uri)
+    return Path(directory, url.netloc, *url.path.lstrip("/").split("/"))
+
+
+def validate_files(
+    paths: List[Path], directory: Optional[Path] = None, workers: Optional[int] = None
+) -> Dict[Path, List[str]]:
+    """Validates STAC JSON files in a process pool.
+
+    Returns the errors of each file, which are empty for valid files.
+    """
+    if workers == 1 or len(paths) <= 1:
+        validator = Validator(directory)
+        return {path: _errors(validator, path) for path in paths}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_start, initargs=(directory,)
+    ) as executor:
+        chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+        return dict(zip(paths, executor.map(_validate, paths, chunksize=chunksize)))
+
+
+def collection_files(path: Path) -> List[Path]:
+    """Returns a collection's JSON file followed by those of all of its items."""
+    from pystac import Collection
+
+    collection = Collection.from_file(str(path))
+    files = [Path(path)]
+    for item in collection.get_items(recursive=True):
+        href = item.get_self_href()
+        if href:
+            files.append(Path(href))
+    return files
+
+
+def _bundled_schemas() -> Dict[str, Dict[str, Any]]:
+    # Older versions of pystac don't bundle any schemas.
+    try:
+        from pystac.validation.local_validator import get_local_schema_cache
+    except ImportError:
+        return {}
+    return dict(get_local_schema_cache())
+
+
+def _write(path: Path, schema: Dict[str, Any]) -> None:
+    # Written to a scratch file first, so a concurrent reader never sees a
+    # partly written schema.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as f:
+        json.dump(schema, f)
+    os.replace(f.name, path)
+
+
+def _errors(validator: Validator, path: Path) -> List[str]:
+    with open(path) as f:
+        return validator.errors(json.load(f))
+
+
+def _start(directory: Optional[Path]) -> None:
+    global _validator
+    _validator = Validator(directory)
+
+
+def _validate(path: Path) -> List[str]:
+    assert _validator
+    return _errors(_validator, path)
@@ -0,0 +1,351 @@
+"""Creating items for zipfiles as they arrive in a spool directory.
+
+A :class:`Worker` polls a spool directory for ``*_shapefile_wetlands.zip``
+files, or ``*.job`` files of the form ``{"href": "..."}`` for zipfiles
+elsewhere, and creates an item for each in a pool of long-lived processes.
+The worker processes import the geospatial libraries and set up PROJ and GDAL
+once, see :func:`warm`, so each job only pays for its own work.
+
+Jobs are claimed by moving them into the spool's ``.processing``
+subdirectory, and moved to ``done`` or ``failed`` once they are finished.
+Each item is written with its geoparquet assets to a scratch directory in
+the destination, which then replaces ``<destination>/<ID>`` in one rename,
+so readers never see a partly written item. A status record is appended to
+``status.ndjson`` in the destination as each job starts and finishes.
+
+Only one worker should watch a spool directory at once, since jobs left in
+``.processing`` by a worker that was stopped are put back in the spool when
+the next one starts.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from stactools.fws_nwi import geoparquet, remote, stac, staging
+from stactools.fws_nwi.batch import ZIPFILE_SUFFIX, marked_running, was_running
+from stactools.fws_nwi.cache import Cache
+from stactools.fws_nwi.constants import ZIPFILE_ASSET_KEY
+
+logger = logging.getLogger(__name__)
+
+JOB_SUFFIX = ".job"
+PROCESSING = ".processing"
+DONE = "done"
+FAILED = "failed"
+STATUS_FILE = "status.ndjson"
+STARTED = "started"
+SUCCEEDED = "succeeded"
+# The spool is checked for new jobs this often, and a file is only taken
+# once it has not been modified for SETTLE_SECONDS, so that files which are
+# still being copied in are left alone.
+POLL_SECONDS = 1.0
+SETTLE_SECONDS = 1.0
+
+
+@dataclass
+class Status:
+    """A status record for a job, written as one line of JSON."""
+
+    job: str
+    status: str
+    time: str
+    worker: Optional[int] = None
+    item: Optional[str] = None
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class Worker:
+    """Creates an item for each job in a spool directory.
+
+    Jobs are run in ``workers`` warm processes, which defaults to the number
+    of CPUs. If a worker process dies, such as when it runs out of memory,
+    the pool is replaced, the jobs that were running fail, and those that
+    had not started are resubmitted.
+    """
+
+    def __init__(
+        self,
+        spool: Path,
+        destination: Path,
+        workers: Optional[int] = None,
+        create_geoparquet: bool = False,
+        batch_size: Optional[int] = None,
+        cache: Optional[Cache] = None,
+        geoparquet_options: Optional[geoparquet.Options] = None,
+        staging_options: Optional[staging.Options] = None,
+        poll_seconds: float = POLL_SECONDS,
+        settle_seconds: float = SETTLE_SECONDS,
+    ):
+        self.spool = Path(spool).absolute()
+        self.destination = Path(destination).absolute()
+        self.workers = workers
+        self.create_geoparquet = create_geoparquet
+        self.batch_size = batch_size
+        self.cache = cache
+        self.geoparquet_options = geoparquet_options
+        self.staging_options = staging_options
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict["Future[Dict[str, Any]]", Path] = {}
+        # Worker processes mark the jobs that they are working on here, so
+        # that when the pool breaks we know which jobs had started.
+        self._running: Optional[Path] = None
+        self._stopping = False
+        self._unsettled = 0
+
+    def run(self, once: bool = False) -> None:
+        """Processes jobs as they arrive, until interrupted.
+
+        If ``once`` is True, returns as soon as the jobs already in the spool
+        have settled and are finished.
+        """
+        for directory in [PROCESSING, DONE, FAILED]:
+            (self.spool / directory).mkdir(parents=True, exist_ok=True)
+        self.destination.mkdir(parents=True, exist_ok=True)
+        for path in sorted((self.spool / PROCESSING).iterdir()):
+            logger.warning(f"requeueing {path.name}, which was not finished")
+            os.replace(path, self.spool / path.name)
+        try:
+            while True:
+                for path in self.claim():
+                    self.submit(path)
+                if self._futures:
+                    self.wait(self.poll_seconds)
+                elif once and not self._unsettled:
+                    return
+                else:
+                    time.sleep(self.poll_seconds)
+        finally:
+            self.shutdown()
+
+    def claim(self) -> List[Path]:
+        """Moves the jobs that are ready into ``.processing``, oldest first."""
+        ready = []
+        now = time.time()
+        jobs = [path for path in self.spool.iterdir() if is_job(path)]
+        for path in jobs:
+            modified = path.stat().st_mtime
+            if now - modified >= self.settle_seconds:
+                ready.append((modified, path))
+        self._unsettled = len(jobs) - len(ready)
+        claimed = []
+        for _, path in sorted(ready):
+            destination = self.spool / PROCESSING / path.name
+            try:
+                os.rename(path, destination)
+            except FileNotFoundError:
+                continue
+            claimed.append(destination)
+        return claimed
+
+    def submit(self, path: Path) -> None:
+        if self._running is None:
+            self._running = Path(tempfile.mkdtemp(prefix=".fws-nwi-running."))
+        call = partial(
+            process,
+            path,
+            self.spool / DONE,
+            self.destination,
+            self.create_geoparquet,
+            self.batch_size,
+            self.cache,
+            self.geoparquet_options,
+            self.staging_options,
+            self._running,
+        )
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=warm
+            )
+        try:
+            future = self._executor.submit(call)
+        except BrokenProcessPool:
+            self._replace_executor()
+            future = self._executor.submit(call)
+        self._futures[future] = path
+        self.emit(Status(job=path.name, status=STARTED, time=_now()))
+
+    def wait(self, timeout: Optional[float]) -> None:
+        """Records the jobs that finish within ``timeout`` seconds, returning
+        as soon as any do."""
+        done, _ = wait(list(self._futures), timeout, return_when=FIRST_COMPLETED)
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+            # A worker died, such as when it ran out of memory, which breaks
+            # the whole pool. Once the pool is shut down every job in it has
+            # finished, so they are all handled here.
+            self._replace_executor()
+            done = {future for future in self._futures if future.done()}
+        for future in done:
+            path = self._futures.pop(future)
+            try:
+                status = Status(**future.result())
+            except Exception as error:
+                if (
+                    isinstance(error, BrokenProcessPool)
+                    and self._running is not None
+                    and not was_running(self._running, path)
+                ):
+                    if self._stopping:
+                        logger.warning(f"requeueing {path.name}, which had not started")
+                        os.replace(path, self.spool / path.name)
+                    else:
+                        logger.warning(
+                            f"resubmitting {path.name}, which had not started"
+                        )
+                        self.submit(path)
+                    continue
+                if path.exists():
+                    os.replace(path, self.spool / FAILED / path.name)
+                status = Status(
+                    job=path.name, status=FAILED, time=_now(), error=str(error)
+                )
+            self.emit(status)
+
+    def emit(self, status: Status) -> None:
+        record = {k: v for k, v in asdict(status).items() if v is not None}
+        line = json.dumps(record) + "\n"
+        with open(self.destination / STATUS_FILE, "a") as f:
+            f.write(line)
+        if status.status == FAILED:
+            logger.error(f"{status.job}: {status.error}")
+        else:
+            logger.info(f"{status.job}: {status.status}")
+
+    def shutdown(self) -> None:
+        """Waits for the running jobs, and puts the others back in the spool."""
+        for future, path in list(self._futures.items()):
+            if future.cancel():
+                del self._futures[future]
+                os.replace(path, self.spool / path.name)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._stopping = True
+        try:
+            while self._futures:
+                self.wait(None)
+        finally:
+            self._stopping = False
+        if self._running is not None:
+            shutil.rmtree(self._running, ignore_errors=True)
+            self._running = None
+
+    def _replace_executor(self) -> None:
+        """Shuts down a broken pool, so the next job starts a new one."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def is_job(path: Path) -> bool:
+    return path.is_file() and (
+        path.name.endswith(ZIPFILE_SUFFIX) or path.name.endswith(JOB_SUFFIX)
+    )
+
+
+def warm() -> None:
+    """Does the one-off setup of a worker process before its first job.
+
+    This imports the geospatial libraries, and creates the transformer from
+    the NWI's usual projection to WGS84, which starts PROJ's database.
+    """
+    import geopandas  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+
+    from stactools.fws_nwi import metadata, scanner  # noqa: F401
+
+    metadata.transformer("EPSG:5070", "EPSG:4326")
+
+
+def process(
+    path: Path,
+    done: Path,
+    destination: Path,
+    create_geoparquet: bool,
+    batch_size: Optional[int],
+    cache: Optional[Cache],
+    geoparquet_options: Optional[geoparquet.Options],
+    staging_options: Optional[staging.Options],
+    running: Path,
+) -> Dict[str, Any]:
+    """Creates and publishes the item for one claimed job.
+
+    A zipfile job is moved to ``done`` once its item is published, and the
+    item's zipfile asset points at where it will stay. The job is marked in
+    ``running`` while it runs. Returns the job's status record.
+    """
+    with marked_running(running, path):
+        start = time.perf_counter()
+        if path.name.endswith(JOB_SUFFIX):
+            with open(path) as f:
+                href = remote.to_href(json.load(f)["href"])
+        else:
+            href = path
+        scratch = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=destination))
+        try:
+            item = stac.create_item(
+                href,
+                geoparquet_directory=scratch if create_geoparquet else None,
+                batch_size=batch_size,
+                cache=cache,
+                geoparquet_options=geoparquet_options,
+                staging_options=staging_options,
+            )
+            if href == path:
+                item.assets[ZIPFILE_ASSET_KEY].href = str(done / path.name)
+            directory = destination / item.id
+            for asset in item.assets.values():
+                if asset.href.startswith(str(scratch)):
+                    asset.href = str(directory / Path(asset.href).relative_to(scratch))
+            item_path = directory / f"{item.id}.json"
+            item.set_self_href(str(item_path))
+            item.make_asset_hrefs_relative()
+            item.save_object(
+                include_self_link=False, dest_href=str(scratch / item_path.name)
+            )
+            publish(scratch, directory)
+        except BaseException:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+        # Only once the item is published, so a job that fails stays where the
+        # worker moves failed jobs.
+        os.replace(path, done / path.name)
+        return asdict(
+            Status(
+                job=path.name,
+                status=SUCCEEDED,
+                time=_now(),
+                worker=os.getpid(),
+                item=str(item_path),
+                seconds=round(time.perf_counter() - start, 3),
+            )
+        )
+
+
+def publish(scratch: Path, directory: Path) -> None:
+    """Replaces ``directory`` with ``scratch``, as close to atomically as
+    directories allow."""
+    if not directory.exists():
+        os.rename(scratch, directory)
+        return
+    old = Path(tempfile.mkdtemp(prefix=f".{directory.name}.", dir=directory.parent))
+    os.rename(directory, old / directory.name)
+    os.rename(scratch, directory)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -1,4 +1,5 @@
 from pathlib import Path
+from zipfile import ZipFile
 
 import pytest
 
@@ -10,6 +11,36 @@ def dc_zipfile() -> Path:
     return Path(test_data.get_path("data-files/DC_shapefile_wetlands.zip"))
 
 
+@pytest.fixture
+def dc_zipfile_without_boundary(dc_zipfile: Path, tmp_path: Path) -> Path:
+    """The DC zipfile without its single-record state boundary layer."""
+    path = tmp_path / "without-boundary" / dc_zipfile.name
+    path.parent.mkdir()
+    with ZipFile(dc_zipfile) as source, ZipFile(path, "w") as destination:
+        for info in source.infolist():
+            if "District_of_Columbia" not in info.filename:
+                destination.writestr(info, source.read(info))
+    return path
+
+
+@pytest.fixture
+def dc_zipfile_without_index_layers(
+    dc_zipfile_without_boundary: Path, tmp_path: Path
+) -> Path:
+    """The DC zipfile with only its wetlands layer."""
+    path = tmp_path / "without-index-layers" / dc_zipfile_without_boundary.name
+    path.parent.mkdir()
+    with ZipFile(dc_zipfile_without_boundary) as source, ZipFile(
+        path, "w"
+    ) as destination:
+        for info in source.infolist():
+            if "Historic_Map_Info" not in info.filename and (
+                "Project_Metadata" not in info.filename
+            ):
+                destination.writestr(info, source.read(info))
+    return path
+
+
 @pytest.fixture
 def hi_zipfile() -> Path:
     return Path(test_data.get_external_data("HI_shapefile_wetlands.zip"))
@@ -0,0 +1,144 @@
+"""Synthetic NWI zipfiles of any size, for tests and benchmarks.
+
+The zipfiles have the same layout, layer names, fields and projection as the
+state downloads, with randomly placed, roughly circular polygons.
+"""
+
+import tempfile
+from pathlib import Path
+from typing import Tuple
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import geopandas
+import numpy
+import shapely
+
+from stactools.fws_nwi.states import States
+
+CRS = "EPSG:5070"
+# Roughly the extent of the District of Columbia in CRS.
+BBOX = (1606000.0, 1913000.0, 1630000.0, 1943000.0)
+WETLAND_TYPES = [
+    "Freshwater Emergent Wetland",
+    "Freshwater Forested/Shrub Wetland",
+    "Freshwater Pond",
+    "Lake",
+    "Riverine",
+    "Estuarine and Marine Wetland",
+]
+HISTORIC_MAPS = 5
+
+
+def create_zipfile(
+    directory: Path,
+    code: str = "DC",
+    features: int = 1000,
+    vertices: int = 32,
+    riparian: bool = True,
+    boundary: bool = True,
+    seed: int = 0,
+    bbox: Tuple[float, float, float, float] = BBOX,
+) -> Path:
+    """Creates a synthetic ``<CODE>_shapefile_wetlands.zip`` in a directory.
+
+    The wetlands layer has ``features`` polygons of ``vertices`` vertices
+    each, and the riparian layer, if any, has a tenth as many. The historic
+    map info layer has :data:`HISTORIC_MAPS` records with ``PDF_HYPERL``
+    links. If ``boundary`` is True there is a single-record state boundary
+    layer covering ``bbox``.
+    """
+    rng = numpy.random.default_rng(seed)
+    folder = f"{code}_shapefile_wetlands"
+    layers = {
+        f"{code}_Wetlands": _wetlands(rng, features, vertices, bbox),
+        f"{code}_Wetlands_Historic_Map_Info": _historic_map_info(bbox),
+    }
+    if riparian:
+        layers[f"{code}_Riparian"] = _wetlands(
+            rng, max(features // 10, 1), vertices, bbox
+        )
+    if boundary:
+        layers[States[code].value.replace(" ", "_")] = _boundary(code, bbox)
+
+    path = Path(directory) / f"{folder}.zip"
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        with ZipFile(path, "w", compression=ZIP_DEFLATED) as zipfile:
+            for name, dataframe in layers.items():
+                shapefile = Path(temporary_directory) / f"{name}.shp"
+                dataframe.to_file(shapefile, driver="ESRI Shapefile")
+                for member in sorted(Path(temporary_directory).glob(f"{name}.*")):
+                    zipfile.write(member, f"{folder}/{member.name}")
+    return path
+
+
+def _wetlands(
+    rng: numpy.random.Generator,
+    features: int,
+    vertices: int,
+    bbox: Tuple[float, float, float, float],
+) -> geopandas.GeoDataFrame:
+    xmin, ymin, xmax, ymax = bbox
+    centers = rng.uniform([xmin, ymin], [xmax, ymax], size=(features, 2))
+    radii = rng.uniform(10, 200, size=(features, 1))
+    angles = numpy.linspace(0, 2 * numpy.pi, vertices, endpoint=False)
+    jitter = rng.uniform(0.7, 1.0, size=(features, vertices))
+    x = centers[:, :1] + radii * jitter * numpy.cos(angles)
+    y = centers[:, 1:] + radii * jitter * numpy.sin(angles)
+    rings = numpy.stack([x, y], axis=-1)
+    rings = numpy.concatenate([rings, rings[:, :1]], axis=1)
+    geometry = shapely.polygons(rings)
+    area = shapely.area(geometry)
+    return geopandas.GeoDataFrame(
+        {
+            "ATTRIBUTE": rng.choice(
+                ["PEM1C", "PFO1A", "PUBHh", "L1UBH", "R2UBH"], features
+            ),
+            "WETLAND_TY": rng.choice(WETLAND_TYPES, features),
+            "ACRES": area / 4046.8564224,
+            "Shape_Leng": shapely.length(geometry),
+            "Shape_Area": area,
+        },
+        geometry=geometry,
+        crs=CRS,
+    )
+
+
+def _historic_map_info(
+    bbox: Tuple[float, float, float, float],
+) -> geopandas.GeoDataFrame:
+    xmin, ymin, xmax, ymax = bbox
+    width = (xmax - xmin) / HISTORIC_MAPS
+    names = [f"synthetic-{i}.pdf" for i in range(HISTORIC_MAPS)]
+    geometry = [
+        shapely.box(xmin + i * width, ymin, xmin + (i + 1) * width, ymax)
+        for i in range(HISTORIC_MAPS)
+    ]
+    return geopandas.GeoDataFrame(
+        {
+            "PDF_NAME": names,
+            "PDF_HYPERL": [
+                f"http://www.fws.gov/wetlands/Data/HisMapRep/{name}" for name in names
+            ],
+            "SHAPE_Leng": shapely.length(geometry),
+            "SHAPE_Area": shapely.area(geometry),
+        },
+        geometry=geometry,
+        crs=CRS,
+    )
+
+
+def _boundary(
+    code: str, bbox: Tuple[float, float, float, float]
+) -> geopandas.GeoDataFrame:
+    geometry = shapely.box(*bbox)
+    return geopandas.GeoDataFrame(
+        {
+            "ST_NAME1": [States[code].value],
+            "ST_ABBV": [code],
+            "AreaAcres": [geometry.area / 4046.8564224],
+            "Shape_Leng": [geometry.length],
+            "Shape_Area": [geometry.area],
+        },
+        geometry=[geometry],
+        crs=CRS,
+    )
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from stactools.fws_nwi import aio, geoparquet, progress, stac
+
+
+def test_create_item_async(dc_zipfile: Path) -> None:
+    item = asyncio.run(stac.create_item_async(dc_zipfile))
+    assert item.to_dict() == stac.create_item(dc_zipfile).to_dict()
+
+
+def test_create_geoparquet_assets_async(dc_zipfile: Path, tmp_path: Path) -> None:
+    assets = asyncio.run(
+        stac.create_geoparquet_assets_from_zipfile_async(dc_zipfile, tmp_path)
+    )
+    assert len(assets) == 4
+    assert assets["DC_Wetlands"].extra_fields["table:row_count"] == 1556
+
+
+def test_listener_runs_on_the_loop(dc_zipfile: Path, tmp_path: Path) -> None:
+    events: List[progress.Event] = []
+    threads = set()
+
+    def listener(event: progress.Event) -> None:
+        events.append(event)
+        threads.add(threading.get_ident())
+
+    async def main() -> None:
+        with aio.Runner() as runner:
+            await stac.create_item_async(
+                dc_zipfile, tmp_path, runner=runner, listener=listener
+            )
+
+    asyncio.run(main())
+    assert threads == {threading.get_ident()}
+    layers = {e.layer for e in events}
+    assert len(layers) == 4
+    for layer in layers:
+        kinds = [e.kind for e in events if e.layer == layer]
+        assert kinds[0] == progress.STARTED
+        assert kinds[-1] == progress.FINISHED
+
+
+def test_loop_is_not_blocked(dc_zipfile: Path, tmp_path: Path) -> None:
+    ticks = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    async def main() -> None:
+        ticker = asyncio.ensure_future(tick())
+        await stac.create_item_async(dc_zipfile, tmp_path)
+        ticker.cancel()
+
+    asyncio.run(main())
+    assert ticks > 1
+
+
+def test_limit() -> None:
+    running = 0
+    most = 0
+    lock = threading.Lock()
+
+    def work() -> None:
+        nonlocal running, most
+        with lock:
+            running += 1
+            most = max(most, running)
+        threading.Event().wait(0.05)
+        with lock:
+            running -= 1
+
+    async def main() -> None:
+        with aio.Runner(max_workers=4, limit=2) as runner:
+            await asyncio.gather(*(runner.run(work) for _ in range(6)))
+
+    asyncio.run(main())
+    assert most == 2
+
+
+def test_cancel(dc_zipfile: Path, tmp_path: Path) -> None:
+    events: List[progress.Event] = []
+    tasks: List["asyncio.Future[Any]"] = []
+
+    def listener(event: progress.Event) -> None:
+        events.append(event)
+        if event.layer.endswith("/DC_Wetlands.shp") and event.kind == progress.READ:
+            tasks[0].cancel()
+
+    async def main() -> None:
+        with aio.Runner() as runner:
+            task = asyncio.ensure_future(
+                stac.create_item_async(
+                    dc_zipfile,
+                    tmp_path,
+                    batch_size=100,
+                    runner=runner,
+                    listener=listener,
+                )
+            )
+            tasks.append(task)
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # The work has stopped by the time the cancellation is raised.
+            count = len(events)
+            await asyncio.sleep(0.1)
+            assert len(events) == count
+
+    asyncio.run(main())
+    wetlands = [e for e in events if e.layer.endswith("/DC_Wetlands.shp")]
+    assert progress.FINISHED not in [e.kind for e in wetlands]
+    assert max(e.rows for e in wetlands) < 1556
+
+
+def test_cancel_leaves_no_files(dc_zipfile: Path, tmp_path: Path) -> None:
+    tasks: List["asyncio.Future[Any]"] = []
+
+    def listener(event: progress.Event) -> None:
+        if event.layer.endswith("/DC_Wetlands.shp") and event.kind == progress.READ:
+            tasks[0].cancel()
+
+    async def main() -> None:
+        with aio.Runner() as runner:
+            task = asyncio.ensure_future(
+                stac.create_item_async(
+                    dc_zipfile,
+                    tmp_path / "geoparquet",
+                    batch_size=100,
+                    geoparquet_options=geoparquet.Options(spatial_sort=True),
+                    flatgeobuf_directory=tmp_path / "flatgeobuf",
+                    runner=runner,
+                    listener=listener,
+                )
+            )
+            tasks.append(task)
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    (tmp_path / "geoparquet").mkdir()
+    (tmp_path / "flatgeobuf").mkdir()
+    asyncio.run(main())
+    assert not list((tmp_path / "geoparquet").iterdir())
+    assert not list((tmp_path / "flatgeobuf").iterdir())
+    assert not [t for t in threading.enumerate() if t.name.startswith("flatgeobuf")]
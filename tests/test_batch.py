@@ -0,0 +1,72 @@
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+import pyarrow.parquet
+import pytest
+from pystac import Item
+
+from stactools.fws_nwi import batch, export, stac
+
+
+def test_zipfile_paths_largest_first(dc_zipfile: Path, tmp_path: Path) -> None:
+    shutil.copy(dc_zipfile, tmp_path)
+    small = tmp_path / "RI_shapefile_wetlands.zip"
+    small.write_bytes(b"not much")
+    (tmp_path / "notes.txt").write_text("ignored")
+    assert batch.zipfile_paths(tmp_path) == [tmp_path / dc_zipfile.name, small]
+
+
+def test_create_items_isolates_failures(dc_zipfile: Path, tmp_path: Path) -> None:
+    broken = tmp_path / "RI_shapefile_wetlands.zip"
+    broken.write_bytes(b"not a zipfile")
+    items, failures = batch.create_items(
+        [dc_zipfile, broken], geoparquet_directory=tmp_path, workers=2, retries=1
+    )
+    assert [item.id for item in items] == ["DC"]
+    assert [failure.path for failure in failures] == [broken]
+    assert len(list((tmp_path / "DC").glob("*.geoparquet"))) == 4
+
+
+def test_create_items_survives_a_dead_worker(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    create_item = stac.create_item
+    killer = tmp_path / "RI_shapefile_wetlands.zip"
+    shutil.copy(dc_zipfile, killer)
+
+    def create_item_or_die(path: Path, **kwargs: Any) -> Item:
+        # Workers are forked, so they see this patch.
+        if path.name == killer.name:
+            os._exit(1)
+        return create_item(path, **kwargs)
+
+    monkeypatch.setattr(stac, "create_item", create_item_or_die)
+    items, failures = batch.create_items([killer, dc_zipfile], workers=1, retries=2)
+    assert [item.id for item in items] == ["DC"]
+    assert [failure.path for failure in failures] == [killer]
+
+
+def test_create_collection_from_directory_with_export(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    source = tmp_path / "source"
+    source.mkdir()
+    shutil.copy(dc_zipfile, source)
+    (source / "RI_shapefile_wetlands.zip").write_bytes(b"not a zipfile")
+    _, failures = batch.create_collection_from_directory(
+        source,
+        str(tmp_path / "collection" / "collection.json"),
+        workers=2,
+        retries=0,
+        ndjson=tmp_path / "items.ndjson",
+        stac_geoparquet=tmp_path / "items.parquet",
+    )
+    assert len(failures) == 1
+    items = list(export.read_ndjson(tmp_path / "items.ndjson"))
+    assert [item["id"] for item in items] == ["DC"]
+    assert items[0]["collection"] == "fws-nwi"
+    table = pyarrow.parquet.read_table(tmp_path / "items.parquet")
+    assert table.column("id").to_pylist() == ["DC"]
+    assert not list(tmp_path.glob(".*.ndjson"))
@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import pytest
+
+from stactools.fws_nwi import cache as cache_module
+from stactools.fws_nwi import flatgeobuf, geoparquet, scanner, stac
+from stactools.fws_nwi.cache import Cache
+
+
+def test_cache_hit(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = Cache(tmp_path / "cache")
+    first = tmp_path / "first"
+    first.mkdir()
+    metadata, geoparquets = cache.scan_zipfile(dc_zipfile, first)
+
+    def fail(*args: object, **kwargs: object) -> None:
+        raise AssertionError("the zipfile should not be scanned again")
+
+    monkeypatch.setattr(scanner, "scan_zipfile", fail)
+    second = tmp_path / "second"
+    second.mkdir()
+    cached_metadata, cached_geoparquets = cache.scan_zipfile(dc_zipfile, second)
+    assert cached_metadata.geometry.equals(metadata.geometry)
+    assert cached_metadata.pdfs == metadata.pdfs
+    assert [g.path.parent for g in cached_geoparquets] == [second] * 4
+    assert all(g.path.exists() for g in cached_geoparquets)
+    assert [
+        g.columns for g in cached_geoparquets if isinstance(g, geoparquet.Metadata)
+    ] == [g.columns for g in geoparquets if isinstance(g, geoparquet.Metadata)]
+
+
+def test_cache_entries_survive_other_options(dc_zipfile: Path, tmp_path: Path) -> None:
+    cache = Cache(tmp_path / "cache")
+    directory = tmp_path / "output"
+    directory.mkdir()
+    stac.create_item(dc_zipfile, directory, cache=cache)
+    stac.create_item(dc_zipfile, directory, cache=cache)
+    [entry] = cache.directory.glob("*/DC_Wetlands.geoparquet")
+    contents = entry.read_bytes()
+
+    item = stac.create_item(
+        dc_zipfile,
+        directory,
+        cache=cache,
+        geoparquet_options=geoparquet.Options(spatial_sort=True),
+    )
+    assert "bbox" in [
+        c["name"] for c in item.assets["DC_Wetlands"].extra_fields["table:columns"]
+    ]
+    assert entry.read_bytes() == contents
+    item = stac.create_item(dc_zipfile, directory, cache=cache)
+    assert (directory / "DC_Wetlands.geoparquet").read_bytes() == contents
+    assert "bbox" not in [
+        c["name"] for c in item.assets["DC_Wetlands"].extra_fields["table:columns"]
+    ]
+
+
+def test_cache_hit_with_partitioned_geoparquet(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    cache = Cache(tmp_path / "cache")
+    options = geoparquet.Options(partition_by=(geoparquet.WETLAND_TYPE,))
+    for name in ["first", "second"]:
+        (tmp_path / name).mkdir()
+        _, geoparquets = cache.scan_zipfile(
+            dc_zipfile, tmp_path / name, geoparquet_options=options
+        )
+    wetlands = next(g for g in geoparquets if g.key == "DC_Wetlands")
+    assert wetlands.path == tmp_path / "second" / "DC_Wetlands.geoparquet"
+    assert len(list(wetlands.path.rglob("*.parquet"))) == len(
+        list((tmp_path / "first" / "DC_Wetlands.geoparquet").rglob("*.parquet"))
+    )
+
+
+def test_cache_hit_with_flatgeobuf(dc_zipfile: Path, tmp_path: Path) -> None:
+    cache = Cache(tmp_path / "cache")
+    for name in ["first", "second"]:
+        (tmp_path / name).mkdir()
+        _, outputs = cache.scan_zipfile(
+            dc_zipfile, flatgeobuf_directory=tmp_path / name
+        )
+    assert all(isinstance(o, flatgeobuf.Metadata) for o in outputs)
+    assert [o.path.parent for o in outputs] == [tmp_path / "second"] * 4
+    assert all(o.path.exists() for o in outputs)
+    assert cache.key(dc_zipfile, False) != cache.key(
+        dc_zipfile, False, create_flatgeobuf=True
+    )
+    assert cache.key(dc_zipfile, False) != cache.key(
+        dc_zipfile, False, fast_footprint=True
+    )
+
+
+def test_cache_miss_on_changed_contents(dc_zipfile: Path, tmp_path: Path) -> None:
+    cache = Cache(tmp_path / "cache")
+    path = tmp_path / dc_zipfile.name
+    path.write_bytes(dc_zipfile.read_bytes())
+    key = cache.key(path, False)
+    assert cache.key(path, False) == key
+    assert cache.key(path, True) != key
+    assert cache.key(path, True, geoparquet.Options(spatial_sort=True)) != cache.key(
+        path, True
+    )
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    assert cache.key(path, False) != key
+
+
+def test_cache_eviction(dc_zipfile: Path, tmp_path: Path) -> None:
+    cache = Cache(tmp_path / "cache", max_size=0)
+    cache.scan_zipfile(dc_zipfile)
+    assert not any((tmp_path / "cache").glob("*/*/*/result.pickle"))
+
+
+def test_cache_version_invalidation(tmp_path: Path) -> None:
+    Cache(tmp_path / "cache")
+    stale = tmp_path / "cache" / cache_module.ROOT_NAME / "0.0.0"
+    stale.mkdir()
+    (stale / cache_module.MARKER_FILE_NAME).touch()
+    unmarked = tmp_path / "cache" / cache_module.ROOT_NAME / "not-a-version"
+    unmarked.mkdir()
+    unrelated = tmp_path / "cache" / "important_project"
+    unrelated.mkdir()
+    (unrelated / "data.txt").write_text("keep me")
+    cache = Cache(tmp_path / "cache")
+    assert not stale.exists()
+    assert unmarked.exists()
+    assert (unrelated / "data.txt").read_text() == "keep me"
+    assert cache.directory.exists()
+    assert cache.directory.parent.parent == tmp_path / "cache"
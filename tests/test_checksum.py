@@ -0,0 +1,20 @@
+import hashlib
+from pathlib import Path
+
+from stactools.fws_nwi import checksum
+
+
+def test_hashing_file(tmp_path: Path) -> None:
+    path = tmp_path / "data"
+    with checksum.HashingFile(open(path, "wb")) as f:
+        f.write(b"wetlands")
+        f.write(b" and deepwater habitats")
+        assert f.tell() == 31
+    assert f.closed
+    digest = f.digest()
+    assert digest == checksum.file(path)
+    assert digest.size == 31
+    assert digest.checksum == (
+        "1220" + hashlib.sha256(b"wetlands and deepwater habitats").hexdigest()
+    )
+    assert digest.fields() == {"file:size": 31, "file:checksum": digest.checksum}
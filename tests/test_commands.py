@@ -1,12 +1,17 @@
 import json
 import os.path
+import pathlib
+import shutil
 from tempfile import TemporaryDirectory
 from typing import Callable, List
 
+import geopandas
+import pyarrow.parquet
 from click import Command, Group
-from pystac import Item
+from pystac import Collection, Item
 from stactools.testing.cli_test import CliTestCase
 
+from stactools.fws_nwi import stac, validation
 from stactools.fws_nwi.commands import create_fwsnwi_command
 
 from . import test_data
@@ -57,3 +62,276 @@ class CommandsTest(CliTestCase):
             files = os.listdir(temporary_directory)
             geoparquets = [p for p in files if p.endswith(".geoparquet")]
             self.assertEqual(len(geoparquets), 4)
+
+    def test_create_item_with_worker_processes(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                "--create-geoparquet --workers 2 --processes"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            files = os.listdir(temporary_directory)
+            geoparquets = [p for p in files if p.endswith(".geoparquet")]
+            self.assertEqual(len(geoparquets), 4)
+
+    def test_create_item_with_compression(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                "--create-geoparquet --compression gzip:9 "
+                "--column-compression geometry=zstd --no-nwi-schema"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            item = Item.from_file(f"{temporary_directory}/item.json")
+            columns = item.assets["DC_Wetlands"].extra_fields["table:columns"]
+            self.assertEqual(columns[2], {"name": "ACRES", "type": "double"})
+            metadata = pyarrow.parquet.read_metadata(
+                f"{temporary_directory}/DC_Wetlands.geoparquet"
+            )
+            row_group = metadata.row_group(0)
+            self.assertEqual(row_group.column(0).compression, "GZIP")
+            self.assertEqual(row_group.column(5).compression, "ZSTD")
+
+    def test_create_item_with_bad_compression(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            for options, message in [
+                ("--compression bogus", "unsupported compression codec"),
+                ("--column-compression zstd", "COLUMN=CODEC"),
+            ]:
+                cmd = (
+                    f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                    f"--create-geoparquet {options}"
+                )
+                result = self.run_command(cmd)
+                self.assertEqual(result.exit_code, 2, msg="\n{}".format(result.output))
+                self.assertIn(message, result.output)
+                self.assertEqual(os.listdir(temporary_directory), [])
+
+    def test_create_item_with_flatgeobuf(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                "--create-flatgeobuf --batch-size 500"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            files = os.listdir(temporary_directory)
+            self.assertEqual(len([p for p in files if p.endswith(".fgb")]), 4)
+            self.assertEqual(len([p for p in files if p.endswith(".geoparquet")]), 0)
+            item = Item.from_file(f"{temporary_directory}/item.json")
+            self.assertEqual(
+                item.assets["DC_Wetlands_flatgeobuf"].media_type,
+                "application/vnd.flatgeobuf",
+            )
+
+    def test_create_item_with_fast_footprint(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                "--fast-footprint"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            item = Item.from_file(f"{temporary_directory}/item.json")
+            self.assertEqual(item.id, "DC")
+
+    def test_create_item_with_staging_options(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            staging = os.path.join(temporary_directory, "staging")
+            os.mkdir(staging)
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                f"--staging-directory {staging} --staging-memory-limit 0"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+            self.assertEqual(os.listdir(staging), [])
+            self.assertTrue(os.path.exists(f"{temporary_directory}/item.json"))
+
+            result = self.run_command(
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                "--staging-memory-limit -1"
+            )
+            self.assertEqual(result.exit_code, 2)
+
+    def test_create_item_with_checksums(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                "--create-geoparquet --checksums"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            item = Item.from_file(f"{temporary_directory}/item.json")
+            for asset in item.assets.values():
+                self.assertTrue(asset.extra_fields["file:checksum"].startswith("1220"))
+                self.assertGreater(asset.extra_fields["file:size"], 0)
+
+    def test_create_collection_from_directory(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as source, TemporaryDirectory() as destination:
+            shutil.copy(path, source)
+            cmd = (
+                f"fws-nwi create-collection-from-directory {source} "
+                f"{destination}/collection.json --workers 2"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            collection = Collection.from_file(f"{destination}/collection.json")
+            items = list(collection.get_items())
+            self.assertEqual([item.id for item in items], ["DC"])
+            self.assertTrue(os.path.exists(f"{destination}/DC/DC.json"))
+
+    def test_create_national_geoparquet(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as source, TemporaryDirectory() as destination:
+            shutil.copy(path, source)
+            shutil.copy(path, os.path.join(source, "MD_shapefile_wetlands.zip"))
+            collection = stac.create_collection()
+            collection.set_self_href(f"{destination}/collection.json")
+            collection.save_object(include_self_link=False)
+            cmd = (
+                f"fws-nwi create-national-geoparquet {source} {destination} "
+                f"--collection {destination}/collection.json "
+                "--make-asset-hrefs-relative"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            collection = Collection.from_file(f"{destination}/collection.json")
+            asset = collection.assets["US_Wetlands"]
+            self.assertEqual(asset.href, "./US_Wetlands.geoparquet")
+            dataframe = geopandas.read_parquet(f"{destination}/US_Wetlands.geoparquet")
+            self.assertEqual(len(dataframe), asset.extra_fields["table:row_count"])
+            dc = geopandas.read_parquet(
+                stac.create_geoparquet_assets_from_zipfile(
+                    pathlib.Path(path), pathlib.Path(source)
+                )["DC_Wetlands"].href
+            )
+            self.assertEqual(len(dataframe), len(dc))
+
+    def test_diff(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            item = stac.create_item(pathlib.Path(path))
+            item.set_self_href(f"{temporary_directory}/item.json")
+            item.save_object(include_self_link=False)
+            cmd = (
+                f"fws-nwi diff {path} {path} {temporary_directory}/delta "
+                f"--item {temporary_directory}/item.json --make-asset-hrefs-relative"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            item = Item.from_file(f"{temporary_directory}/item.json")
+            self.assertEqual(item.properties["delta:unchanged"], 1556)
+            self.assertEqual(item.properties["delta:added"], 0)
+            self.assertEqual(
+                item.assets["DC_Wetlands_added"].href,
+                "./delta/DC_Wetlands_added.geoparquet",
+            )
+
+    def test_worker(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as spool, TemporaryDirectory() as destination:
+            with open(os.path.join(spool, "DC.job"), "w") as f:
+                json.dump({"href": path}, f)
+            cmd = f"fws-nwi worker {spool} {destination} --workers 1 --once"
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            item = Item.from_file(f"{destination}/DC/DC.json")
+            self.assertEqual(item.id, "DC")
+            self.assertTrue(os.path.exists(f"{spool}/done/DC.job"))
+
+    def test_validate(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as source, TemporaryDirectory() as destination:
+            shutil.copy(path, source)
+            schemas = pathlib.Path(destination, "schemas")
+            # Stand-ins for the extension schemas, which can't be downloaded
+            # in tests.
+            item = stac.create_item(pathlib.Path(path))
+            for stac_object in [item, stac.create_collection()]:
+                for uri in validation.schema_uris(stac_object.to_dict())[1:]:
+                    schema = validation.schema_path(schemas, uri)
+                    schema.parent.mkdir(parents=True, exist_ok=True)
+                    schema.write_text('{"type": "object"}')
+            cmd = (
+                f"fws-nwi create-collection-from-directory {source} "
+                f"{destination}/collection.json --workers 1 "
+                f"--validate --schema-directory {schemas}"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            cmd = (
+                f"fws-nwi validate {destination}/collection.json "
+                f"--schema-directory {schemas} --workers 2"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            item_path = f"{destination}/DC/DC.json"
+            with open(item_path) as f:
+                item_dict = json.load(f)
+            item_dict["bbox"] = "everywhere"
+            with open(item_path, "w") as f:
+                json.dump(item_dict, f)
+            result = self.run_command(
+                f"fws-nwi validate {item_path} --schema-directory {schemas}"
+            )
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("DC.json", result.output)
+
+    def test_geoparquet_options(self) -> None:
+        for command in [
+            "create-item",
+            "create-collection-from-directory",
+            "create-national-geoparquet",
+            "diff",
+            "worker",
+        ]:
+            result = self.run_command(f"fws-nwi {command} --help")
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+            for option in [
+                "--spatial-sort",
+                "--row-group-size",
+                "--nwi-schema",
+                "--compression",
+                "--column-compression",
+                "--partition-by",
+            ]:
+                self.assertIn(option, result.output, msg=command)
+
+    def test_create_item_with_profile(self) -> None:
+        path = test_data.get_path("data-files/DC_shapefile_wetlands.zip")
+        with TemporaryDirectory() as temporary_directory:
+            cmd = (
+                f"fws-nwi create-item {path} {temporary_directory}/item.json "
+                f"--create-geoparquet --profile {temporary_directory}/profile.json"
+            )
+            result = self.run_command(cmd)
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            with open(f"{temporary_directory}/profile.json") as f:
+                report = json.load(f)
+            self.assertGreater(report["seconds"], 0)
+            self.assertGreater(report["peak_rss"], 0)
+            names = {stage["name"] for stage in report["stages"]}
+            self.assertTrue({"extract", "headers", "read", "write"} <= names)
@@ -0,0 +1,120 @@
+from pathlib import Path
+from zipfile import ZipFile
+
+import geopandas
+import pandas
+import pytest
+from pystac import Item
+
+from stactools.fws_nwi import diff, geoparquet, stac
+
+WETLANDS = "DC_shapefile_wetlands/DC_Wetlands"
+
+
+@pytest.fixture
+def dc_next_release(dc_zipfile: Path, tmp_path: Path) -> Path:
+    """The DC zipfile with 10 wetlands removed, 5 reclassified and 3 added.
+
+    Rewriting the shapefile also drops the last digit of 3 tiny ``ACRES``,
+    so 8 wetlands are modified in all.
+    """
+    work = tmp_path / "work"
+    with ZipFile(dc_zipfile) as zipfile:
+        zipfile.extractall(work)
+    dataframe = geopandas.read_file(work / f"{WETLANDS}.shp")
+    dataframe.loc[0:4, "ATTRIBUTE"] = "PUBHx"
+    dataframe = dataframe.drop(index=range(10, 20))
+    added = dataframe.iloc[20:23].copy()
+    added["geometry"] = added.geometry.translate(10, 10)
+    pandas.concat([dataframe, added]).to_file(work / f"{WETLANDS}.shp")
+    path = tmp_path / "next" / dc_zipfile.name
+    path.parent.mkdir()
+    with ZipFile(path, "w") as zipfile:
+        for file in sorted(work.rglob("*")):
+            if file.is_file():
+                zipfile.write(file, file.relative_to(work).as_posix())
+    return path
+
+
+@pytest.mark.parametrize("buckets", [1, 16])
+def test_compare(
+    dc_zipfile: Path, dc_next_release: Path, tmp_path: Path, buckets: int
+) -> None:
+    changes = diff.compare(
+        dc_zipfile, dc_next_release, tmp_path / "delta", buckets=buckets, batch_size=500
+    )
+    assert changes.counts == {
+        "added": 3,
+        "removed": 10,
+        "modified": 8,
+        "unchanged": 1538,
+    }
+    assert changes.added.path == tmp_path / "delta" / "DC_Wetlands_added.geoparquet"
+    assert changes.added.role == "wetlands"
+    assert [p.name for p in (tmp_path / "delta").iterdir() if p.name[0] == "."] == []
+
+    modified = geopandas.read_parquet(changes.modified.path)
+    assert (modified["ATTRIBUTE"] == "PUBHx").sum() == 5
+    removed = geopandas.read_parquet(changes.removed.path)
+    assert "PUBHx" not in set(removed["ATTRIBUTE"])
+    assert len(geopandas.read_parquet(changes.added.path)) == 3
+
+
+def test_compare_unchanged(dc_zipfile: Path, tmp_path: Path) -> None:
+    changes = diff.compare(dc_zipfile, dc_zipfile, tmp_path)
+    assert changes.counts == {
+        "added": 0,
+        "removed": 0,
+        "modified": 0,
+        "unchanged": 1556,
+    }
+    assert len(geopandas.read_parquet(changes.added.path)) == 0
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        geoparquet.Options(),
+        geoparquet.Options(
+            spatial_sort=True, partition_by=("tile", "WETLAND_TY"), nwi_schema=False
+        ),
+    ],
+)
+def test_compare_with_geoparquet(
+    dc_zipfile: Path,
+    dc_next_release: Path,
+    tmp_path: Path,
+    options: geoparquet.Options,
+) -> None:
+    (tmp_path / "old").mkdir()
+    old = stac.create_geoparquet_assets_from_zipfile(
+        dc_zipfile, tmp_path / "old", batch_size=500, options=options
+    )["DC_Wetlands"]
+    changes = diff.compare(Path(old.href), dc_next_release, tmp_path / "delta")
+    assert changes.counts == {
+        "added": 3,
+        "removed": 10,
+        "modified": 8,
+        "unchanged": 1538,
+    }
+
+
+def test_compare_without_layers(dc_zipfile: Path, tmp_path: Path) -> None:
+    with pytest.raises(Exception, match="no riparian layers"):
+        diff.compare(dc_zipfile, dc_zipfile, tmp_path, role="riparian")
+
+
+def test_add_to_item(dc_zipfile: Path, dc_next_release: Path, tmp_path: Path) -> None:
+    item = stac.create_item(dc_next_release)
+    item.set_self_href(str(tmp_path / "item.json"))
+    changes = diff.compare(dc_zipfile, dc_next_release, tmp_path / "delta")
+    diff.add_to_item(item, changes, make_asset_hrefs_relative=True)
+    assert item.properties["delta:added"] == 3
+    assert item.properties["delta:removed"] == 10
+    assert item.properties["delta:modified"] == 8
+    assert item.properties["delta:unchanged"] == 1538
+    asset = item.assets["DC_Wetlands_removed"]
+    assert asset.href == "./delta/DC_Wetlands_removed.geoparquet"
+    assert asset.roles == ["data", "cloud-optimized", "wetlands", "delta"]
+    assert asset.extra_fields["table:row_count"] == 10
+    assert isinstance(Item.from_dict(item.to_dict()), Item)
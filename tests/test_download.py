@@ -0,0 +1,163 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import pytest
+
+from stactools.fws_nwi import download
+
+CONTENT = bytes(range(256)) * 4096  # 1 MiB
+
+
+def etag(content: bytes) -> str:
+    return f'"{hash(content)}"'
+
+
+class Server(ThreadingHTTPServer):
+    files: Dict[str, bytes]
+    requests: List[Dict[str, str]]
+    drop_after: Dict[str, int]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: Server
+
+    def do_GET(self) -> None:
+        self.server.requests.append(dict(self.headers))
+        name = self.path.split("/")[-1]
+        if name not in self.server.files:
+            self.send_error(404)
+            return
+        content = self.server.files[name]
+        if self.headers.get("If-None-Match") == etag(content):
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == etag(content):
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag(content))
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        drop_after = self.server.drop_after.pop(name, None)
+        if drop_after is not None:
+            self.wfile.write(content[start:drop_after])
+            self.wfile.flush()
+            self.connection.close()
+        else:
+            self.wfile.write(content[start:])
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[Server]:
+    server = Server(("127.0.0.1", 0), Handler)
+    server.files = {"DC_shapefile_wetlands.zip": CONTENT}
+    server.requests = []
+    server.drop_after = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def base_url(server: Server) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host!s}:{port}"
+
+
+def test_download_skips_unchanged_files(server: Server, tmp_path: Path) -> None:
+    [first] = download.download_all(["DC"], tmp_path, base_url=base_url(server))
+    assert first.status == download.DOWNLOADED
+    assert first.path.read_bytes() == CONTENT
+
+    [second] = download.download_all(["DC"], tmp_path, base_url=base_url(server))
+    assert second.status == download.UNCHANGED
+    assert "If-None-Match" in server.requests[-1]
+
+
+def test_download_removes_a_part_file_of_an_unchanged_file(
+    server: Server, tmp_path: Path
+) -> None:
+    download.download_all(["DC"], tmp_path, base_url=base_url(server))
+    (tmp_path / "DC_shapefile_wetlands.zip.part").write_bytes(CONTENT[:1000])
+    (tmp_path / "DC_shapefile_wetlands.zip.part.json").write_text(
+        json.dumps({"etag": etag(CONTENT)})
+    )
+    [result] = download.download_all(["DC"], tmp_path, base_url=base_url(server))
+    assert result.status == download.UNCHANGED
+    assert result.path.read_bytes() == CONTENT
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "DC_shapefile_wetlands.zip",
+        "DC_shapefile_wetlands.zip.json",
+    ]
+
+
+def test_download_resumes_after_a_dropped_connection(
+    server: Server, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("stactools.fws_nwi.download.time.sleep", lambda _: None)
+    server.drop_after["DC_shapefile_wetlands.zip"] = 300_000
+    [result] = download.download_all(
+        ["DC"], tmp_path, base_url=base_url(server), chunk_size=65536
+    )
+    assert result.status == download.RESUMED
+    assert result.path.read_bytes() == CONTENT
+    # Only whole chunks make it to disk before the connection drops
+    assert server.requests[-1]["Range"] == "bytes=262144-"
+
+
+def test_download_several_at_once(server: Server, tmp_path: Path) -> None:
+    server.files["RI_shapefile_wetlands.zip"] = b"RI"
+    downloads = download.download_all(
+        ["DC", "RI"], tmp_path, base_url=base_url(server), workers=2
+    )
+    assert [d.path.name for d in downloads] == [
+        "DC_shapefile_wetlands.zip",
+        "RI_shapefile_wetlands.zip",
+    ]
+    assert (tmp_path / "RI_shapefile_wetlands.zip").read_bytes() == b"RI"
+
+
+def test_download_keeps_a_complete_part_file(server: Server, tmp_path: Path) -> None:
+    (tmp_path / "DC_shapefile_wetlands.zip.part").write_bytes(CONTENT)
+    (tmp_path / "DC_shapefile_wetlands.zip.part.json").write_text(
+        json.dumps({"etag": etag(CONTENT)})
+    )
+    [result] = download.download_all(["DC"], tmp_path, base_url=base_url(server))
+    assert result.status == download.RESUMED
+    assert result.path.read_bytes() == CONTENT
+    assert len(server.requests) == 1
+    assert json.loads((tmp_path / "DC_shapefile_wetlands.zip.json").read_text()) == {
+        "etag": etag(CONTENT)
+    }
+
+
+def test_download_restarts_a_part_file_that_is_too_long(
+    server: Server, tmp_path: Path
+) -> None:
+    (tmp_path / "DC_shapefile_wetlands.zip.part").write_bytes(CONTENT + b"extra")
+    (tmp_path / "DC_shapefile_wetlands.zip.part.json").write_text(
+        json.dumps({"etag": etag(CONTENT)})
+    )
+    [result] = download.download_all(["DC"], tmp_path, base_url=base_url(server))
+    assert result.status == download.DOWNLOADED
+    assert result.path.read_bytes() == CONTENT
+    assert "Range" not in server.requests[-1]
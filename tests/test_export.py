@@ -0,0 +1,104 @@
+import json
+from pathlib import Path
+from typing import List
+
+import pyarrow
+import pyarrow.parquet
+import pytest
+import shapely
+from pystac import Item
+
+from stactools.fws_nwi import export, stac
+
+
+@pytest.fixture
+def items(dc_zipfile: Path, tmp_path: Path) -> List[Item]:
+    item = stac.create_item(dc_zipfile, tmp_path)
+    other = item.clone()
+    other.id = "MD"
+    other.properties["fws_nwi:state_code"] = "MD"
+    del other.assets["DC_Wetlands"]
+    return [item, other]
+
+
+def test_ndjson(items: List[Item], tmp_path: Path) -> None:
+    path = tmp_path / "items.ndjson"
+    with export.Exporter(ndjson=path, collection="fws-nwi") as exporter:
+        exporter.add(items[0])
+        # Each item is written as soon as it is added.
+        assert len(path.read_text().splitlines()) == 1
+        exporter.add(items[1])
+    assert exporter.count == 2
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["DC", "MD"]
+    for line in lines:
+        item = Item.from_dict(json.loads(line))
+        assert item.collection_id == "fws-nwi"
+        assert item.get_self_href() is None
+
+
+def test_stac_geoparquet(items: List[Item], tmp_path: Path) -> None:
+    path = tmp_path / "items.parquet"
+    with export.Exporter(stac_geoparquet=path) as exporter:
+        for item in items:
+            exporter.add(item)
+        assert not path.exists()
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+    table = pyarrow.parquet.read_table(path)
+    assert table.num_rows == 2
+    assert table.column_names[:6] == [
+        "type",
+        "stac_version",
+        "stac_extensions",
+        "id",
+        "geometry",
+        "bbox",
+    ]
+    assert table.column("id").to_pylist() == ["DC", "MD"]
+    assert table.column("fws_nwi:state_code").to_pylist() == ["DC", "MD"]
+    assert pyarrow.types.is_timestamp(table.schema.field("datetime").type)
+    assets = table.column("assets").to_pylist()
+    assert assets[0]["DC_Wetlands"]["table:row_count"] == 1556
+    assert assets[1]["DC_Wetlands"] is None
+    geometry = shapely.from_wkb(table.column("geometry")[0].as_py())
+    assert geometry.equals(shapely.geometry.shape(items[0].geometry))
+
+    geo = json.loads(table.schema.metadata[b"geo"])
+    assert geo["version"] == "1.1.0"
+    assert geo["columns"]["geometry"]["covering"]["bbox"]["xmin"] == ["bbox", "xmin"]
+    assert geo["columns"]["geometry"]["bbox"] == pytest.approx(items[0].bbox)
+
+
+def test_ndjson_and_stac_geoparquet(items: List[Item], tmp_path: Path) -> None:
+    with export.Exporter(tmp_path / "items.ndjson", tmp_path / "items.parquet") as e:
+        for item in items:
+            e.add(item)
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix != ".geoparquet") == [
+        "items.ndjson",
+        "items.parquet",
+    ]
+    rows = pyarrow.parquet.read_table(tmp_path / "items.parquet").to_pylist()
+    assert [row["id"] for row in rows] == [
+        item["id"] for item in export.read_ndjson(tmp_path / "items.ndjson")
+    ]
+
+
+@pytest.mark.parametrize("batch_size", [1, 1000])
+def test_stac_geoparquet_keeps_later_properties(
+    items: List[Item], tmp_path: Path, batch_size: int
+) -> None:
+    items[1].properties["delta:added"] = 3
+    with export.Exporter(ndjson=tmp_path / "items.ndjson") as exporter:
+        for item in items:
+            exporter.add(item)
+    count = export.write_stac_geoparquet(
+        tmp_path / "items.ndjson", tmp_path / "items.parquet", batch_size=batch_size
+    )
+    assert count == 2
+
+    table = pyarrow.parquet.read_table(tmp_path / "items.parquet")
+    assert table.column("delta:added").to_pylist() == [None, 3]
+    assets = table.column("assets").to_pylist()
+    assert assets[0]["DC_Wetlands"]["table:row_count"] == 1556
+    assert assets[1]["DC_Wetlands"] is None
@@ -0,0 +1,90 @@
+import sys
+import threading
+from pathlib import Path
+
+import geopandas
+import pyogrio
+import pytest
+import shapely
+
+from stactools.fws_nwi import flatgeobuf, scanner, staging
+
+# A small area in the middle of the District of Columbia, in EPSG:5070.
+VIEWPORT = (1620000.0, 1920000.0, 1622000.0, 1922000.0)
+
+
+def write_wetlands(dc_zipfile: Path, directory: Path, batch_size: int) -> Path:
+    with staging.extract(dc_zipfile) as extracted:
+        header = next(
+            h
+            for h in scanner.read_headers(dc_zipfile, extracted)
+            if h.name.endswith("DC_Wetlands.shp")
+        )
+        writer = flatgeobuf.Writer(header.name, directory, header.crs)
+        for table in scanner.read_batches(header.href, batch_size):
+            writer.write(table)
+        metadata = writer.close()
+    assert metadata.key == "DC_Wetlands_flatgeobuf"
+    assert metadata.role == "wetlands"
+    assert metadata.row_count == 1556
+    return metadata.path
+
+
+@pytest.mark.parametrize("batch_size", [100, 65536])
+def test_writer(dc_zipfile: Path, tmp_path: Path, batch_size: int) -> None:
+    path = write_wetlands(dc_zipfile, tmp_path, batch_size)
+    assert path == tmp_path / "DC_Wetlands.fgb"
+    info = pyogrio.read_info(path)
+    assert info["features"] == 1556
+    assert info["crs"] == "EPSG:5070"
+    assert info["capabilities"]["fast_spatial_filter"]
+    expected = geopandas.read_file(f"zip://{dc_zipfile}!DC_shapefile_wetlands")
+    dataframe = geopandas.read_file(path)
+    assert sorted(dataframe["ACRES"]) == pytest.approx(sorted(expected["ACRES"]))
+
+
+def test_viewport_query(dc_zipfile: Path, tmp_path: Path) -> None:
+    path = write_wetlands(dc_zipfile, tmp_path, 500)
+    everything = geopandas.read_file(path)
+    expected = everything[everything.intersects(shapely.box(*VIEWPORT))]
+    viewport = geopandas.read_file(path, bbox=VIEWPORT)
+    assert 0 < len(viewport) < len(everything) / 10
+    assert set(viewport["ACRES"]) >= set(expected["ACRES"])
+
+
+def test_writer_without_pyogrio(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setitem(sys.modules, "pyogrio.raw", None)
+    path = write_wetlands(dc_zipfile, tmp_path, 500)
+    assert pyogrio.read_info(path)["features"] == 1556
+
+
+def test_writer_error(dc_zipfile: Path, tmp_path: Path) -> None:
+    writer = flatgeobuf.Writer("DC_Wetlands.shp", tmp_path / "missing", "EPSG:5070")
+    with staging.extract(dc_zipfile) as extracted:
+        href = str(extracted / "DC_shapefile_wetlands" / "DC_Wetlands.shp")
+        with pytest.raises(Exception):
+            for table in scanner.read_batches(href, 100):
+                writer.write(table)
+            writer.close()
+
+
+@pytest.mark.parametrize("pyogrio_raw", [True, False])
+def test_writer_abort(
+    dc_zipfile: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    pyogrio_raw: bool,
+) -> None:
+    if not pyogrio_raw:
+        monkeypatch.setitem(sys.modules, "pyogrio.raw", None)
+    writer = flatgeobuf.Writer("DC_Wetlands.shp", tmp_path, "EPSG:5070")
+    with staging.extract(dc_zipfile) as extracted:
+        href = str(extracted / "DC_shapefile_wetlands" / "DC_Wetlands.shp")
+        for table in scanner.read_batches(href, 100):
+            writer.write(table)
+            break
+    writer.abort()
+    assert not [t for t in threading.enumerate() if t.name.startswith("flatgeobuf")]
+    assert not list(tmp_path.iterdir())
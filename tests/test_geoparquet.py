@@ -1,8 +1,327 @@
+import json
 from pathlib import Path
+from typing import List, Optional
 
-from stactools.fws_nwi import geoparquet
+import geopandas
+import numpy
+import pyarrow.dataset
+import pyarrow.parquet
+import pytest
+
+from stactools.fws_nwi import checksum, geoparquet, scanner, staging
 
 
 def test_to_geoparquet(dc_zipfile: Path, tmp_path: Path) -> None:
     paths = geoparquet.from_zipfile(dc_zipfile, tmp_path)
     assert len(paths) == 4
+
+
+def test_to_geoparquet_in_batches(dc_zipfile: Path, tmp_path: Path) -> None:
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path, batch_size=100)
+    assert len(metadatas) == 4
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    assert wetlands.row_count == 1556
+    assert pyarrow.parquet.ParquetFile(wetlands.path).num_row_groups == 16
+    dataframe = geopandas.read_parquet(wetlands.path)
+    assert len(dataframe) == 1556
+    assert dataframe.crs.to_epsg() == 5070
+    assert [c["name"] for c in wetlands.columns] == list(dataframe.columns)
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_to_geoparquet_concurrently(
+    dc_zipfile: Path, tmp_path: Path, processes: bool
+) -> None:
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "concurrent").mkdir()
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path / "serial")
+    concurrent_metadatas = geoparquet.from_zipfile(
+        dc_zipfile, tmp_path / "concurrent", workers=4, processes=processes
+    )
+    assert [m.key for m in concurrent_metadatas] == [m.key for m in metadatas]
+    assert [m.columns for m in concurrent_metadatas] == [m.columns for m in metadatas]
+
+
+def test_columns_from_writer_metadata(dc_zipfile: Path, tmp_path: Path) -> None:
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path)
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    assert wetlands.columns == geoparquet.columns(
+        pyarrow.parquet.read_metadata(wetlands.path).schema
+    )
+    assert [(c["name"], c["type"]) for c in wetlands.columns] == [
+        ("ATTRIBUTE", "byte_array"),
+        ("WETLAND_TY", "byte_array"),
+        ("ACRES", "double"),
+        ("Shape_Leng", "double"),
+        ("Shape_Area", "double"),
+        ("geometry", "byte_array"),
+    ]
+    assert [c["name"] for c in wetlands.columns if c.get("categorical")] == [
+        "ATTRIBUTE",
+        "WETLAND_TY",
+    ]
+    assert wetlands.row_count == 1556
+    assert wetlands.primary_geometry == "geometry"
+
+
+@pytest.mark.parametrize("batch_size", [None, 100])
+def test_nwi_schema(
+    dc_zipfile: Path, tmp_path: Path, batch_size: Optional[int]
+) -> None:
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path, batch_size=batch_size)
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    dataframe = geopandas.read_parquet(wetlands.path)
+    assert dataframe["WETLAND_TY"].dtype == "category"
+    assert dataframe["ACRES"].dtype == "float64"
+    assert sorted(dataframe["WETLAND_TY"].cat.categories) == [
+        "Freshwater Emergent Wetland",
+        "Freshwater Forested/Shrub Wetland",
+        "Freshwater Pond",
+        "Lake",
+        "Riverine",
+    ]
+    project = next(m for m in metadatas if m.key == "DC_Wetlands_Project_Metadata")
+    types = {c["name"]: c["type"] for c in project.columns}
+    assert types["IMAGE_YR"] == "int32"
+    assert types["IMAGE_SCAL"] == "int64"
+    assert not next(c for c in project.columns if c["name"] == "COMMENTS").get(
+        "categorical"
+    )
+    assert geopandas.read_parquet(project.path)["IMAGE_YR"].max() == 2013
+
+
+def test_conform_leaves_other_types() -> None:
+    table = pyarrow.table(
+        {
+            "ATTRIBUTE": ["PFO1A", "PFO1A"],
+            "IMAGE_DATE": pyarrow.array([0, 1], pyarrow.date32()),
+            "IMAGE_YR": ["2013", "unknown"],
+            "ACRES": [123456789.123, 0.5],
+            "COMMENTS": ["one", "two"],
+        }
+    )
+    conformed = geoparquet.conform(table)
+    assert conformed.schema.field("ATTRIBUTE").type == geoparquet.CATEGORY
+    for name in ["IMAGE_DATE", "IMAGE_YR", "ACRES", "COMMENTS"]:
+        assert conformed.column(name).equals(table.column(name))
+
+
+def test_without_nwi_schema(dc_zipfile: Path, tmp_path: Path) -> None:
+    options = geoparquet.Options(nwi_schema=False)
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path, options=options)
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    assert {c["name"]: c["type"] for c in wetlands.columns}["ACRES"] == "double"
+    assert not any(c.get("categorical") for c in wetlands.columns)
+
+
+def test_compression(dc_zipfile: Path, tmp_path: Path) -> None:
+    options = geoparquet.Options(
+        compression=geoparquet.Compression("gzip", 9),
+        column_compression=(("geometry", geoparquet.Compression("zstd", 3)),),
+    )
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path, options=options)
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    row_group = pyarrow.parquet.read_metadata(wetlands.path).row_group(0)
+    codecs = {
+        row_group.column(i).path_in_schema: row_group.column(i).compression
+        for i in range(row_group.num_columns)
+    }
+    assert codecs == {
+        "ATTRIBUTE": "GZIP",
+        "WETLAND_TY": "GZIP",
+        "ACRES": "GZIP",
+        "Shape_Leng": "GZIP",
+        "Shape_Area": "GZIP",
+        "geometry": "ZSTD",
+    }
+
+
+def test_nwi_schema_makes_smaller_files(dc_zipfile: Path, tmp_path: Path) -> None:
+    sizes: List[int] = []
+    for options in [
+        geoparquet.Options(
+            nwi_schema=False, compression=geoparquet.Compression("snappy")
+        ),
+        geoparquet.Options(),
+    ]:
+        directory = tmp_path / str(len(sizes))
+        directory.mkdir()
+        metadatas = geoparquet.from_zipfile(dc_zipfile, directory, options=options)
+        sizes.append(sum(m.path.stat().st_size for m in metadatas))
+    assert sizes[1] < sizes[0]
+
+
+@pytest.mark.parametrize("batch_size", [None, 100])
+def test_spatially_sorted_geoparquet(
+    dc_zipfile: Path, tmp_path: Path, batch_size: Optional[int]
+) -> None:
+    options = geoparquet.Options(spatial_sort=True, row_group_size=200)
+    metadatas = geoparquet.from_zipfile(
+        dc_zipfile, tmp_path, batch_size=batch_size, options=options
+    )
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        m.path.name for m in metadatas
+    )
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    assert wetlands.sorting == "hilbert"
+    assert wetlands.covering == {
+        "bbox": {key: ["bbox", key] for key in ["xmin", "ymin", "xmax", "ymax"]}
+    }
+    assert wetlands.columns[-1]["name"] == "bbox"
+
+    parquet_file = pyarrow.parquet.ParquetFile(wetlands.path)
+    geo = json.loads(parquet_file.metadata.metadata[b"geo"])
+    assert geo["version"] == "1.1.0"
+    assert [
+        parquet_file.metadata.row_group(i).num_rows
+        for i in range(parquet_file.num_row_groups)
+    ] == [200] * 7 + [156]
+
+    table = parquet_file.read()
+    bounds = numpy.column_stack(
+        [table.column("bbox").combine_chunks().field(k).to_numpy() for k in range(4)]
+    )
+    keys = geoparquet.hilbert_keys(bounds, geo["columns"]["geometry"]["bbox"])
+    assert numpy.all(numpy.diff(keys.astype(numpy.int64)) >= 0)
+
+    dataframe = geopandas.read_parquet(wetlands.path)
+    assert len(dataframe) == 1556
+    assert dataframe.crs.to_epsg() == 5070
+
+
+def test_spatially_sorted_row_groups_can_be_skipped(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    options = geoparquet.Options(spatial_sort=True, row_group_size=100)
+    metadatas = geoparquet.from_zipfile(dc_zipfile, tmp_path, options=options)
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    metadata = pyarrow.parquet.read_metadata(wetlands.path)
+    names = [metadata.schema.column(i).path for i in range(metadata.num_columns)]
+    xmin, ymin, xmax, ymax = (
+        names.index(f"bbox.{key}") for key in ["xmin", "ymin", "xmax", "ymax"]
+    )
+    feature = geopandas.read_parquet(wetlands.path).geometry.iloc[0].bounds
+    matching = 0
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        if (
+            row_group.column(xmin).statistics.min <= feature[2]
+            and row_group.column(ymin).statistics.min <= feature[3]
+            and row_group.column(xmax).statistics.max >= feature[0]
+            and row_group.column(ymax).statistics.max >= feature[1]
+        ):
+            matching += 1
+    assert 1 <= matching <= metadata.num_row_groups // 4
+
+
+@pytest.mark.parametrize("batch_size", [None, 100])
+def test_partitioned_geoparquet(
+    dc_zipfile: Path, tmp_path: Path, batch_size: Optional[int]
+) -> None:
+    options = geoparquet.Options(
+        partition_by=(geoparquet.TILE, geoparquet.WETLAND_TYPE)
+    )
+    metadatas = geoparquet.from_zipfile(
+        dc_zipfile, tmp_path, batch_size=batch_size, options=options
+    )
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    assert wetlands.path.is_dir()
+    assert wetlands.partitioning == ["tile", "WETLAND_TY"]
+    assert wetlands.row_count == 1556
+    assert [c["name"] for c in wetlands.columns][-2:] == ["tile", "WETLAND_TY"]
+    assert all(m.path.is_file() for m in metadatas if m.key != "DC_Wetlands")
+
+    dataset = pyarrow.dataset.dataset(
+        wetlands.path, format="parquet", partitioning="hive"
+    )
+    assert dataset.schema.names == [c["name"] for c in wetlands.columns]
+    assert dataset.count_rows() == 1556
+    riverine = pyarrow.dataset.field("WETLAND_TY") == "Riverine"
+    fragments = list(dataset.get_fragments(filter=riverine))
+    assert 0 < len(fragments) < len(list(dataset.get_fragments()))
+    assert all("/WETLAND_TY=Riverine/" in fragment.path for fragment in fragments)
+    assert dataset.count_rows(filter=riverine) == sum(
+        fragment.count_rows() for fragment in fragments
+    )
+
+    dataframe = geopandas.read_parquet(wetlands.path)
+    assert len(dataframe) == 1556
+    assert set(dataframe["tile"]) <= {"-78_38", "-77_38", "-78_39", "-77_39"}
+
+
+def test_partitioned_geoparquet_files_are_replaced(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    options = geoparquet.Options(partition_by=(geoparquet.WETLAND_TYPE,))
+    geoparquet.from_zipfile(dc_zipfile, tmp_path, options=options)
+    stale = tmp_path / "DC_Wetlands.geoparquet" / "WETLAND_TY=Stale" / "part-0.parquet"
+    stale.parent.mkdir()
+    stale.touch()
+    geoparquet.from_zipfile(dc_zipfile, tmp_path, options=options)
+    assert not stale.exists()
+
+
+@pytest.mark.parametrize("spatial_sort", [False, True])
+def test_checksum(dc_zipfile: Path, tmp_path: Path, spatial_sort: bool) -> None:
+    metadatas = geoparquet.from_zipfile(
+        dc_zipfile,
+        tmp_path,
+        batch_size=100,
+        options=geoparquet.Options(checksum=True, spatial_sort=spatial_sort),
+    )
+    for metadata in metadatas:
+        digest = checksum.file(metadata.path)
+        assert metadata.size == digest.size
+        assert metadata.checksum == digest.checksum
+
+
+def test_no_checksum_for_partitioned_geoparquet(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    metadatas = geoparquet.from_zipfile(
+        dc_zipfile,
+        tmp_path,
+        options=geoparquet.Options(checksum=True, partition_by=(geoparquet.TILE,)),
+    )
+    wetlands = next(m for m in metadatas if m.key == "DC_Wetlands")
+    assert wetlands.path.is_dir()
+    assert wetlands.size is None and wetlands.checksum is None
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        geoparquet.Options(),
+        geoparquet.Options(checksum=True),
+        geoparquet.Options(spatial_sort=True),
+        geoparquet.Options(partition_by=(geoparquet.WETLAND_TYPE,)),
+    ],
+)
+def test_writer_abort(
+    dc_zipfile: Path, tmp_path: Path, options: geoparquet.Options
+) -> None:
+    (tmp_path / "output").mkdir()
+    writer = geoparquet.Writer(
+        "DC_Wetlands.shp", tmp_path / "output", "EPSG:5070", options=options
+    )
+    with staging.extract(dc_zipfile, tmp_path) as extracted:
+        href = str(extracted / "DC_shapefile_wetlands" / "DC_Wetlands.shp")
+        for index, table in enumerate(scanner.read_batches(href, 100)):
+            writer.write(table)
+            if index == 1:
+                break
+    writer.abort()
+    assert not list((tmp_path / "output").iterdir())
+
+
+def test_parse_compression() -> None:
+    assert geoparquet.parse_compression("ZSTD:9") == geoparquet.Compression("zstd", 9)
+    assert geoparquet.parse_compression("none") == geoparquet.Compression("none")
+    assert geoparquet.parse_column_compression("geometry=brotli") == (
+        "geometry",
+        geoparquet.Compression("brotli"),
+    )
+    with pytest.raises(ValueError, match="unsupported compression codec"):
+        geoparquet.parse_compression("bogus")
+    with pytest.raises(ValueError, match="COLUMN=CODEC"):
+        geoparquet.parse_column_compression("zstd")
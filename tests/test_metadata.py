@@ -1,7 +1,69 @@
 from pathlib import Path
 
-from stactools.fws_nwi.metadata import Metadata
+import pytest
+import shapely
+from pyproj import CRS
+
+from stactools.fws_nwi.metadata import Metadata, calculate_geometry, layer_footprint
+
+# How far a fast footprint may differ from the exact one, as a fraction of the
+# exact footprint's area.
+FAST_FOOTPRINT_TOLERANCE = 0.05
 
 
 def test_from_zipfile(dc_zipfile: Path) -> None:
     _ = Metadata.from_zipfile(dc_zipfile)
+
+
+def test_calculate_geometry(
+    dc_zipfile: Path, dc_zipfile_without_boundary: Path
+) -> None:
+    geometry, crs = calculate_geometry(dc_zipfile_without_boundary)
+    assert CRS(crs).to_epsg() == 5070
+    assert geometry.is_valid
+    # The footprint covers the DC boundary, give or take the simplification
+    boundary = Metadata.from_zipfile(dc_zipfile).geometry
+    assert geometry.buffer(0.01).contains(boundary)
+
+
+def test_calculate_geometry_in_parallel(dc_zipfile_without_boundary: Path) -> None:
+    geometry, _ = calculate_geometry(dc_zipfile_without_boundary)
+    parallel_geometry, _ = calculate_geometry(dc_zipfile_without_boundary, workers=2)
+    assert parallel_geometry.equals(geometry)
+
+
+def test_fast_footprint_within_tolerance(dc_zipfile_without_boundary: Path) -> None:
+    geometry, crs = calculate_geometry(dc_zipfile_without_boundary)
+    fast_geometry, fast_crs = calculate_geometry(dc_zipfile_without_boundary, fast=True)
+    assert fast_crs == crs
+    assert fast_geometry.is_valid
+    difference = fast_geometry.symmetric_difference(geometry).area
+    assert difference / geometry.area < FAST_FOOTPRINT_TOLERANCE
+
+
+def test_fast_footprint_without_index_layers(
+    dc_zipfile_without_index_layers: Path,
+) -> None:
+    geometry, _ = calculate_geometry(dc_zipfile_without_index_layers)
+    fast_geometry, _ = calculate_geometry(dc_zipfile_without_index_layers, fast=True)
+    # The header bbox is coarse, but never misses any wetlands, give or take
+    # the grid cell that the narrowest wetlands are widened by
+    assert fast_geometry.buffer(0.002).contains(geometry)
+    assert len(fast_geometry.exterior.coords) == 5
+
+
+def test_layer_footprint_repairs_invalid_geometries() -> None:
+    bowtie = shapely.Polygon([(0, 0), (2000, 2000), (2000, 0), (0, 2000)])
+    square = shapely.box(5000, 5000, 6000, 6000)
+    footprint = layer_footprint([bowtie, square, shapely.Point(0, 0)])
+    assert footprint.is_valid
+    assert footprint.area == pytest.approx(3_000_000, rel=0.01)
+
+
+def test_layer_footprint_keeps_small_isolated_polygons() -> None:
+    square = shapely.box(0, 0, 50_000, 50_000)
+    # Far smaller than the grid that footprint inputs are snapped to
+    pond = shapely.box(100_000, 0, 100_030, 30)
+    footprint = layer_footprint([square, pond])
+    assert len(footprint.geoms) == 2
+    assert footprint.contains(pond)
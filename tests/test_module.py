@@ -1,5 +1,60 @@
+import json
+import subprocess
+import sys
+
 import stactools.fws_nwi
 
+# Heavy libraries that only the commands doing geospatial work should load.
+HEAVY_MODULES = [
+    "fiona",
+    "geopandas",
+    "numpy",
+    "pandas",
+    "pyarrow",
+    "pyogrio",
+    "pyproj",
+    "shapely",
+    "stactools.core",
+]
+# A generous limit on the time to set up the command line, which takes a
+# small fraction of this when the heavy libraries are not loaded.
+STARTUP_SECONDS = 1.0
+
+STARTUP_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import click
+
+import stactools.fws_nwi
+from stactools.fws_nwi.commands import create_fwsnwi_command
+
+cli = click.Group()
+create_fwsnwi_command(cli)
+for args in [["fws-nwi", "--help"], ["fws-nwi", "download", "--help"]]:
+    try:
+        cli.main(args, standalone_mode=False)
+    except SystemExit:
+        pass
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
 
 def test_version() -> None:
     assert stactools.fws_nwi.__version__ is not None
+
+
+def test_command_line_startup() -> None:
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    startup = json.loads(result.stdout.splitlines()[-1])
+    loaded = set(startup["modules"])
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+    assert startup["seconds"] < STARTUP_SECONDS
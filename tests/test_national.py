@@ -0,0 +1,165 @@
+from pathlib import Path
+from typing import Any, List
+
+import geopandas
+import pyarrow
+import pytest
+from pystac import Collection
+
+from stactools.fws_nwi import geoparquet, national, stac, staging
+
+from .synthetic import create_zipfile
+
+
+@pytest.fixture
+def zipfiles(tmp_path: Path) -> List[Path]:
+    """Two states that share all of their wetlands, and one that shares none."""
+    paths = []
+    for code, seed in [("DC", 0), ("MD", 0), ("VA", 1)]:
+        directory = tmp_path / code
+        directory.mkdir()
+        paths.append(create_zipfile(directory, code, features=200, seed=seed))
+    return paths
+
+
+@pytest.mark.parametrize("buckets", [1, 16])
+def test_merge(zipfiles: List[Path], tmp_path: Path, buckets: int) -> None:
+    merge = national.merge(zipfiles, tmp_path, buckets=buckets, batch_size=64)
+    assert merge.rows == 600
+    assert merge.duplicates == 200
+    assert merge.metadata.key == national.NAME
+    assert merge.metadata.role == "wetlands"
+    assert merge.metadata.row_count == 400
+    assert merge.metadata.path == tmp_path / f"{national.NAME}.geoparquet"
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+    dataframe = geopandas.read_parquet(merge.metadata.path)
+    assert len(dataframe) == 400
+    assert dataframe.crs.to_epsg() == 4326
+    xmin, ymin, xmax, ymax = dataframe.total_bounds
+    assert -78 < xmin < xmax < -76 and 38 < ymin < ymax < 40
+    acres = [
+        geopandas.read_file(f"zip://{path}!{path.stem}/{code}_Wetlands.shp")["ACRES"]
+        for path, code in zip(zipfiles, ["DC", "MD", "VA"])
+    ]
+    assert dataframe["ACRES"].sum() == pytest.approx(acres[0].sum() + acres[2].sum())
+
+
+def test_merge_keeps_the_first_copy(zipfiles: List[Path], tmp_path: Path) -> None:
+    first = national.merge(zipfiles[:1], tmp_path / "first")
+    both = national.merge(zipfiles[:2], tmp_path / "both")
+    assert both.duplicates == 200
+    assert sorted(geopandas.read_parquet(both.metadata.path)["ACRES"]) == sorted(
+        geopandas.read_parquet(first.metadata.path)["ACRES"]
+    )
+
+
+def test_merge_with_options(zipfiles: List[Path], tmp_path: Path) -> None:
+    merge = national.merge(
+        zipfiles,
+        tmp_path,
+        options=geoparquet.Options(spatial_sort=True, partition_by=(geoparquet.TILE,)),
+    )
+    assert merge.metadata.row_count == 400
+    assert merge.metadata.sorting == geoparquet.HILBERT
+    assert merge.metadata.partitioning == [geoparquet.TILE]
+    assert geopandas.read_parquet(merge.metadata.path).shape[0] == 400
+
+
+def test_merge_extracts_only_the_role(
+    zipfiles: List[Path], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    extract = staging.extract
+    extracted = []
+
+    def recording_extract(path: Path, *args: Any, **kwargs: Any) -> Any:
+        extracted.append(kwargs.get("layers"))
+        return extract(path, *args, **kwargs)
+
+    monkeypatch.setattr(staging, "extract", recording_extract)
+    national.merge(zipfiles[:1], tmp_path, role="riparian")
+    assert extracted == [["DC_shapefile_wetlands/DC_Riparian.shp"]]
+
+
+def test_unify_schemas() -> None:
+    schema = national.unify_schemas(
+        [
+            (
+                "DC",
+                pyarrow.schema(
+                    [("IMAGE_YR", pyarrow.int32()), ("ACRES", pyarrow.int64())]
+                ),
+            ),
+            (
+                "MD",
+                pyarrow.schema(
+                    [
+                        ("IMAGE_YR", pyarrow.string()),
+                        ("ACRES", pyarrow.float64()),
+                        ("COMMENTS", pyarrow.null()),
+                    ]
+                ),
+            ),
+        ]
+    )
+    assert schema == pyarrow.schema(
+        [
+            ("IMAGE_YR", pyarrow.string()),
+            ("ACRES", pyarrow.float64()),
+            ("COMMENTS", pyarrow.null()),
+        ]
+    )
+
+
+def test_merge_without_layers(tmp_path: Path) -> None:
+    with pytest.raises(Exception, match="no riparian layers"):
+        national.merge([], tmp_path, role="riparian")
+
+
+def test_row_hashes_ignore_column_order() -> None:
+    table = pyarrow.table(
+        {"a": ["x", "y"], "b": [1.0, 2.0], "geometry": [b"\x01", b"\x02"]}
+    )
+    reordered = table.select(["b", "a", "geometry"])
+    for hashes, other in zip(
+        national.row_hashes(table), national.row_hashes(reordered)
+    ):
+        assert list(hashes) == list(other)
+        assert hashes[0] != hashes[1]
+    first, second = national.row_hashes(table)
+    assert list(first) != list(second)
+
+
+def test_row_hashes_ignore_column_types() -> None:
+    table = pyarrow.table(
+        {
+            "IMAGE_YR": pyarrow.array([1984, 2010], pyarrow.int32()),
+            "ACRES": [1.0, 2.5],
+            "geometry": [b"\x01", b"\x02"],
+        }
+    )
+    other = pyarrow.table(
+        {
+            "IMAGE_YR": ["1984", "2010"],
+            "ACRES": pyarrow.array([1.0, 2.5], pyarrow.float32()),
+            "geometry": [b"\x01", b"\x02"],
+        }
+    )
+    for hashes, other_hashes in zip(
+        national.row_hashes(table), national.row_hashes(other)
+    ):
+        assert list(hashes) == list(other_hashes)
+
+
+def test_add_to_collection(zipfiles: List[Path], tmp_path: Path) -> None:
+    merge = national.merge(zipfiles[:1], tmp_path)
+    collection = stac.create_collection()
+    collection.set_self_href(str(tmp_path / "collection.json"))
+    national.add_to_collection(
+        collection, merge.metadata, make_asset_hrefs_relative=True
+    )
+    asset = collection.assets[national.NAME]
+    assert asset.href == f"./{national.NAME}.geoparquet"
+    assert asset.extra_fields["table:row_count"] == 200
+    assert asset.extra_fields["table:primary_geometry"] == "geometry"
+    assert Collection.from_dict(collection.to_dict()).assets.keys() == {national.NAME}
@@ -0,0 +1,61 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from stactools.fws_nwi import profiling, scanner
+from stactools.fws_nwi.metadata import calculate_geometry
+
+
+def test_profile_scan_zipfile(dc_zipfile: Path, tmp_path: Path) -> None:
+    exited: List[profiling.Stage] = []
+    with profiling.profile(exited.append) as profiler:
+        scanner.scan_zipfile(dc_zipfile, tmp_path, batch_size=100)
+    stages = {(stage.name, stage.layer): stage for stage in profiler.stages}
+    assert ("extract", None) in stages
+    assert stages[("headers", None)].rows == 4
+    read = stages[("read", "DC_shapefile_wetlands/DC_Wetlands.shp")]
+    assert read.rows == 1556
+    assert read.seconds > 0
+    assert read.rows_per_second
+    assert read.peak_rss > 0
+    assert stages[("write", "DC_shapefile_wetlands/DC_Wetlands.shp")].rows == 1556
+    assert ("reproject", None) in stages
+    assert set(stage.name for stage in exited) == set(s.name for s in profiler.stages)
+    report = profiler.report()
+    assert report["seconds"] > 0
+    assert len(report["stages"]) == len(profiler.stages)
+    assert report["stages"][0].keys() == {
+        "name",
+        "layer",
+        "seconds",
+        "rows",
+        "rows_per_second",
+        "peak_rss",
+    }
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_profile_concurrent_layers(
+    dc_zipfile: Path, tmp_path: Path, processes: bool
+) -> None:
+    with profiling.profile() as profiler:
+        scanner.scan_zipfile(dc_zipfile, tmp_path, workers=4, processes=processes)
+    layers = {stage.layer for stage in profiler.stages if stage.name == "read"}
+    assert len(layers) == 4
+    assert sum(s.rows for s in profiler.stages if s.name == "read") == 1569
+
+
+def test_profile_calculate_geometry(dc_zipfile: Path) -> None:
+    with profiling.profile() as profiler:
+        calculate_geometry(dc_zipfile)
+    footprints = [stage for stage in profiler.stages if stage.name == "footprint"]
+    assert sum(stage.rows for stage in footprints) == 1569
+
+
+def test_no_profile(dc_zipfile: Path) -> None:
+    assert not profiling.active()
+    stage = profiling.stage("read")
+    with stage:
+        pass
+    assert stage.peak_rss == 0
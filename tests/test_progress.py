@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import List
+
+from stactools.fws_nwi import progress, scanner
+
+
+def test_events(dc_zipfile: Path, tmp_path: Path) -> None:
+    events: List[progress.Event] = []
+    with progress.listen(events.append):
+        layers = scanner.scan_layers(dc_zipfile, tmp_path, batch_size=500)
+    for layer in layers:
+        kinds = [e.kind for e in events if e.layer == layer.name]
+        assert kinds[0] == progress.STARTED
+        assert kinds[-1] == progress.FINISHED
+        assert progress.READ in kinds
+    wetlands = [e for e in events if e.layer.endswith("/DC_Wetlands.shp")]
+    assert [e.rows for e in wetlands if e.kind == progress.READ] == [
+        500,
+        1000,
+        1500,
+        1556,
+    ]
+    assert all(e.row_count == 1556 for e in wetlands)
+    assert all(e.zipfile == dc_zipfile.name for e in events)
+
+
+def test_header_only_layers(dc_zipfile: Path) -> None:
+    events: List[progress.Event] = []
+    with progress.listen(events.append):
+        scanner.scan_layers(dc_zipfile)
+    wetlands = [
+        (e.kind, e.rows) for e in events if e.layer.endswith("/DC_Wetlands.shp")
+    ]
+    assert wetlands == [(progress.STARTED, 0), (progress.FINISHED, 1556)]
+
+
+def test_no_listener(dc_zipfile: Path) -> None:
+    events: List[progress.Event] = []
+    with progress.listen(events.append):
+        pass
+    scanner.scan_layers(dc_zipfile)
+    assert events == []
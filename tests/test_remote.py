@@ -0,0 +1,135 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+
+from stactools.fws_nwi import remote, scanner, stac
+from stactools.fws_nwi.constants import ZIPFILE_ASSET_KEY
+from stactools.fws_nwi.metadata import Metadata
+
+# Small blocks, so the test zipfile is much bigger than what is read of it.
+BLOCK_SIZE = 16 * 1024
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves the files of a directory, with support for range requests."""
+
+    directory: Path
+    transferred: List[int]
+
+    def do_HEAD(self) -> None:
+        self._send(body=False)
+
+    def do_GET(self) -> None:
+        self._send(body=True)
+
+    def _send(self, body: bool) -> None:
+        path = self.directory / self.path.lstrip("/")
+        if not path.is_file():
+            self.send_error(404)
+            return
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and match[1]:
+            start = int(match[1])
+            end = min(int(match[2] or end), end)
+        elif match:
+            start = size - int(match[2])
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if body:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
+            self.wfile.write(data)
+            self.transferred.append(len(data))
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server(
+    dc_zipfile: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[ThreadingHTTPServer]:
+    monkeypatch.setattr(remote, "BLOCK_SIZE", BLOCK_SIZE)
+    handler = type(
+        "Handler",
+        (RangeRequestHandler,),
+        {"directory": dc_zipfile.parent, "transferred": []},
+    )
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def dc_url(server: ThreadingHTTPServer, dc_zipfile: Path) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/{dc_zipfile.name}"
+
+
+def transferred(server: ThreadingHTTPServer) -> int:
+    return sum(server.RequestHandlerClass.transferred)  # type: ignore
+
+
+def test_href() -> None:
+    url = "https://example.com/data/DC_shapefile_wetlands.zip?version=2"
+    assert remote.is_remote(url)
+    assert remote.to_href(url) == url
+    assert remote.stem(url) == "DC_shapefile_wetlands"
+    assert not remote.is_remote(Path("DC_shapefile_wetlands.zip"))
+    assert remote.to_href("data/DC_shapefile_wetlands.zip") == Path(
+        "data/DC_shapefile_wetlands.zip"
+    )
+
+
+def test_read_headers(dc_zipfile: Path, dc_url: str) -> None:
+    headers = scanner.read_headers(dc_url)
+    local_headers = scanner.read_headers(dc_zipfile)
+    assert [(h.name, h.crs, h.row_count, h.bbox) for h in headers] == [
+        (h.name, h.crs, h.row_count, h.bbox) for h in local_headers
+    ]
+
+
+def test_create_item(
+    dc_zipfile: Path, dc_url: str, server: ThreadingHTTPServer
+) -> None:
+    item = stac.create_item(dc_url)
+    local_item = stac.create_item(dc_zipfile)
+    assert item.id == local_item.id
+    assert item.geometry == local_item.geometry
+    assert [link.href for link in item.links] == [
+        link.href for link in local_item.links
+    ]
+    assert item.assets[ZIPFILE_ASSET_KEY].href == dc_url
+    assert item.assets[ZIPFILE_ASSET_KEY].title == "DC_shapefile_wetlands"
+    # The wetlands layer, which is most of the zipfile, is never downloaded.
+    assert transferred(server) < dc_zipfile.stat().st_size / 5
+
+
+def test_create_item_with_geoparquet(dc_url: str, tmp_path: Path) -> None:
+    item = stac.create_item(dc_url, tmp_path)
+    assert item.assets["DC_Wetlands"].extra_fields["table:row_count"] == 1556
+
+
+def test_create_item_from_assets(dc_url: str) -> None:
+    asset = stac.create_zipfile_asset(dc_url)
+    item = stac.create_item_from_assets({ZIPFILE_ASSET_KEY: asset})
+    assert item.id == "DC"
+    assert item.assets[ZIPFILE_ASSET_KEY].href == dc_url
+
+
+def test_metadata_from_zipfile(dc_zipfile: Path, dc_url: str) -> None:
+    metadata = Metadata.from_zipfile(dc_url)
+    assert metadata == Metadata.from_zipfile(dc_zipfile)
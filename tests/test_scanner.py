@@ -0,0 +1,147 @@
+import threading
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import geopandas
+import pyarrow
+import pytest
+
+from stactools.fws_nwi import geoparquet, scanner
+from stactools.fws_nwi.metadata import calculate_geometry
+
+
+def test_scan_zipfile(dc_zipfile: Path, tmp_path: Path) -> None:
+    metadata, geoparquets = scanner.scan_zipfile(dc_zipfile, tmp_path)
+    assert metadata.state_code == "DC"
+    assert metadata.content == ["wetlands"]
+    assert len(metadata.pdfs) == 5
+    assert metadata.crs.to_epsg() == 5070
+    assert len(geoparquets) == 4
+    assert all(g.path.exists() for g in geoparquets)
+
+
+def test_scan_zipfile_reads_each_layer_once(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    read_file = geopandas.read_file
+    reads = []
+
+    def counting_read_file(href: str, *args: Any, **kwargs: Any) -> Any:
+        reads.append(href)
+        return read_file(href, *args, **kwargs)
+
+    monkeypatch.setattr(geopandas, "read_file", counting_read_file)
+    scanner.scan_zipfile(dc_zipfile, tmp_path)
+    assert len(reads) == 4
+    assert len(set(reads)) == 4
+
+
+def test_scan_zipfile_fallback_footprint(dc_zipfile_without_boundary: Path) -> None:
+    metadata, geoparquets = scanner.scan_zipfile(dc_zipfile_without_boundary)
+    geometry, _ = calculate_geometry(dc_zipfile_without_boundary)
+    assert metadata.geometry.equals(geometry)
+    assert geoparquets == []
+
+
+def test_scan_zipfile_fast_footprint(
+    dc_zipfile_without_boundary: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    read_file = geopandas.read_file
+    reads = []
+
+    def counting_read_file(href: str, *args: Any, **kwargs: Any) -> Any:
+        reads.append(Path(href).name)
+        return read_file(href, *args, **kwargs)
+
+    monkeypatch.setattr(geopandas, "read_file", counting_read_file)
+    metadata, _ = scanner.scan_zipfile(dc_zipfile_without_boundary, fast_footprint=True)
+    assert sorted(reads) == [
+        "DC_Wetlands_Historic_Map_Info.shp",
+        "DC_Wetlands_Project_Metadata.shp",
+    ]
+    geometry, _ = calculate_geometry(dc_zipfile_without_boundary, fast=True)
+    assert metadata.geometry.equals(geometry)
+    assert len(metadata.pdfs) == 5
+
+
+def test_scan_zipfile_fast_footprint_with_geoparquet(
+    dc_zipfile_without_index_layers: Path, tmp_path: Path
+) -> None:
+    metadata, geoparquets = scanner.scan_zipfile(
+        dc_zipfile_without_index_layers, tmp_path, batch_size=500, fast_footprint=True
+    )
+    geometry, _ = calculate_geometry(dc_zipfile_without_index_layers, fast=True)
+    assert metadata.geometry.equals(geometry)
+    assert [g.row_count for g in geoparquets] == [1556]
+
+
+def test_scan_zipfile_in_batches(dc_zipfile: Path, tmp_path: Path) -> None:
+    metadata, geoparquets = scanner.scan_zipfile(dc_zipfile, tmp_path)
+    (tmp_path / "batched").mkdir()
+    batched_metadata, batched_geoparquets = scanner.scan_zipfile(
+        dc_zipfile, tmp_path / "batched", batch_size=100
+    )
+    assert batched_metadata == metadata
+    assert [g.row_count for g in batched_geoparquets] == [
+        g.row_count for g in geoparquets
+    ]
+
+
+def test_scan_zipfile_in_batches_decodes_only_used_geometries(
+    dc_zipfile: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    to_geodataframe = scanner.to_geodataframe
+    decoded = []
+
+    def counting_to_geodataframe(table: pyarrow.Table, crs: str) -> Any:
+        decoded.append(table.num_rows)
+        return to_geodataframe(table, crs)
+
+    monkeypatch.setattr(scanner, "to_geodataframe", counting_to_geodataframe)
+    metadata, _ = scanner.scan_zipfile(dc_zipfile, batch_size=100)
+    assert decoded == [1]
+    assert len(metadata.pdfs) == 5
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_scan_zipfile_in_batches_cleans_up_after_errors(
+    dc_zipfile: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    workers: Optional[int],
+) -> None:
+    read_batches = scanner.read_batches
+
+    def failing_read_batches(href: str, batch_size: int) -> Iterator[pyarrow.Table]:
+        for index, table in enumerate(read_batches(href, batch_size)):
+            if index == 2:
+                raise Exception("disk full")
+            yield table
+
+    monkeypatch.setattr(scanner, "read_batches", failing_read_batches)
+    (tmp_path / "geoparquet").mkdir()
+    (tmp_path / "flatgeobuf").mkdir()
+    with pytest.raises(Exception, match="disk full"):
+        scanner.scan_zipfile(
+            dc_zipfile,
+            tmp_path / "geoparquet",
+            batch_size=100,
+            geoparquet_options=geoparquet.Options(spatial_sort=True),
+            flatgeobuf_directory=tmp_path / "flatgeobuf",
+            workers=workers,
+        )
+    assert not [
+        thread for thread in threading.enumerate() if thread.name.startswith("flat")
+    ]
+    assert not list((tmp_path / "flatgeobuf").iterdir())
+    assert not list((tmp_path / "geoparquet").iterdir())
+
+
+def test_scan_zipfile_fallback_footprint_in_batches(
+    dc_zipfile_without_boundary: Path,
+) -> None:
+    metadata, _ = scanner.scan_zipfile(dc_zipfile_without_boundary)
+    batched_metadata, _ = scanner.scan_zipfile(
+        dc_zipfile_without_boundary, batch_size=100
+    )
+    assert batched_metadata.geometry.equals(metadata.geometry)
@@ -1,10 +1,13 @@
 from pathlib import Path
 
+import pytest
+from pystac.extensions.file import FileExtension
 from pystac.extensions.item_assets import ItemAssetsExtension
 from pystac.extensions.projection import ProjectionExtension
 from pystac.extensions.table import TableExtension
 
-from stactools.fws_nwi import stac
+from stactools.fws_nwi import checksum, geoparquet, stac
+from stactools.fws_nwi.cache import Cache
 
 
 def test_create_collection() -> None:
@@ -54,6 +57,85 @@ def test_create_item_with_geoparquet(dc_zipfile: Path, tmp_path: Path) -> None:
         _ = TableExtension.ext(asset)
 
 
+def test_create_item_with_flatgeobuf(dc_zipfile: Path, tmp_path: Path) -> None:
+    item = stac.create_item(dc_zipfile, flatgeobuf_directory=tmp_path)
+    assert len(item.assets) == 5
+    asset = item.assets["DC_Wetlands_flatgeobuf"]
+    assert asset.href == str(tmp_path / "DC_Wetlands.fgb")
+    assert asset.media_type == "application/vnd.flatgeobuf"
+    assert asset.roles == ["data", "cloud-optimized", "wetlands"]
+    assert not any(key.startswith("table:") for key in asset.extra_fields)
+
+    item = stac.create_item(
+        dc_zipfile, tmp_path, batch_size=500, flatgeobuf_directory=tmp_path
+    )
+    assert len(item.assets) == 9
+    assert "DC_Wetlands" in item.assets
+    assert "DC_Wetlands_flatgeobuf" in item.assets
+
+
+def test_create_item_with_spatially_sorted_geoparquet(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    item = stac.create_item(
+        dc_zipfile,
+        tmp_path,
+        geoparquet_options=geoparquet.Options(spatial_sort=True),
+    )
+    asset = item.assets["DC_Wetlands"]
+    assert asset.extra_fields["geoparquet:sorting"] == "hilbert"
+    assert asset.extra_fields["geoparquet:covering"]["bbox"]["xmin"] == [
+        "bbox",
+        "xmin",
+    ]
+    assert "geoparquet:sorting" not in item.assets["zip"].extra_fields
+
+
+def test_create_item_with_partitioned_geoparquet(
+    dc_zipfile: Path, tmp_path: Path
+) -> None:
+    assets = stac.create_geoparquet_assets_from_zipfile(
+        dc_zipfile,
+        tmp_path,
+        options=geoparquet.Options(partition_by=(geoparquet.WETLAND_TYPE,)),
+    )
+    asset = assets["DC_Wetlands"]
+    assert asset.href == str(tmp_path / "DC_Wetlands.geoparquet")
+    assert asset.extra_fields["table:row_count"] == 1556
+    assert asset.extra_fields["geoparquet:partitioning"] == {
+        "scheme": "hive",
+        "keys": ["WETLAND_TY"],
+    }
+    assert (
+        "geoparquet:partitioning"
+        not in assets["DC_Wetlands_Project_Metadata"].extra_fields
+    )
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_create_item_with_checksums(
+    dc_zipfile: Path, tmp_path: Path, cached: bool
+) -> None:
+    item = stac.create_item(
+        dc_zipfile,
+        geoparquet_directory=tmp_path,
+        cache=Cache(tmp_path / "cache") if cached else None,
+        checksums=True,
+    )
+    assert FileExtension.has_extension(item)
+    assert len(item.assets) == 5
+    for asset in item.assets.values():
+        digest = checksum.file(Path(asset.href))
+        assert asset.extra_fields["file:size"] == digest.size
+        assert asset.extra_fields["file:checksum"] == digest.checksum
+
+
+def test_create_item_without_checksums(dc_zipfile: Path) -> None:
+    item = stac.create_item(dc_zipfile)
+    assert not FileExtension.has_extension(item)
+    assert "file:checksum" not in item.assets["zip"].extra_fields
+
+
 def test_create_item_with_fallback_geometry(hi_zipfile: Path) -> None:
     item = stac.create_item(hi_zipfile)
     item.validate()
@@ -0,0 +1,88 @@
+from pathlib import Path
+from typing import Any
+from zipfile import ZipFile
+
+import geopandas
+import pytest
+
+from stactools.fws_nwi import scanner, staging
+
+
+def test_extract(dc_zipfile: Path, tmp_path: Path) -> None:
+    with staging.extract(dc_zipfile, tmp_path) as directory:
+        assert directory.parent == tmp_path
+        extracted = sorted(
+            str(p.relative_to(directory)) for p in directory.rglob("*") if p.is_file()
+        )
+        with ZipFile(dc_zipfile) as zipfile:
+            members = sorted(m.filename for m in staging.shapefile_members(zipfile))
+            assert extracted == members
+            assert not any(name.endswith(".xml") for name in members)
+            for name in members:
+                assert (directory / name).read_bytes() == zipfile.read(name)
+    assert not directory.exists()
+
+
+def test_extract_layers(dc_zipfile: Path) -> None:
+    name = "DC_shapefile_wetlands/District_of_Columbia.shp"
+    with staging.extract(dc_zipfile, layers=[name]) as directory:
+        extracted = sorted(p.name for p in directory.rglob("*") if p.is_file())
+    assert extracted == [
+        f"District_of_Columbia.{suffix}"
+        for suffix in ["cpg", "dbf", "prj", "sbn", "sbx", "shp", "shx"]
+    ]
+
+
+def test_extract_to_memory_or_disk(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    memory = tmp_path / "memory"
+    memory.mkdir()
+    monkeypatch.setattr(staging, "MEMORY_DIRECTORY", memory)
+    with staging.extract(dc_zipfile) as directory:
+        assert directory.parent == memory
+    with staging.extract(dc_zipfile, memory_limit=1024) as directory:
+        assert directory.parent != memory
+    assert list(memory.iterdir()) == []
+
+
+def test_scan_reads_extracted_layers(
+    dc_zipfile: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    read_file = geopandas.read_file
+    reads = []
+
+    def recording_read_file(href: str, *args: Any, **kwargs: Any) -> Any:
+        reads.append(href)
+        return read_file(href, *args, **kwargs)
+
+    monkeypatch.setattr(geopandas, "read_file", recording_read_file)
+    metadata, _ = scanner.scan_zipfile(dc_zipfile)
+    assert metadata.state_code == "DC"
+    # The wetlands layer isn't needed, given the state boundary.
+    assert sorted(Path(href).name for href in reads) == [
+        "DC_Wetlands_Historic_Map_Info.shp",
+        "DC_Wetlands_Project_Metadata.shp",
+        "District_of_Columbia.shp",
+    ]
+    assert not any(href.startswith("zip://") for href in reads)
+    assert not any(Path(href).exists() for href in reads)
+
+
+def test_scan_with_staging_options(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    read_file = geopandas.read_file
+    reads = []
+
+    def recording_read_file(href: str, *args: Any, **kwargs: Any) -> Any:
+        reads.append(href)
+        return read_file(href, *args, **kwargs)
+
+    monkeypatch.setattr(geopandas, "read_file", recording_read_file)
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    scanner.scan_zipfile(dc_zipfile, staging_options=staging.Options(directory=scratch))
+    assert reads
+    assert all(Path(href).parents[2] == scratch for href in reads)
+    assert list(scratch.iterdir()) == []
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from stactools.fws_nwi import scanner
+
+from .synthetic import create_zipfile
+
+
+def test_synthetic_zipfile(tmp_path: Path) -> None:
+    path = create_zipfile(tmp_path, code="DC", features=500, vertices=16)
+    assert path.name == "DC_shapefile_wetlands.zip"
+    layers = {
+        Path(layer.name).stem: layer for layer in scanner.scan_layers(path, tmp_path)
+    }
+    assert sorted(layers) == [
+        "DC_Riparian",
+        "DC_Wetlands",
+        "DC_Wetlands_Historic_Map_Info",
+        "District_of_Columbia",
+    ]
+    assert layers["DC_Wetlands"].row_count == 500
+    assert layers["DC_Riparian"].row_count == 50
+    assert len(layers["DC_Wetlands_Historic_Map_Info"].pdfs) == 5
+
+    metadata = scanner.create_metadata(path, list(layers.values()))
+    assert sorted(metadata.content) == ["riparian", "wetlands"]
+    assert metadata.crs.to_epsg() == 5070
+
+
+def test_synthetic_zipfile_without_boundary(tmp_path: Path) -> None:
+    path = create_zipfile(tmp_path, code="RI", features=100, boundary=False)
+    metadata, _ = scanner.scan_zipfile(path)
+    assert metadata.state == "Rhode Island"
+    assert metadata.geometry.is_valid
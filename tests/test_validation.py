@@ -0,0 +1,124 @@
+import json
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pytest
+import requests
+from pystac import Item
+
+from stactools.fws_nwi import stac, validation
+
+# A stand-in for the extension schemas, which can't be downloaded in tests.
+EXTENSION_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "required": ["stac_extensions"],
+}
+
+
+@pytest.fixture
+def item(dc_zipfile: Path) -> Item:
+    return stac.create_item(dc_zipfile)
+
+
+@pytest.fixture
+def schema_directory(tmp_path: Path, item: Item) -> Path:
+    directory = tmp_path / "schemas"
+    uris = (
+        validation.schema_uris(item.to_dict())[1:]
+        + validation.schema_uris(stac.create_collection().to_dict())[1:]
+    )
+    for uri in uris:
+        path = validation.schema_path(directory, uri)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(EXTENSION_SCHEMA, f)
+    return directory
+
+
+@pytest.fixture
+def offline(monkeypatch: pytest.MonkeyPatch) -> None:
+    def get(*args: Any, **kwargs: Any) -> None:
+        raise requests.ConnectionError("offline")
+
+    monkeypatch.setattr(requests, "get", get)
+
+
+@pytest.fixture
+def server(tmp_path: Path) -> Iterator[str]:
+    directory = tmp_path / "www"
+    directory.mkdir()
+    handler = partial(SimpleHTTPRequestHandler, directory=str(directory))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    thread.join()
+
+
+def test_validate_offline(item: Item, schema_directory: Path, offline: None) -> None:
+    validator = validation.Validator(schema_directory)
+    assert validator.errors(item.to_dict()) == []
+    validator.validate(stac.create_collection().to_dict())
+
+
+def test_errors(item: Item, schema_directory: Path, offline: None) -> None:
+    stac_dict = item.to_dict()
+    stac_dict["bbox"] = "everywhere"
+    del stac_dict["stac_extensions"]
+    errors = validation.Validator(schema_directory).errors(stac_dict)
+    assert errors[0] == (
+        "https://schemas.stacspec.org/v1.1.0/item-spec/json-schema/item.json:"
+        " 'everywhere' is not of type 'array' at /bbox"
+    )
+    assert all(error.endswith(" at /bbox") for error in errors)
+    with pytest.raises(Exception, match="DC is not valid"):
+        validation.Validator(schema_directory).validate(stac_dict)
+
+
+def test_missing_schema(item: Item, tmp_path: Path, offline: None) -> None:
+    with pytest.raises(Exception, match="could not fetch the schema"):
+        validation.Validator(tmp_path).errors(item.to_dict())
+
+
+def test_download_schema(item: Item, tmp_path: Path, server: str) -> None:
+    with open(tmp_path / "www" / "schema.json", "w") as f:
+        json.dump({"type": "object", "required": ["properties"]}, f)
+    uri = f"{server}/schema.json"
+    item.stac_extensions = [uri]
+    directory = tmp_path / "schemas"
+    assert validation.Validator(directory).errors(item.to_dict()) == []
+    path = validation.schema_path(directory, uri)
+    assert json.loads(path.read_text()) == {
+        "type": "object",
+        "required": ["properties"],
+    }
+    (tmp_path / "www" / "schema.json").unlink()
+    assert validation.Validator(directory).errors(item.to_dict()) == []
+
+
+def test_validators_are_compiled_once(schema_directory: Path) -> None:
+    validator = validation.Validator(schema_directory)
+    uri = validation.schema_uris(stac.create_collection().to_dict())[0]
+    assert validator.validator(uri) is validator.validator(uri)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_validate_files(
+    item: Item, schema_directory: Path, tmp_path: Path, offline: None, workers: int
+) -> None:
+    paths: List[Path] = []
+    for index in range(4):
+        stac_dict: Dict[str, Any] = item.to_dict()
+        if index == 3:
+            stac_dict["id"] = 3
+        paths.append(tmp_path / f"{index}.json")
+        with open(paths[-1], "w") as f:
+            json.dump(stac_dict, f)
+    errors = validation.validate_files(paths, schema_directory, workers=workers)
+    assert [len(errors[path]) for path in paths] == [0, 0, 0, 1]
+    assert "3 is not of type 'string' at /id" in errors[paths[3]][0]
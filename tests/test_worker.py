@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List
+
+import geopandas
+import pytest
+from pystac import Item
+
+from stactools.fws_nwi import stac, worker
+from stactools.fws_nwi.constants import ZIPFILE_ASSET_KEY
+from stactools.fws_nwi.worker import Worker
+
+
+def statuses(destination: Path) -> List[Dict[str, Any]]:
+    with open(destination / worker.STATUS_FILE) as f:
+        return [json.loads(line) for line in f]
+
+
+def run(spool: Path, destination: Path, **kwargs: Any) -> None:
+    Worker(
+        spool, destination, workers=1, poll_seconds=0.1, settle_seconds=0, **kwargs
+    ).run(once=True)
+
+
+def test_worker(dc_zipfile: Path, tmp_path: Path) -> None:
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    shutil.copy(dc_zipfile, spool)
+    destination = tmp_path / "items"
+    run(spool, destination, create_geoparquet=True)
+
+    item = Item.from_file(str(destination / "DC" / "DC.json"))
+    assert item.assets["DC_Wetlands"].href == "./DC_Wetlands.geoparquet"
+    dataframe = geopandas.read_parquet(destination / "DC" / "DC_Wetlands.geoparquet")
+    assert len(dataframe) == 1556
+    done = spool / worker.DONE / dc_zipfile.name
+    assert done.exists()
+    assert item.assets[ZIPFILE_ASSET_KEY].get_absolute_href() == str(done)
+    assert sorted(p.name for p in destination.iterdir()) == ["DC", "status.ndjson"]
+
+    started, succeeded = statuses(destination)
+    assert started["job"] == succeeded["job"] == dc_zipfile.name
+    assert started["status"] == worker.STARTED
+    assert succeeded["status"] == worker.SUCCEEDED
+    assert succeeded["item"] == str(destination / "DC" / "DC.json")
+    assert succeeded["seconds"] > 0
+
+
+def test_worker_reuses_processes(dc_zipfile: Path, tmp_path: Path) -> None:
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    shutil.copy(dc_zipfile, spool)
+    with open(spool / "again.job", "w") as f:
+        json.dump({"href": str(dc_zipfile)}, f)
+    destination = tmp_path / "items"
+    run(spool, destination)
+
+    succeeded = [s for s in statuses(destination) if s["status"] == worker.SUCCEEDED]
+    assert len(succeeded) == 2
+    assert len({s["worker"] for s in succeeded}) == 1
+    # The second job replaced the first job's item.
+    assert sorted(p.name for p in destination.iterdir()) == ["DC", "status.ndjson"]
+    item = Item.from_file(str(destination / "DC" / "DC.json"))
+    assert item.assets[ZIPFILE_ASSET_KEY].get_absolute_href() in [
+        str(dc_zipfile),
+        str(spool / worker.DONE / dc_zipfile.name),
+    ]
+    assert sorted(p.name for p in (spool / worker.DONE).iterdir()) == [
+        dc_zipfile.name,
+        "again.job",
+    ]
+
+
+def test_worker_failure(tmp_path: Path) -> None:
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    (spool / "XX_shapefile_wetlands.zip").write_bytes(b"not a zipfile")
+    destination = tmp_path / "items"
+    run(spool, destination)
+
+    assert (spool / worker.FAILED / "XX_shapefile_wetlands.zip").exists()
+    _, failed = statuses(destination)
+    assert failed["status"] == worker.FAILED
+    assert "zip" in failed["error"]
+    assert sorted(p.name for p in destination.iterdir()) == ["status.ndjson"]
+
+
+def test_worker_publish_failure(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(scratch: Path, directory: Path) -> None:
+        raise Exception("disk full")
+
+    # Worker processes are forked, so they see this patch.
+    monkeypatch.setattr(worker, "publish", fail)
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    shutil.copy(dc_zipfile, spool)
+    destination = tmp_path / "items"
+    run(spool, destination)
+
+    assert (spool / worker.FAILED / dc_zipfile.name).exists()
+    assert not (spool / worker.DONE / dc_zipfile.name).exists()
+    _, failed = statuses(destination)
+    assert failed["status"] == worker.FAILED
+    assert failed["error"] == "disk full"
+
+
+def test_worker_survives_a_dead_worker(
+    dc_zipfile: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    create_item = stac.create_item
+
+    def create_item_or_die(href: Any, **kwargs: Any) -> Item:
+        # Worker processes are forked, so they see this patch.
+        if str(href).endswith("RI_shapefile_wetlands.zip"):
+            os._exit(1)
+        return create_item(href, **kwargs)
+
+    monkeypatch.setattr(stac, "create_item", create_item_or_die)
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    killer = spool / "RI_shapefile_wetlands.zip"
+    shutil.copy(dc_zipfile, killer)
+    shutil.copy(dc_zipfile, spool)
+    # The killer is claimed first, so the other job is waiting when it dies.
+    os.utime(killer, (0, 0))
+    destination = tmp_path / "items"
+    run(spool, destination)
+
+    assert (spool / worker.FAILED / killer.name).exists()
+    assert (spool / worker.DONE / dc_zipfile.name).exists()
+    finished = {
+        s["job"]: s["status"]
+        for s in statuses(destination)
+        if s["status"] != worker.STARTED
+    }
+    assert finished == {
+        killer.name: worker.FAILED,
+        dc_zipfile.name: worker.SUCCEEDED,
+    }
+
+
+def test_is_job(tmp_path: Path) -> None:
+    (tmp_path / "DC_shapefile_wetlands.zip").touch()
+    (tmp_path / "remote.job").touch()
+    (tmp_path / "directory.job").mkdir()
+    (tmp_path / "notes.txt").touch()
+    assert sorted(p.name for p in tmp_path.iterdir() if worker.is_job(p)) == [
+        "DC_shapefile_wetlands.zip",
+        "remote.job",
+    ]
+
+
+def test_worker_requeues_unfinished_jobs(dc_zipfile: Path, tmp_path: Path) -> None:
+    spool = tmp_path / "spool"
+    (spool / worker.PROCESSING).mkdir(parents=True)
+    shutil.copy(dc_zipfile, spool / worker.PROCESSING)
+    destination = tmp_path / "items"
+    run(spool, destination)
+
+    assert (destination / "DC" / "DC.json").exists()
+    assert list((spool / worker.PROCESSING).iterdir()) == []
+
+
+def test_worker_waits_for_files_to_settle(dc_zipfile: Path, tmp_path: Path) -> None:
+    spool = tmp_path / "spool"
+    (spool / worker.PROCESSING).mkdir(parents=True)
+    shutil.copy(dc_zipfile, spool)
+    (spool / "notes.txt").write_text("not a job")
+    assert Worker(spool, tmp_path / "items", settle_seconds=3600).claim() == []
+    claimed = Worker(spool, tmp_path / "items", settle_seconds=0).claim()
+    assert claimed == [spool / worker.PROCESSING / dc_zipfile.name]
+    assert (spool / "notes.txt").exists()